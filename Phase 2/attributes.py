@@ -5,14 +5,31 @@ AttributeTypes = TypeVarTuple('AttributeTypes')
 class Attributes(Generic[*AttributeTypes]):
 
     def __init__(self, attribute_pairs: list[tuple[str, str]],
-                 primary_keys: list[str] = [], foreign_keys: dict[str, tuple[str, str]] = {}) -> None:
-        
+                 primary_keys: list[str] = [], foreign_keys: dict[str, tuple[str, str]] = {},
+                 sequences: list[str] = [], compressed: list[str] = [], indexes: list[list[str]] = []) -> None:
+        """
+        sequences are the attributes that are stored once in the sequences table (see sequence_store.py).
+        compressed are the attributes whose values may be stored compressed (see sequence_store.compress_sequence),
+        and have to be read through decompress_sequence (see Table.column_expression).
+        indexes are the columns of every secondary index of the table (see Table.create_indexes).
+        """
         self.attribute_names, self.attribute_types = tuple(zip(*attribute_pairs))
+        # Position of every attribute in a row, looked up once here rather than for every value
+        self.attribute_indices = {name: index for index, name in enumerate(self.attribute_names)}
         if not set(primary_keys) <= set(self.attribute_names)\
             or not set(foreign_keys) <= set(self.attribute_names):
             raise ValueError("Primary keys and foreign keys need to be a subset of attributes")
+        if not set(sequences) <= set(self.attribute_names):
+            raise ValueError("Sequences need to be a subset of attributes")
+        if not set(compressed) <= set(self.attribute_names):
+            raise ValueError("Compressed attributes need to be a subset of attributes")
+        if not all(index and set(index) <= set(self.attribute_names) - set(sequences) for index in indexes):
+            raise ValueError("Indexes need to be made of attributes that are not sequences")
         self.primary_keys = primary_keys
         self.foreign_keys = foreign_keys
+        self.sequences = sequences
+        self.compressed = compressed
+        self.indexes = indexes
         self.length = len(self.attribute_names)
 
     def __str__(self) -> str:
@@ -26,6 +43,16 @@ class Attributes(Generic[*AttributeTypes]):
         if self.foreign_keys: string += ', ' + foreign_key_string
         return f"({string})"
     
+    def stored_attributes(self) -> "Attributes":
+        """
+        The attributes as they are stored, with the hash of every sequence in place of the sequence.
+        """
+        attribute_pairs = [(name + "_hash", "INTEGER") if name in self.sequences else (name, attribute_type)
+                           for name, attribute_type in zip(self.attribute_names, self.attribute_types)]
+        return Attributes(attribute_pairs, self.primary_keys, self.foreign_keys,
+                          compressed=[name for name in self.compressed if name not in self.sequences],
+                          indexes=self.indexes)
+
     def get_primary_keys(self):
         return self.primary_keys
     
@@ -35,21 +62,28 @@ class Attributes(Generic[*AttributeTypes]):
     def dict_to_tuple(self, values: dict) -> tuple[*AttributeTypes]:
         result = [None] * self.length
         for column in values:
-            index = self.attribute_names.index(column)
-            result[index] = values[column]
+            if column not in self.attribute_indices:
+                raise ValueError(f"{column} is not an attribute")
+            result[self.attribute_indices[column]] = values[column]
         return tuple(result)
     
+    # The match methods build conditions with placeholders, so that the values are bound to the statement
+    # rather than spliced into it. The statement then stays the same for every value, and SQLite only compiles it once.
     def match_all_columns(self, values: tuple[*AttributeTypes], delim = " AND ") -> str:
+        """
+        Matches every column whose value is not None. Bind the values that are not None, in order.
+        """
         if len(values) != self.length:
             raise ValueError("Number of values given does not match number of columns")
-        return delim.join([self.attribute_names[i] + ' = ' + values[i] for i in range(self.length) if values[i] is not None])
+        return delim.join([self.attribute_names[i] + ' = ?' for i in range(self.length) if values[i] is not None])
     
-    def match_columns(self, column_value_pairs: dict, delim = " AND ") -> str:
-        if not set(column_value_pairs) <= set(self.attribute_names):
+    def match_columns(self, columns, delim = " AND ") -> str:
+        """
+        Matches the given columns (or the keys of the given dictionary), in order.
+        """
+        if not set(columns) <= set(self.attribute_names):
             raise ValueError("Argument contains columns not part of the table")
-        return delim.join([column + ' = ' + column_value_pairs[column] for column in column_value_pairs])
+        return delim.join([column + ' = ?' for column in columns])
     
-    def match_primary_keys(self, primary_key_values, delim = " AND ") -> str:
-        if len(primary_key_values) != len(self.primary_keys):
-            raise ValueError("Number of values given does not match number of keys")
-        return delim.join([self.primary_keys[i] + ' = ' + primary_key_values[i] for i in range(len(self.primary_keys))])
\ No newline at end of file
+    def match_primary_keys(self, delim = " AND ") -> str:
+        return delim.join([key + ' = ?' for key in self.primary_keys])
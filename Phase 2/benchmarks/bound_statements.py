@@ -0,0 +1,48 @@
+"""
+Benchmarks looking up the status of entries (see commands.entry_status), comparing statements with the entry ID
+spliced into them (as before), which SQLite has to compile again for every entry, against the statements
+with bound parameters, which it compiles once and then finds in the statement cache of the connection.
+Run from the Phase 2 directory with "python benchmarks/bound_statements.py".
+"""
+
+import os
+import sys
+import sqlite3
+import time
+
+sys.path.insert(0, os.getcwd())
+import commands
+from database import main_table, completion_table
+
+ENTRIES = 20000
+
+def spliced_entry_status(cur: sqlite3.Cursor, entry_id: str, revision_date: str) -> str:
+    res = cur.execute("SELECT entry_id FROM " + main_table.name + " WHERE entry_id = '" + entry_id + "'")
+    if not res.fetchone():
+        return "new"
+    res = cur.execute("SELECT revision_date FROM " + main_table.name + " WHERE entry_id = '" + entry_id + "'")
+    if res.fetchone()[0] < revision_date:
+        return "outdated"
+    res = cur.execute("SELECT entry_id FROM " + completion_table.name + " WHERE entry_id = '" + entry_id + "'")
+    if not res.fetchone():
+        return "corrupted"
+    return "current"
+
+if __name__ == "__main__":
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    entry_ids = ["%05d" % i for i in range(ENTRIES)]
+    row = {"complex_type": "SingleProtein", "revision_date": "2000-01-01"}
+    cur.executemany(main_table.insert_statement, [tuple(row.get(name, entry_id if name == "entry_id" else None)
+                                                        for name in main_table.attributes.attribute_names)
+                                                  for entry_id in entry_ids])
+    cur.executemany(completion_table.insert_statement, [(entry_id, "2000-01-01") for entry_id in entry_ids])
+    con.commit()
+
+    for name, entry_status in (("spliced", spliced_entry_status), ("bound", commands.entry_status)):
+        start = time.perf_counter()
+        statuses = [entry_status(cur, entry_id, "2000-01-01") for entry_id in entry_ids]
+        elapsed = time.perf_counter() - start
+        assert set(statuses) == {"current"}
+        print(f"{name}: {elapsed / ENTRIES * 1e6:.1f} us/entry")
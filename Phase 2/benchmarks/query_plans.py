@@ -0,0 +1,88 @@
+"""
+Benchmarks typical analysis queries, printing the query plan and time of each of them without the declared
+secondary indexes (see Attributes.indexes) and statistics, and again with them (after ANALYZE).
+Rows are synthetic, with roughly the shape of the PDB: mostly single proteins, a long tail of source organisms,
+mostly chains A to D (and a few large complexes with many more chains), and a few sheets of a few strands per entry.
+Run from the Phase 2 directory with "python benchmarks/query_plans.py".
+"""
+
+import os
+import sys
+import random
+import sqlite3
+import time
+
+sys.path.insert(0, os.getcwd())
+import commands
+from database import table_schemas, main_table, chain_table, sheet_table, strand_table
+
+ENTRIES = 50000
+ORGANISMS = 2000
+COMPLEX_TYPES = {"SingleProtein": 60, "Proteinmer": 20, "ComplexProtein": 10, "ProteinNA": 5, "NucleicAcid": 3,
+                 "ProteinSaccharide": 1, "Other": 1} # Rough share of entries, in percent
+
+QUERIES = [
+    "SELECT entry_id FROM chains WHERE chain_id = 'AA'",
+    "SELECT entry_id FROM main WHERE complex_type = 'NucleicAcid'",
+    "SELECT entry_id FROM main WHERE source_organism = 'organism 7'",
+    "SELECT COUNT(*) FROM sheets JOIN strands USING (entry_id, sheet_id) WHERE sheets.number_strands >= 6",
+    "SELECT m.source_organism, COUNT(*) FROM main m JOIN chains c USING (entry_id) "
+    "WHERE m.complex_type = 'ProteinNA' GROUP BY m.source_organism",
+]
+
+def make_rows(rng: random.Random, entry_id: str) -> dict[str, list[tuple]]:
+    """
+    Rows with realistic values in the columns the queries use, and placeholders everywhere else.
+    """
+    organism = f"organism {min(int(rng.paretovariate(1)), ORGANISMS)}"
+    complex_type = rng.choices(list(COMPLEX_TYPES), list(COMPLEX_TYPES.values()))[0]
+    chain_count = 60 if rng.random() < 0.01 else rng.randint(1, 4)
+    chains = [chr(ord("A") + i % 26) * (i // 26 + 1) for i in range(chain_count)]
+    sheets = [chr(ord("A") + i) for i in range(rng.randint(0, 3))]
+    strand_counts = [rng.randint(2, 8) for sheet in sheets]
+    rows = {main_table.name: [dict(entry_id=entry_id, complex_type=complex_type, source_organism=organism)],
+            chain_table.name: [dict(entry_id=entry_id, chain_id=chain, chain_sequence="MKV") for chain in chains],
+            sheet_table.name: [dict(entry_id=entry_id, sheet_id=sheet, number_strands=count)
+                               for sheet, count in zip(sheets, strand_counts)],
+            strand_table.name: [dict(entry_id=entry_id, sheet_id=sheet, strand_id=str(i), chain_id="A")
+                                for sheet, count in zip(sheets, strand_counts) for i in range(count)]}
+    return {table_scheme.name: [tuple(row.get(name) for name in table_scheme.attributes.attribute_names)
+                                for row in rows[table_scheme.name]]
+            for table_scheme in table_schemas if table_scheme.name in rows}
+
+def run(cur: sqlite3.Cursor, query: str) -> tuple[list[str], float]:
+    plan = [row[3] for row in cur.execute("EXPLAIN QUERY PLAN " + query)]
+    start = time.perf_counter()
+    cur.execute(query).fetchall()
+    return plan, time.perf_counter() - start
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    entries = [commands.ExtractedFile("%05d" % i, "2000-01-01", make_rows(rng, "%05d" % i), ["main"])
+               for i in range(ENTRIES)]
+    commands.write_rows(cur, entries)
+    con.commit()
+
+    results = {}
+    for name in ("without indexes", "with indexes"):
+        if name == "without indexes":
+            for table_scheme in table_schemas:
+                for index in table_scheme.attributes.indexes:
+                    cur.execute(f"DROP INDEX {table_scheme.name}_{'_'.join(index)}")
+        else:
+            for table_scheme in table_schemas:
+                for statement in table_scheme.create_indexes():
+                    cur.execute(statement)
+            cur.execute("ANALYZE")
+        results[name] = [run(cur, query) for query in QUERIES]
+
+    for index, query in enumerate(QUERIES):
+        print(query)
+        for name, query_results in results.items():
+            plan, elapsed = query_results[index]
+            print(f"  {name}: {elapsed * 1e3:.2f} ms")
+            for step in plan:
+                print(f"    {step}")
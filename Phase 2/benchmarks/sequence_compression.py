@@ -0,0 +1,71 @@
+"""
+Benchmarks compressing the sequences of the sequence store (see sequence_store.compress_sequence, and
+commands.init_database for turning it on), comparing
+the size of the sequences table, the time it takes to write the extracted rows, and the time it takes to
+read every row of the tables with sequences through their views, with and without compression.
+The mmCIF files in a directory are extracted once, and their rows are written to both databases.
+Run from the Phase 2 directory with "python benchmarks/sequence_compression.py [DIRECTORY]". The directory
+defaults to the one the integration tests read their entries from.
+"""
+
+import os
+import sys
+import sqlite3
+import time
+import tempfile
+
+sys.path.insert(0, os.getcwd())
+import commands
+import ingest
+import sequence_store
+from database import table_schemas, sequence_table
+
+sequence_tables = [table_scheme for table_scheme in table_schemas if table_scheme.attributes.sequences]
+
+def write(path: str, entries: list[commands.ExtractedFile], compress: bool) -> float:
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    commands.init_database(cur, compress_sequences=compress)
+    start = time.perf_counter()
+    commands.write_rows(cur, entries)
+    con.commit()
+    elapsed = time.perf_counter() - start
+    con.execute("VACUUM")
+    con.close()
+    return elapsed
+
+def size(path: str) -> tuple[int, int]:
+    """
+    Returns the bytes taken up by the sequences table, and by the sequences in it.
+    """
+    con = sqlite3.connect(path)
+    pages = con.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (sequence_table.name,)).fetchone()[0]
+    values = con.execute(f"SELECT TOTAL(length(CAST(sequence AS BLOB))) FROM {sequence_table.name}").fetchone()[0]
+    con.close()
+    return pages, values
+
+def read(path: str) -> tuple[int, float]:
+    """
+    Reads every row of every table with sequences through a new connection, with nothing decompressed yet.
+    """
+    sequence_store.decompress_sequence.cache_clear()
+    con = sqlite3.connect(path)
+    sequence_store.register_functions(con)
+    start = time.perf_counter()
+    rows = sum(len(con.execute(f"SELECT * FROM {table_scheme.name}").fetchall()) for table_scheme in sequence_tables)
+    elapsed = time.perf_counter() - start
+    con.close()
+    return rows, elapsed
+
+if __name__ == "__main__":
+    paths = sorted(ingest.find_files(sys.argv[1] if len(sys.argv) > 1 else "./database"))
+    entries = [commands.extract_file(path) for path in paths]
+    with tempfile.TemporaryDirectory() as directory:
+        for name, compress in (("uncompressed", False), ("compressed", True)):
+            path = os.path.join(directory, name + ".db")
+            elapsed = write(path, entries, compress)
+            pages, values = size(path)
+            rows, read_time = read(path)
+            print(f"{name}: sequences table {pages / 1024:.0f} KiB ({values / 1024:.0f} KiB of sequences), "
+                  f"written in {elapsed * 1e3:.1f} ms, read {rows} rows in {read_time * 1e3:.1f} ms")
+    print(f"{len(paths)} files")
@@ -0,0 +1,110 @@
+"""
+Benchmarks the size of the tables with sequences and the time of a cold scan of them, comparing tables
+that store their sequences themselves (as before sequence_store.py) against the sequence store.
+Scans read either every column (which joins the sequences back in) or only columns without sequences.
+Rows are synthetic, with roughly the shape of the PDB: chains of a few hundred residues, and several entries
+(and several chains of each entry) with the same sequence, as the same proteins get deposited again and again.
+Both databases hold the same rows: the tables that store their sequences themselves are copied out of the views.
+Run from the Phase 2 directory with "python benchmarks/sequence_store.py".
+"""
+
+import os
+import sys
+import random
+import sqlite3
+import time
+import tempfile
+
+sys.path.insert(0, os.getcwd())
+import commands
+import sequence_store
+from database import table_schemas, sequence_table
+
+ENTRIES = 2000
+PROTEINS = 800 # Distinct sequences, shared by the entries
+CHAINS = 2 # Chains per entry, all with the same sequence (homo-oligomers)
+LENGTH = 250 # Residues per chain
+
+sequence_tables = [table_scheme for table_scheme in table_schemas if table_scheme.attributes.sequences]
+
+def make_rows(entry_id: str, sequence: str) -> dict[str, list[tuple]]:
+    """
+    Rows with sequences in every sequence column, and short placeholders everywhere else.
+    """
+    values = {"entry_id": entry_id, "length": LENGTH, "start_id": 1, "end_id": LENGTH}
+    chains = [chr(ord("A") + i) for i in range(CHAINS)]
+    rows = {"chains": [dict(values, chain_id=chain, chain_sequence=sequence, annotated_chain_sequence=sequence)
+                       for chain in chains],
+            "subchains": [dict(values, chain_id=chain, subchain_id=chain, subchain_sequence=sequence,
+                               annotated_subchain_sequence=sequence) for chain in chains]}
+    return {table_scheme.name: [tuple(row.get(name, "x") for name in table_scheme.attributes.attribute_names)
+                                for row in rows[table_scheme.name]]
+            for table_scheme in sequence_tables}
+
+def copy_inline(path: str, inline_path: str):
+    """
+    Copies every table with sequences of the database at path into a new database,
+    with the sequences stored in the tables.
+    """
+    con = sqlite3.connect(inline_path)
+    sequence_store.register_functions(con)
+    con.execute("ATTACH DATABASE ? AS store", (path,))
+    for table_scheme in sequence_tables:
+        con.execute(f"CREATE TABLE {table_scheme.name} {str(table_scheme.attributes)}")
+        con.execute(f"INSERT INTO {table_scheme.name} SELECT * FROM store.{table_scheme.name}")
+    con.commit()
+    con.execute("DETACH DATABASE store")
+    con.execute("VACUUM")
+    con.close()
+
+def size(path: str, tables: list[str]) -> int:
+    """
+    Returns the bytes taken up by the given tables and their indexes.
+    """
+    con = sqlite3.connect(path)
+    res = con.execute(f"SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master "
+                      f"WHERE tbl_name IN ({', '.join('?' * len(tables))}))", tables)
+    result = res.fetchone()[0]
+    con.close()
+    return result
+
+def scan(path: str, columns: str) -> tuple[int, float]:
+    """
+    Reads the given columns of every row of every table with sequences through a new connection,
+    so that nothing is in SQLite's page cache.
+    """
+    con = sqlite3.connect(path)
+    sequence_store.register_functions(con)
+    start = time.perf_counter()
+    rows = sum(len(con.execute(f"SELECT {columns} FROM {table_scheme.name}").fetchall())
+               for table_scheme in sequence_tables)
+    elapsed = time.perf_counter() - start
+    con.close()
+    return rows, elapsed
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    sequences = [''.join(rng.choices("ACDEFGHIKLMNPQRSTVWY", k=LENGTH)) for i in range(PROTEINS)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "store.db")
+        inline_path = os.path.join(directory, "inline.db")
+        con = sqlite3.connect(path)
+        cur = con.cursor()
+        commands.init_database(cur)
+        entries = [commands.ExtractedFile("%04d" % i, "2000-01-01", make_rows("%04d" % i, rng.choice(sequences)),
+                                          [table_scheme.name for table_scheme in sequence_tables])
+                   for i in range(ENTRIES)]
+        commands.write_rows(cur, entries)
+        con.commit()
+        con.execute("VACUUM")
+        con.close()
+        copy_inline(path, inline_path)
+
+        stored_tables = [table_scheme.stored_name for table_scheme in sequence_tables] + [sequence_table.name]
+        inline_tables = [table_scheme.name for table_scheme in sequence_tables]
+        for name, database_path, tables in (("sequences in tables", inline_path, inline_tables),
+                                            ("sequence store", path, stored_tables)):
+            print(f"{name}: {size(database_path, tables) / 1024 ** 2:.1f} MiB")
+            for columns in ("*", "entry_id, length"):
+                rows, elapsed = scan(database_path, columns)
+                print(f"  scanned {columns} of {rows} rows in {elapsed * 1e3:.1f} ms")
@@ -0,0 +1,51 @@
+"""
+Benchmarks running every table extractor again on the mmCIF files in a directory, comparing parsing
+the files themselves against reading their entries from a structure cache (see structure_cache.py).
+Also checks that both give the same rows, and reports how much smaller the cached entries are, and how many
+atom sites the files have (parsing the files takes longer the more atoms they have, while the cached entries
+keep only a few atoms per residue). Content hashes are worked out before timing, as they come from the manifest.
+Run from the Phase 2 directory with "python benchmarks/structure_cache.py DIRECTORY".
+"""
+
+import os
+import sys
+import time
+import tempfile
+from gemmi import cif
+
+sys.path.insert(0, os.getcwd())
+import commands
+import ingest
+import scan
+import manifest
+from structure_cache import StructureCache
+
+def extract_all(paths: list[str], hashes: dict[str, str],
+                cache: StructureCache | None = None) -> tuple[list[commands.ExtractedFile], float]:
+    start = time.perf_counter()
+    extracted = [commands.extract_file(path, cache=cache, content_hash=hashes[path]) for path in paths]
+    return extracted, time.perf_counter() - start
+
+if __name__ == "__main__":
+    paths = sorted(ingest.find_files(sys.argv[1]))
+    hashes = {path: manifest.hash_file(path) for path in paths}
+    atoms = sum(len(cif.read(path).sole_block().find_values("_atom_site.id")) for path in paths)
+    with tempfile.TemporaryDirectory() as directory:
+        parsed, parse_time = extract_all(paths, hashes)
+        cache = StructureCache(os.path.join(directory, "cache.pack"))
+        snapshots, build_time = extract_all(paths, hashes, cache)
+        for path, extracted in zip(paths, snapshots):
+            cache.add(scan.entry_id_from_path(path), hashes[path], extracted.revision_date, extracted.snapshot)
+        cache.save()
+        cache_size = os.path.getsize(cache.path)
+
+        cache = StructureCache(cache.path)
+        cached, cache_time = extract_all(paths, hashes, cache)
+
+    assert [extracted.rows for extracted in parsed] == [extracted.rows for extracted in cached]
+    file_size = sum(os.path.getsize(path) for path in paths)
+    print(f"{len(paths)} files, {file_size / 1024:.0f} KiB, {atoms / len(paths):.0f} atom sites/file, "
+          f"cached in {cache_size / 1024:.0f} KiB")
+    # Building the cache parses the files too, and also makes the snapshots of their entries
+    for name, elapsed in (("parsing files", parse_time), ("building cache", build_time), ("reading cache", cache_time)):
+        print(f"{name}: {elapsed:.3f} s ({elapsed / len(paths) * 1e3:.2f} ms/file)")
@@ -0,0 +1,87 @@
+"""
+Benchmarks updating entries that are already stored, as after a wave of remediated files, comparing the old way
+(deleting every row of the entry, then inserting the extracted rows again) against commands.update_rows
+(which only writes the rows that changed). Compares the time it takes, the rows written, and the size of the
+write-ahead log that the updates leave behind.
+Rows are synthetic, with roughly the shape of a large entry (many coils, helices and strands). Most remediated
+entries come back with the same rows (only their revision date changes), and a few with a row changed,
+one added and one removed in a few tables.
+Run from the Phase 2 directory with "python benchmarks/update_rows.py".
+"""
+
+import os
+import sys
+import random
+import shutil
+import sqlite3
+import time
+import tempfile
+
+sys.path.insert(0, os.getcwd())
+import commands
+from database import table_schemas
+
+ENTRIES = 200
+CHANGED = 0.1 # Share of the entries that come back with different rows
+ROWS_PER_TABLE = {"main": 1, "experimental": 1, "entities": 5, "chains": 20, "subchains": 40,
+                  "helices": 200, "sheets": 20, "strands": 150, "coils": 400}
+
+def make_rows(entry_id: str, changed: bool = False) -> dict[str, list[tuple]]:
+    rows = {}
+    for table_scheme in table_schemas:
+        width = len(table_scheme.attributes.attribute_names)
+        count = ROWS_PER_TABLE[table_scheme.name]
+        table_rows = [(entry_id,) + tuple(f"{i}-{j}".ljust(20, "x") for j in range(width - 1)) for i in range(count)]
+        if changed and count > 1:
+            table_rows[0] = table_rows[0][:-1] + ("changed",)
+            table_rows[1] = (entry_id,) + tuple(f"{count}-{j}".ljust(20, "x") for j in range(width - 1))
+        rows[table_scheme.name] = table_rows
+    return rows
+
+def delete_and_insert(cur: sqlite3.Cursor, extracted: commands.ExtractedFile):
+    commands.delete_rows(cur, extracted.entry_id)
+    commands.write_rows(cur, [extracted])
+
+def update(path: str, entries: list[commands.ExtractedFile], method) -> tuple[float, int, int]:
+    """
+    Updates every given entry with the given method in one transaction. Returns the time it took,
+    the rows it wrote, and the size of the write-ahead log it left behind.
+    """
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA wal_autocheckpoint = 0")
+    cur = con.cursor()
+    commands.init_database(cur)
+    changes = con.total_changes
+    start = time.perf_counter()
+    for extracted in entries:
+        method(cur, extracted)
+    con.commit()
+    elapsed = time.perf_counter() - start
+    changes = con.total_changes - changes
+    wal_size = os.path.getsize(path + "-wal")
+    con.close()
+    return elapsed, changes, wal_size
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    entry_ids = ["%04d" % i for i in range(ENTRIES)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "base.db")
+        con = sqlite3.connect(path)
+        cur = con.cursor()
+        commands.init_database(cur)
+        commands.write_rows(cur, [commands.ExtractedFile(entry_id, "2000-01-01", make_rows(entry_id))
+                                  for entry_id in entry_ids])
+        con.commit()
+        con.close()
+
+        remediated = [commands.ExtractedFile(entry_id, "2020-01-01", make_rows(entry_id, rng.random() < CHANGED))
+                      for entry_id in entry_ids]
+        rows = sum(len(table_rows) for extracted in remediated for table_rows in extracted.rows.values())
+        print(f"{ENTRIES} entries, {rows} rows")
+        for name, method in (("delete and insert", delete_and_insert), ("update_rows", commands.update_rows)):
+            copy = os.path.join(directory, name + ".db")
+            shutil.copy(path, copy)
+            elapsed, changes, wal_size = update(copy, remediated, method)
+            print(f"{name}: {elapsed * 1e3:.1f} ms, {changes} rows written, write-ahead log {wal_size / 1024:.0f} KiB")
@@ -0,0 +1,51 @@
+"""
+This script contains functions for reading which mmCIF files changed in the mirror, so that only
+those files need to be processed instead of walking the whole directory tree.
+Two formats are accepted, and can be mixed within the same file:
+- The output of rsync run with --itemize-changes (-i), e.g. '>f+++++++++ ab/1abc.cif.gz' for a new file,
+  '>f.st...... ab/1abc.cif.gz' for a modified file, and '*deleting   ab/1abc.cif.gz' for a deleted file.
+  Lines that are not about files (directories, rsync's summary) are ignored.
+- A plain list of changed paths, one per line. Paths that no longer exist are treated as deleted.
+Relative paths are taken relative to the root directory of the mirror, as rsync prints them.
+"""
+
+import os
+import re
+
+# Update type, file type and attribute flags, e.g. '>f.st......' (rsync 3.x) or '>f.st....' (older versions)
+itemized_change = re.compile(r'^[<>ch.][fdLDS][.+?a-zA-Z ]{7,9} (.+)$')
+deletion = re.compile(r'^\*deleting +(.+)$')
+
+def is_cif_file(path: str) -> bool:
+    return re.search('./*.cif.*', path) is not None
+
+def read_change_list(list_path: str, rootdir: str) -> tuple[list[str], list[str]]:
+    """
+    Reads a list of changes to the mirror at rootdir.
+    Returns the paths of the mmCIF files that were added or modified, and the paths of those that were deleted.
+    """
+    changed = []
+    deleted = []
+    with open(list_path) as list_file:
+        for line in list_file:
+            line = line.rstrip('\n')
+            if not line.strip():
+                continue
+            if match := deletion.match(line):
+                path = os.path.join(rootdir, match.group(1))
+                if is_cif_file(path):
+                    deleted.append(path)
+            elif match := itemized_change.match(line):
+                # Only regular files ('f') can be mmCIF files
+                path = os.path.join(rootdir, match.group(1))
+                if line[1] == 'f' and is_cif_file(path):
+                    changed.append(path)
+            else:
+                path = os.path.join(rootdir, line.strip())
+                if not is_cif_file(path):
+                    continue
+                if os.path.exists(path):
+                    changed.append(path)
+                else:
+                    deleted.append(path)
+    return changed, deleted
@@ -1,73 +1,495 @@
 import sqlite3
+from contextlib import contextmanager
+from typing import NamedTuple, Callable, Iterator
 import gemmi
 from gemmi import cif
-from database import table_schemas
+from database import table_schemas, bookkeeping_schemas, completion_table, table_version_table, initial_version
+from database import sequence_table
+from database import select_tables, metadata_tables, letter_code_tables
+from table import Table
+from extract import get_revision_date
 from polymer_sequence import PolymerSequence
+import polymer_sequence
+from context import EntryContext
+import scan
+import structure_cache
+import sequence_store
+from structure_cache import StructureCache
 
-def init_database(cur: sqlite3.Cursor):
-    for table_schema in table_schemas:
+def init_database(cur: sqlite3.Cursor, compress_sequences: bool | None = None):
+    """
+    Creates the tables of the database, and sets up the given connection to write to it.
+    compress_sequences turns on compressing sequences (see sequence_store.configure_compression).
+    If it is not given, the database keeps what it was created with, and new databases do not compress.
+    """
+    for table_schema in table_schemas + bookkeeping_schemas:
         cur.execute(table_schema.create_table())
+    migrate_table_versions(cur)
+    sequence_store.register_functions(cur.connection)
+    sequence_store.configure_compression(cur, compress_sequences)
+    sequence_store.migrate_tables(cur, table_schemas)
+    for table_schema in table_schemas:
+        if table_schema.stored_name != table_schema.name:
+            # Views are created again every time, so that they always read their columns the way the schema says
+            cur.execute(f"DROP VIEW IF EXISTS {table_schema.name}")
+            cur.execute(table_schema.create_view(sequence_table))
+        for statement in table_schema.create_indexes():
+            cur.execute(statement)
+
+def migrate_table_versions(cur: sqlite3.Cursor):
+    """
+    Adds the column of the one-letter codes to the table versions of databases created before it was recorded,
+    whose sequences were all translated with the default codes (which count as the same as NULL).
+    """
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(" + table_version_table.name + ")").fetchall()]
+    if "letter_codes" not in columns:
+        cur.execute("ALTER TABLE " + table_version_table.name + " ADD COLUMN letter_codes VARCHAR")
+
+def table_version(entry_id: str, table_scheme: Table) -> tuple[str, str, int, str | None]:
+    """
+    The row of the table versions that records the given table as extracted from the given entry now.
+    """
+    letter_codes = polymer_sequence.letter_codes_id if table_scheme in letter_code_tables else None
+    return (entry_id, table_scheme.name, table_scheme.version, letter_codes)
+
+def record_completed_entries(cur: sqlite3.Cursor):
+    """
+    Records every entry that has data in all tables as completed, if no entry has been recorded yet.
+    Used once for databases that were filled before entries were recorded as completed, where the only
+    sign of an interrupted insertion is a missing row in the last table (coils).
+    """
+    if cur.execute("SELECT entry_id FROM " + completion_table.name + " LIMIT 1").fetchone():
+        return
+    cur.execute("INSERT INTO " + completion_table.name + " SELECT entry_id, revision_date FROM "\
+                + table_schemas[0].name + " WHERE entry_id IN (SELECT entry_id FROM " + table_schemas[-1].name + ")")
+
+def load_revision_dates(cur: sqlite3.Cursor) -> dict[str, str]:
+    """
+    Loads the revision date of every completed entry, keyed by entry ID.
+    Used to skip up to date files without parsing them.
+    """
+    res = cur.execute("SELECT entry_id, revision_date FROM " + completion_table.name)
+    return dict(res.fetchall())
+
+def load_stale_tables(cur: sqlite3.Cursor) -> dict[str, list[str]]:
+    """
+    Finds the tables of every completed entry whose rows were extracted by an older version
+    of their extractor (see Table.version), or translated with other one-letter codes than the current ones
+    (see database.letter_code_tables). Returns the names of those tables, keyed by entry ID.
+    Entries whose tables are all up to date are left out.
+    """
+    stale_tables = {}
+    for table_scheme in table_schemas:
+        condition = "COALESCE(v.version, ?) < ?"
+        parameters = (table_scheme.name, initial_version, table_scheme.version)
+        if table_scheme in letter_code_tables:
+            condition += " OR COALESCE(v.letter_codes, '') != ?"
+            parameters += (polymer_sequence.letter_codes_id,)
+        elif table_scheme.version <= initial_version:
+            continue # No entry can be behind, so the table does not need to be looked up
+        res = cur.execute("SELECT c.entry_id FROM " + completion_table.name + " c LEFT JOIN "\
+                          + table_version_table.name + " v ON v.entry_id = c.entry_id AND v.table_name = ?"\
+                          + " WHERE " + condition, parameters)
+        for (entry_id,) in res.fetchall():
+            stale_tables.setdefault(entry_id, []).append(table_scheme.name)
+    return stale_tables
+
+def is_up_to_date(file_path: str, revision_dates: dict[str, str], revision_date: str | None = None) -> bool:
+    """
+    Checks whether the entry of a file is already fully stored and up to date, using only
+    the file name and the file's revision history, so no structure gets built.
+    If the revision date of the file is already known (e.g. from the structure cache), the file is not read at all.
+    """
+    entry_id = scan.entry_id_from_path(file_path)
+    if entry_id not in revision_dates:
+        return False
+    if revision_date is None:
+        revision_date = scan.read_revision_date(file_path)
+    return not revision_dates[entry_id] < revision_date
 
-def check_file(cur: sqlite3.Cursor, file_path: str, verbose: bool = True):
+def entry_status(cur: sqlite3.Cursor, entry_id: str, revision_date: str) -> str:
+    """
+    Compares the given entry against what is already stored in the database.
+    Returns "new" if the entry is not in the database, "outdated" if the stored data
+    is from an older revision, "corrupted" if the entry was never recorded as completed
+    (i.e. its insertion was interrupted), and "current" otherwise.
+    """
+    # Check if protein file exists in database
+    res = cur.execute(table_schemas[0].retrieve_entry(("entry_id",)), (entry_id,))
+    if not res.fetchone(): # if there is no row in the main table with such entry ID
+        return "new"
+
+    # Check if protein file data is up to date
+    res = cur.execute(table_schemas[0].retrieve_entry(("revision_date",)), (entry_id,))
+    if res.fetchone()[0] < revision_date:
+        return "outdated"
+
+    # Check that protein file data did not get corrupted
+    res = cur.execute(completion_table.retrieve_entry(("entry_id",)), (entry_id,))
+    # if the entry was not recorded as completed, then its insertion got interrupted.
+    if not res.fetchone():
+        return "corrupted"
+    return "current"
+
+def structure_from_document(doc: cif.Document) -> gemmi.Structure:
+    """
+    Builds the structure of a protein from its already parsed document, so that the file
+    does not need to be read a second time. Mirrors what gemmi.read_structure does for mmCIF files.
+    """
+    struct = gemmi.make_structure_from_block(doc.sole_block())
+    struct.merge_chain_parts()
+    return struct
+
+def metadata_structure_from_document(doc: cif.Document, chain_names: list[str]) -> gemmi.Structure:
+    """
+    Builds the structure of a protein from a document without atom sites, and the names of its chains
+    (see scan.read_metadata). The structure gets a single model with an empty chain for every chain,
+    which is all that the extractors of the metadata tables (see database.metadata_tables) need out of the model.
+    """
+    struct = gemmi.make_structure_from_block(doc.sole_block())
+    model = gemmi.Model('1')
+    for chain_name in chain_names:
+        model.add_chain(gemmi.Chain(chain_name))
+    struct.add_model(model)
+    return struct
+
+class ExtractedFile(NamedTuple):
+    entry_id: str
+    revision_date: str
+    rows: dict[str, list[tuple]] | None # None if the file was found to be up to date before it was parsed
+    tables: list[str] | None = None # Names of the tables that were extracted, if not every table was
+    snapshot: bytes | None = None # Compact document to add to the structure cache, if the file had to be parsed
+
+def check_file(cur: sqlite3.Cursor, file_path: str, verbose: bool = True,
+               revision_dates: dict[str, str] | None = None, force: bool = False) -> str | None:
+    """
+    Adds or updates the data of a file in the database if needed.
+    If revision_dates (see load_revision_dates) is given, files that are already up to date
+    are skipped before they get parsed. If force is set, the data is updated even if it is up to date.
+    Returns the entry ID of the file, or None if the file could not be checked.
+    """
     try:
         if verbose:
             print("Checking " + file_path)
         struct = None
-        struct = gemmi.read_structure(file_path)
+        if not force and revision_dates is not None and is_up_to_date(file_path, revision_dates):
+            return scan.entry_id_from_path(file_path)
         doc = cif.read(file_path)
+        struct = structure_from_document(doc)
         sequence = PolymerSequence(doc)
 
-        # Check if protein file exists in database
-        res = cur.execute("SELECT entry_id FROM " + table_schemas[0].name\
-                            + " WHERE entry_id = '" + struct.info["_entry.id"] + "'")
-        if not res.fetchone(): # if there is no row in the main table with such entry ID
+        revision_date = get_revision_date(doc.sole_block())
+        status = entry_status(cur, struct.info["_entry.id"], revision_date)
+        if status == "new":
             if verbose:
                 print("Adding " + file_path)
             insert_file(cur, struct, doc, sequence)
-
-        else: # Check if protein file data is up to date
-            block = doc.sole_block()
-            revision_date = block.find_value("_pdbx_audit_revision_history.revision_date")
-            if revision_date is None:
-                revision_date = block.find_loop("_pdbx_audit_revision_history.revision_date")[-1]
-            res = cur.execute("SELECT revision_date FROM " + table_schemas[0].name\
-                              + " WHERE entry_id = '" + struct.info["_entry.id"] + "'")
-            if res.fetchone()[0] < revision_date:
-                if verbose:
-                    print("Updating " + file_path)
-                update_file(cur, struct, doc, sequence)
-
-            else: # Check that protein file data did not get corrupted
-                res = cur.execute("SELECT entry_id FROM " + table_schemas[-1].name\
-                                + " WHERE entry_id = '" + struct.info["_entry.id"] + "'")
-                # if there is no row in the last table (coils) with such entry ID, then something went wrong.
-                # I checked and every protein has some rows in the coils table.
-                if not res.fetchone():
-                    if verbose:
-                        print("Data corrupted, fixing " + file_path)
-                    update_file(cur, struct, doc, sequence)
+        elif status == "outdated" or (status == "current" and force):
+            if verbose:
+                print("Updating " + file_path)
+            update_file(cur, struct, doc, sequence)
+        elif status == "corrupted":
+            if verbose:
+                print("Data corrupted, fixing " + file_path)
+            update_file(cur, struct, doc, sequence)
+        return struct.info["_entry.id"]
 
     except Exception as error:
-        if struct is not None:  
+        if struct is not None:
             print(struct.name)
             print(error)
         else:
             print(error)
-            
+        return None
 
-def insert_file(cur: sqlite3.Cursor, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence):
+def extract_file(file_path: str, revision_dates: dict[str, str] | None = None, tables: list[str] | None = None,
+                 cache: StructureCache | None = None, content_hash: str | None = None) -> ExtractedFile | None:
+    """
+    Parses a file and runs every table extractor on it, without touching the database.
+    If revision_dates is given and the file is already up to date, the file is not parsed
+    and no rows are returned, unless tables is given, in which case only the extractors of
+    those tables (see database.select_tables) are run. If those are all metadata tables,
+    the atom sites of the file are not even parsed.
+    If cache is given, entries that are cached for the current contents of their file (given by content_hash,
+    see manifest.make_record) are read from the cache instead, and their revision date is taken from there.
+    The snapshot of every other entry that gets parsed in full is returned so that it can be added to the cache.
+    Returns None if the file could not be read.
+    Used by worker processes, so everything returned must be picklable.
+    """
+    struct = None
+    try:
+        entry_id = scan.entry_id_from_path(file_path)
+        cached_revision_date = None if cache is None else cache.revision_date(entry_id, content_hash)
+        selected = None
+        if revision_dates is not None and is_up_to_date(file_path, revision_dates, cached_revision_date):
+            if tables is None:
+                return ExtractedFile(entry_id, revision_dates[entry_id], None)
+            selected = select_tables(tables)
+        doc = None
+        if cached_revision_date is not None:
+            doc = cache.read(entry_id, content_hash)
+        parsed = doc is None
+        if not parsed:
+            struct = structure_from_document(doc)
+        elif selected is not None and all(table_scheme in metadata_tables for table_scheme in selected):
+            doc, chain_names = scan.read_metadata(file_path)
+            struct = metadata_structure_from_document(doc, chain_names)
+            parsed = False # Without atom sites, the document cannot be cached
+        else:
+            doc = cif.read(file_path)
+            struct = structure_from_document(doc)
+        sequence = PolymerSequence(doc)
+        extracted = extract_entry(struct, doc, sequence, selected)
+        if cache is not None and parsed:
+            extracted = extracted._replace(snapshot=structure_cache.make_snapshot(doc))
+        return extracted
+
+    except Exception as error:
+        if struct is not None:
+            print(struct.name)
+        print(file_path)
+        print(error)
+        return None
+
+@contextmanager
+def savepoint(cur: sqlite3.Cursor, name: str) -> Iterator[None]:
+    """
+    Runs the body in a savepoint with the given name, and rolls it back if the body raises sqlite3.Error.
+    Outside a transaction, a savepoint would start one and commit it once it is released, behind the back of
+    whoever commits (see ingest_profile.CommitTracker), so a transaction is opened with BEGIN instead and left open.
+    """
+    if cur.connection.in_transaction:
+        cur.execute("SAVEPOINT " + name)
+        try:
+            yield
+        except sqlite3.Error:
+            cur.execute("ROLLBACK TO " + name)
+            raise
+        finally:
+            cur.execute("RELEASE " + name)
+    else:
+        cur.execute("BEGIN")
+        try:
+            yield
+        except sqlite3.Error:
+            cur.execute("ROLLBACK")
+            raise
+
+class RowBatch:
+    """
+    Buffers the rows of many entries per table, so that each table gets written with a single
+    executemany per flush instead of one execute per row.
+    If writing a batch fails, the entries are written one by one, and only the ones that fail get dropped.
+    """
+    def __init__(self, max_rows: int = 20000):
+        self.max_rows = max_rows
+        self.entries: list[tuple[ExtractedFile, Callable[[], None] | None]] = []
+        self.entry_ids = set()
+        self.row_count = 0
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self.entry_ids
+
+    def add(self, cur: sqlite3.Cursor, extracted: ExtractedFile, on_written: Callable[[], None] | None = None):
+        """
+        Buffers the rows of an entry, flushing the batch once it holds max_rows rows.
+        on_written is called once the rows are written to the database.
+        """
+        self.entries.append((extracted, on_written))
+        self.entry_ids.add(extracted.entry_id)
+        self.row_count += sum(len(table_rows) for table_rows in extracted.rows.values())
+        if self.row_count >= self.max_rows:
+            self.flush(cur)
+
+    def flush(self, cur: sqlite3.Cursor):
+        if not self.entries:
+            return
+        try:
+            with savepoint(cur, "row_batch"):
+                write_rows(cur, [extracted for extracted, on_written in self.entries])
+            written = self.entries
+        except sqlite3.Error:
+            written = [entry for entry in self.entries if self.write_entry(cur, entry[0])]
+        for extracted, on_written in written:
+            if on_written is not None:
+                on_written()
+        self.entries = []
+        self.entry_ids = set()
+        self.row_count = 0
+
+    def write_entry(self, cur: sqlite3.Cursor, extracted: ExtractedFile) -> bool:
+        try:
+            with savepoint(cur, "row_batch_entry"):
+                write_rows(cur, [extracted])
+            return True
+        except sqlite3.Error as error:
+            print(extracted.entry_id)
+            print(error)
+            return False
+
+def write_file(cur: sqlite3.Cursor, file_path: str, extracted: ExtractedFile,
+               verbose: bool = True, force: bool = False,
+               batch: RowBatch | None = None, on_written: Callable[[], None] | None = None) -> bool:
+    """
+    Writes rows produced by extract_file into the database, following the same rules as check_file.
+    If batch is given, the rows of new entries are buffered in it instead of being written straight away.
+    Entries that are already stored only get the rows that changed written (see update_rows).
+    on_written is called once the rows are written, or straight away if nothing needs writing.
+    Returns whether the file was written (or buffered) successfully.
+    """
+    try:
+        if verbose:
+            print("Checking " + file_path)
+        if extracted.rows is None:
+            if on_written is not None:
+                on_written()
+            return True
+        entry_id = extracted.entry_id
+        if batch is not None and entry_id in batch:
+            # The status of the entry depends on the rows that are still buffered
+            batch.flush(cur)
+        status = entry_status(cur, entry_id, extracted.revision_date)
+        if extracted.tables is not None:
+            # Only some of the tables were extracted, which is only enough for entries that are already stored
+            if status != "current":
+                print(entry_id + " needs every table to be extracted, but only " + ', '.join(extracted.tables)\
+                      + " were")
+                return False
+            if verbose:
+                print("Updating " + ', '.join(extracted.tables) + " of " + file_path)
+        elif status == "current" and not force:
+            if on_written is not None:
+                on_written()
+            return True
+        elif status == "new":
+            if verbose:
+                print("Adding " + file_path)
+            if batch is not None:
+                batch.add(cur, extracted, on_written)
+            else:
+                write_rows(cur, [extracted])
+                if on_written is not None:
+                    on_written()
+            return True
+        elif verbose:
+            if status == "corrupted":
+                print("Data corrupted, fixing " + file_path)
+            else:
+                print("Updating " + file_path)
+        # Entries that are already stored are updated straight away rather than batched, as only their rows
+        # that changed get written. If that fails, the entry is left as it was.
+        with savepoint(cur, "update_entry"):
+            update_rows(cur, extracted)
+        if on_written is not None:
+            on_written()
+        return True
+
+    except Exception as error:
+        print(extracted.entry_id)
+        print(error)
+        return False
+
+def extract_rows(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                 tables: list[Table] | None = None) -> dict[str, list[tuple]]:
+    """
+    Runs the extractor of every table (or only of the given tables) on the given protein, keyed by table name.
+    """
+    context = EntryContext(struct, doc, sequence)
+    return {table_scheme.name: table_scheme.extract_data(struct, doc, sequence, context)
+            for table_scheme in (table_schemas if tables is None else tables)}
+
+def write_rows(cur: sqlite3.Cursor, entries: list[ExtractedFile]):
+    """
+    Inserts the rows of the given entries, with one executemany per table, records the version
+    of every table extracted from them, and records the entries that had every table extracted as completed.
+    Sequences are stored once, in the sequences table (see sequence_store.py).
+    """
+    sequences = {}
     for table_scheme in table_schemas:
-        for data in table_scheme.extract_data(struct, doc, sequence):
-            statement = table_scheme.insert_row(data)
-            cur.execute(statement, data)
+        data = [row for extracted in entries if table_scheme.name in extracted.rows
+                for row in extracted.rows[table_scheme.name]]
+        if data:
+            if table_scheme.attributes.sequences:
+                data = sequence_store.hash_sequences(table_scheme, data, sequences)
+            cur.executemany(table_scheme.insert_statement, data)
+    sequence_store.store_sequences(cur, sequences)
+    versions = [table_version(extracted.entry_id, table_scheme)
+                for extracted in entries for table_scheme in table_schemas if table_scheme.name in extracted.rows]
+    if versions:
+        cur.executemany("INSERT OR REPLACE INTO " + table_version_table.name + " VALUES(?, ?, ?, ?)", versions)
+    completed = [(extracted.entry_id, extracted.revision_date) for extracted in entries if extracted.tables is None]
+    if completed:
+        cur.executemany(completion_table.insert_statement, completed)
 
-def update_file(cur: sqlite3.Cursor, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence):
+def delete_rows(cur: sqlite3.Cursor, entry_id: str, tables: list[str] | None = None):
+    """
+    Deletes the rows of an entry from every table (or only from the tables with the given names).
+    The entry is only no longer recorded as completed if its rows are deleted from every table.
+    """
+    if tables is None:
+        tables_to_delete = [completion_table] + table_schemas
+    else:
+        tables_to_delete = [table_scheme for table_scheme in [completion_table] + table_schemas
+                            if table_scheme.name in tables]
+    for table_scheme in tables_to_delete:
+        cur.execute(table_scheme.delete_entry_statement, (entry_id,))
+
+def insert_rows(cur: sqlite3.Cursor, extracted: ExtractedFile):
+    write_rows(cur, [extracted])
+
+def update_rows(cur: sqlite3.Cursor, extracted: ExtractedFile):
     """
-    Used to add data to all tables if the given protein only has data in some tables, or if data is not up to date.
-    This may happen if regular file insertion was interrupted.
+    Replaces the stored rows of an entry with the given ones, writing only what changed: rows are matched
+    by primary key, rows that differ from the stored ones are upserted, and stored rows that were not
+    extracted again are deleted. Rows that did not change are not written at all.
+    Only the extracted tables are touched. Records the versions of the tables, and the entry as completed
+    if every table was extracted. Also works for entries that are not stored yet, or only partly.
     """
+    sequences = {}
     for table_scheme in table_schemas:
-        cur.execute("DELETE FROM " + table_scheme.name + " WHERE entry_id = '" + struct.info["_entry.id"] + "'")
-        for data in table_scheme.extract_data(struct, doc, sequence):
-            statement = table_scheme.insert_row(data)
-            cur.execute(statement, data)
\ No newline at end of file
+        if table_scheme.name not in extracted.rows:
+            continue
+        data = extracted.rows[table_scheme.name]
+        if table_scheme.attributes.sequences:
+            data = sequence_store.hash_sequences(table_scheme, data, sequences)
+        stored = {tuple(row[i] for i in table_scheme.key_positions): row
+                  for row in cur.execute(table_scheme.select_entry_statement, (extracted.entry_id,)).fetchall()}
+        rows = {}
+        for row in data:
+            key = tuple(row[i] for i in table_scheme.key_positions)
+            if key in rows:
+                # Same as what inserting the rows would run into
+                raise sqlite3.IntegrityError("UNIQUE constraint failed: " + table_scheme.stored_name)
+            rows[key] = row
+        vanished = [key for key in stored if key not in rows]
+        if vanished:
+            cur.executemany(table_scheme.delete_statement, vanished)
+        changed = [row for key, row in rows.items() if stored.get(key) != row]
+        if changed:
+            cur.executemany(table_scheme.upsert_statement, changed)
+    sequence_store.store_sequences(cur, sequences)
+    versions = [table_version(extracted.entry_id, table_scheme)
+                for table_scheme in table_schemas if table_scheme.name in extracted.rows]
+    if versions:
+        cur.executemany(table_version_table.upsert_statement, versions)
+    if extracted.tables is None:
+        cur.executemany(completion_table.upsert_statement, [(extracted.entry_id, extracted.revision_date)])
+
+def extract_entry(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                  tables: list[Table] | None = None) -> ExtractedFile:
+    """
+    Runs the extractor of every table (or only of the given tables) on the given protein.
+    """
+    table_names = None if tables is None else [table_scheme.name for table_scheme in tables]
+    return ExtractedFile(struct.info["_entry.id"], get_revision_date(doc.sole_block()),
+                         extract_rows(struct, doc, sequence, tables), table_names)
+
+def insert_file(cur: sqlite3.Cursor, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence):
+    insert_rows(cur, extract_entry(struct, doc, sequence))
+
+def update_file(cur: sqlite3.Cursor, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence):
+    """
+    Used to add data to all tables if the given protein was not recorded as completed, or if data is not up to date.
+    This may happen if regular file insertion was interrupted. Only the rows that changed are written (see update_rows).
+    """
+    update_rows(cur, extract_entry(struct, doc, sequence))
@@ -0,0 +1,54 @@
+"""
+This script contains the functions that read one-letter codes from the Chemical Component Dictionary (CCD),
+so that modified residues can be translated to the one-letter codes of their parents instead of 'X'.
+Important things to note:
+- The CCD (components.cif or components.cif.gz, from wwPDB) takes a while to parse, so the translation table
+  is cached next to it in a binary file, which is read instead as long as it is newer than the dictionary.
+- A component keeps its own one-letter code if it has one. Otherwise, it takes the code of its parent component
+  (_chem_comp.mon_nstd_parent_comp_id), if it has a single parent with a one-letter code.
+- Only components that translate to a single letter are kept; every other component translates to 'X'.
+"""
+
+import os
+import marshal
+from gemmi import cif
+
+cache_suffix = ".letters"
+
+def read_component_dictionary(ccd_path: str) -> dict[str, str]:
+    """
+    Returns the one-letter code of every component in the CCD that has one, keyed by component ID.
+    """
+    codes = {}
+    parents = {}
+    for block in cif.read(ccd_path):
+        code = block.find_value("_chem_comp.one_letter_code")
+        parent = block.find_value("_chem_comp.mon_nstd_parent_comp_id")
+        if code is not None and not cif.is_null(code) and len(cif.as_string(code)) == 1:
+            codes[block.name] = cif.as_string(code).upper()
+        elif parent is not None and not cif.is_null(parent):
+            parents[block.name] = cif.as_string(parent).strip()
+
+    for component, parent in parents.items():
+        if parent in codes:
+            codes[component] = codes[parent]
+    return codes
+
+def load_letter_codes(ccd_path: str, cache_path: str | None = None) -> dict[str, str]:
+    """
+    Returns the one-letter codes of the components in the CCD, read from the binary cache if it is
+    up to date, and from the CCD itself (refreshing the cache) otherwise.
+    """
+    if cache_path is None:
+        cache_path = ccd_path + cache_suffix
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(ccd_path):
+        with open(cache_path, "rb") as cache:
+            return marshal.load(cache)
+
+    codes = read_component_dictionary(ccd_path)
+    # Write to a temporary file first, so that an interrupted run never leaves a truncated cache behind
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, "wb") as cache:
+        marshal.dump(codes, cache)
+    os.replace(temp_path, cache_path)
+    return codes
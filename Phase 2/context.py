@@ -0,0 +1,117 @@
+"""
+This script contains the per-entry context that the table extractors share.
+Important things to note:
+- The context is built once per structure, and computes things lazily the first time an extractor
+  asks for them, so every helix and strand is only resolved once, no matter how many tables need it.
+- Helices and strands are resolved to the chains their ends are in, and to the primary sequence IDs
+  (label_seq) of their ends. The start of a helix or strand may come after its end, in which case
+  the segment is read backwards.
+- Chains are looked up by name, which is unique once the chain parts of a structure are merged
+  (see commands.structure_from_document).
+- The ends of helices and strands are given by their author sequence IDs. Rather than looking every
+  end up in its chain (which scans the residues of the chain), the primary sequence ID of every residue
+  of the first conformer of every polymer is indexed once by its author sequence ID. Ends on other residues
+  (e.g. a ligand, or a residue that is only in an alternate conformer) are still looked up in their chain.
+"""
+
+import gemmi
+from gemmi import cif
+from typing import NamedTuple
+from functools import cached_property
+from polymer_sequence import PolymerSequence
+
+class Segment(NamedTuple):
+    chain: str # Name of the chain the segment starts in
+    end_chain: str # Name of the chain the segment ends in, which should be the same as chain
+    start_id: int
+    end_id: int
+
+    @property
+    def direction(self) -> int:
+        """
+        1 if the segment is read forwards along its chain, -1 if it is read backwards.
+        """
+        return 1 if self.end_id >= self.start_id else -1
+
+    def in_one_chain(self) -> bool:
+        return self.chain == self.end_chain
+
+class EntryContext:
+    def __init__(self, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence):
+        self.struct = struct
+        self.doc = doc
+        self.sequence = sequence
+        self.entry_id = struct.info["_entry.id"]
+        self.model = struct[0]
+        self.polymers = {}
+        self.first_conformers = {}
+        self.one_letter_sequences = {}
+
+    @cached_property
+    def residue_positions(self) -> dict[str, dict[tuple[int, str], int]]:
+        """
+        The primary sequence ID (label_seq) of every residue of every polymer, keyed by chain name, then by
+        author sequence ID (number and insertion code). Built in a single pass over the polymers of the model.
+        """
+        positions = {}
+        for chain in self.model:
+            chain_positions = {}
+            for residue in self.first_conformer(chain):
+                chain_positions.setdefault((residue.seqid.num, residue.seqid.icode), residue.label_seq)
+            positions[chain.name] = chain_positions
+        return positions
+
+    def position(self, address: gemmi.AtomAddress) -> int:
+        """
+        Returns the primary sequence ID of the residue at the given address.
+        Raises the same errors as looking the residue up in its chain if it is not in the chain at all.
+        """
+        seqid = address.res_id.seqid
+        chain_positions = self.residue_positions.get(address.chain_name, {})
+        if (seqid.num, seqid.icode) in chain_positions:
+            return chain_positions[(seqid.num, seqid.icode)]
+        chain = self.model.find_cra(address).chain
+        return chain[str(seqid.num) + seqid.icode][0].label_seq
+
+    def resolve(self, start: gemmi.AtomAddress, end: gemmi.AtomAddress) -> Segment:
+        """
+        Resolves the ends of a helix or strand to their chains and primary sequence IDs.
+        """
+        return Segment(start.chain_name, end.chain_name, self.position(start), self.position(end))
+
+    @cached_property
+    def helices(self) -> list[Segment]:
+        return [self.resolve(helix.start, helix.end) for helix in self.struct.helices]
+
+    @cached_property
+    def strands(self) -> list[list[Segment]]:
+        """
+        The resolved strands of every sheet, in the same order as struct.sheets.
+        """
+        return [[self.resolve(strand.start, strand.end) for strand in sheet.strands] for sheet in self.struct.sheets]
+
+    def segment_sequence(self, segment: Segment) -> tuple[str, int]:
+        """
+        Returns the (unannotated) one-letter sequence of a helix or strand, and its signed length.
+        """
+        if not segment.in_one_chain():
+            return ("MULTIPLE CHAINS ERROR", 0)
+        return self.sequence.get_chain_subsequence(segment.chain, segment.start_id, segment.end_id)
+
+    def polymer(self, chain: gemmi.Chain) -> gemmi.ResidueSpan:
+        if chain.name not in self.polymers:
+            self.polymers[chain.name] = chain.get_polymer()
+        return self.polymers[chain.name]
+
+    def first_conformer(self, chain: gemmi.Chain) -> list[gemmi.Residue]:
+        if chain.name not in self.first_conformers:
+            self.first_conformers[chain.name] = list(self.polymer(chain).first_conformer())
+        return self.first_conformers[chain.name]
+
+    def one_letter_sequence(self, chain: gemmi.Chain) -> str:
+        """
+        Returns the annotated one-letter sequence of the polymer of a chain.
+        """
+        if chain.name not in self.one_letter_sequences:
+            self.one_letter_sequences[chain.name] = self.polymer(chain).make_one_letter_sequence()
+        return self.one_letter_sequences[chain.name]
@@ -5,6 +5,9 @@ import extract
 
 # All the table schemas that get produced in the database.
 # First component is table name, second is all the attributes.
+# Primary keys start with entry_id, so looking up the rows of an entry, or joining tables on entry_id
+# (and e.g. sheet_id, for strands and sheets), is served by them. Secondary indexes (see Attributes.indexes)
+# are only declared for columns that analysis queries filter on across entries.
 
 entry_id = ("entry_id", "VARCHAR(5) NOT NULL")
 chain_id = ("chain_id", "VARCHAR(5) NOT NULL")
@@ -19,7 +22,8 @@ main_table_attributes = Attributes[extract.MainData]\
       ("source_organism", "VARCHAR(200)"), ("revision_date", "VARCHAR(50)"), ("chains", "VARCHAR"),
       ("space_group", "VARCHAR(20)"), ("Z_value", "INT"), ("a", "FLOAT"), ("b", "FLOAT"), ("c", "FLOAT"),
       ("alpha", "FLOAT"), ("beta", "FLOAT"), ("gamma", "FLOAT")],
-      primary_keys=["entry_id"])
+      primary_keys=["entry_id"],
+      indexes=[["complex_type"], ["source_organism"]])
 main_table = Table("main", main_table_attributes, extract.insert_into_main_table)
 
 experimental_table_attributes = Attributes[extract.ExperimentalData]\
@@ -42,6 +46,8 @@ chain_table_attributes = Attributes[extract.ChainData]\
     ([entry_id, chain_id, ("subchains", "VARCHAR"), unconfirmed, ("chain_sequence", "VARCHAR"),
       ("annotated_chain_sequence", "VARCHAR"), start_id, end_id, length, ("author_start_id", "INT"), ("author_end_id", "INT")],
       primary_keys=["entry_id", "chain_id"],
+      sequences=["chain_sequence", "annotated_chain_sequence"],
+      indexes=[["chain_id"]],
       foreign_keys={"entry_id": ("main", "entry_id")})
 chain_table = Table("chains", chain_table_attributes, extract.insert_into_chain_table)
 
@@ -50,6 +56,7 @@ subchain_table_attributes = Attributes[extract.SubchainData]\
       ("subchain_sequence", "VARCHAR"), ("annotated_subchain_sequence", "VARCHAR"),
       start_id, end_id, length],
       primary_keys=["entry_id", "subchain_id"],
+      sequences=["subchain_sequence", "annotated_subchain_sequence"],
       foreign_keys={"entry_id": ("main", "entry_id"), "entity_id": ("entities", "entity_id"),
                     "chain_id": ("chains", "chain_id")})
 subchain_table = Table("subchains", subchain_table_attributes, extract.insert_into_subchain_table)
@@ -85,6 +92,74 @@ coil_table = Table("coils", coil_table_attributes, extract.insert_into_coil_tabl
 table_schemas: list[Table] = [main_table, experimental_table, entity_table, chain_table,
                               subchain_table, helix_table, sheet_table, strand_table, coil_table]
 
+# Tables that are extracted without the atom sites of a file (see scan.read_metadata),
+# as their extractors only need the names of the chains out of the model of a structure.
+metadata_tables: list[Table] = [main_table, experimental_table, entity_table]
+
+# Tables whose sequences are translated with the one-letter codes of polymer_sequence.letter_codes,
+# which are recorded with their versions, so that changing them (e.g. with --components) makes these tables stale.
+letter_code_tables: list[Table] = [chain_table, subchain_table, helix_table, strand_table, coil_table]
+
+def select_tables(names: list[str]) -> list[Table]:
+    """
+    Returns the tables with the given names, in the same order as table_schemas.
+    Only the given tables are selected, not the tables they reference: they are only extracted again
+    for entries that are already stored in full (see commands.write_file), which have the rows to refer to.
+    """
+    unknown = [name for name in names if name not in [table_scheme.name for table_scheme in table_schemas]]
+    if unknown:
+        raise ValueError("Unknown tables: " + ', '.join(unknown))
+    return [table_scheme for table_scheme in table_schemas if table_scheme.name in names]
+
+# Version of the extractors in extract.py. Bump whenever the extractors change what they produce
+# in a way that affects every table, so that files ingested with an older version get extracted again.
+# If only some extractors change, bump the versions of their tables instead, so that only those
+# tables are extracted again (see ingest.ingest_stale).
+extractor_version = 1
+
+# Bookkeeping tables, which are not filled by extractors.
+file_table_attributes = Attributes\
+    ([("path", "VARCHAR NOT NULL"), entry_id, ("size", "INT"), ("mtime", "FLOAT"),
+      ("content_hash", "VARCHAR(64)"), ("extractor_version", "INT")],
+      primary_keys=["path"])
+file_table = Table("files", file_table_attributes)
+
+# An entry is only recorded as completed in the same transaction that writes all of its rows,
+# so entries without a record have not been (fully) ingested.
+completion_table_attributes = Attributes\
+    ([entry_id, ("revision_date", "VARCHAR(50)")],
+      primary_keys=["entry_id"])
+completion_table = Table("completed", completion_table_attributes)
+
+# Version of the extractor that produced the rows of every table of every entry.
+# Entries ingested before versions were recorded have no rows here, and count as the initial version.
+# The tables in letter_code_tables also record the one-letter codes they were translated with
+# (see polymer_sequence.letter_codes_id), which are empty for the default ones, and NULL for the other tables.
+initial_version = 1
+table_version_table_attributes = Attributes\
+    ([entry_id, ("table_name", "VARCHAR NOT NULL"), ("version", "INT"), ("letter_codes", "VARCHAR")],
+      primary_keys=["entry_id", "table_name"])
+table_version_table = Table("table_versions", table_version_table_attributes)
+
+# Every distinct sequence of the tables with sequences, keyed by its hash (see sequence_store.py).
+# Filled along with the rows that refer to it, rather than by an extractor of its own.
+# Only whole chains and subchains are stored here: the sequences of helices, strands and coils are about
+# as short as their hash, so storing them once saves no space, and joining them back in costs time.
+# For the same reason, only these long sequences can be compressed. They are only compressed in databases
+# created with compression turned on (see sequence_store.configure_compression), which then sets compressed.
+sequence_table_attributes = Attributes\
+    ([("sequence_hash", "INTEGER"), ("sequence", "VARCHAR")],
+      primary_keys=["sequence_hash"])
+sequence_table = Table("sequences", sequence_table_attributes)
+
+# Settings that a database is created with, and that every later run has to follow, keyed by name.
+setting_table_attributes = Attributes\
+    ([("name", "VARCHAR NOT NULL"), ("value", "VARCHAR")],
+      primary_keys=["name"])
+setting_table = Table("settings", setting_table_attributes)
+
+bookkeeping_schemas: list[Table] = [file_table, completion_table, table_version_table, sequence_table, setting_table]
+
 def insert_into_table(cur: sqlite3.Cursor, table_name: str, data):
     """
     Inserts the given data into the given table
@@ -97,5 +172,5 @@ def retrieve_from_table(cur: sqlite3.Cursor, table_name: str, entry_id: str):
     """
     Retrieves all rows from a given table with the specified entry id.
     """
-    result = cur.execute(f'SELECT * FROM {table_name} WHERE entry_id = {entry_id}')
+    result = cur.execute(f'SELECT * FROM {table_name} WHERE entry_id = ?', (entry_id,))
     return result.fetchall()
\ No newline at end of file
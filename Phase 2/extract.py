@@ -18,6 +18,7 @@ from typing import NewType
 import gemmi
 from gemmi import cif, EntityType, PolymerType
 from polymer_sequence import PolymerSequence
+from context import EntryContext
 from enum import Enum
 
 MainData = NewType("MainData", tuple[str, str, str, str, str, str, str, int, float, float, float, float, float, float])
@@ -87,7 +88,17 @@ def get_complex_type(struct: gemmi.Structure) -> ComplexType:
     
     return pending_complex_type
 
-def insert_into_main_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> MainData:
+def get_revision_date(block: cif.Block) -> str:
+    """
+    Returns the date of the latest revision of the entry.
+    """
+    revision_date = block.find_value("_pdbx_audit_revision_history.revision_date")
+    if revision_date is None:
+        revision_date = block.find_loop("_pdbx_audit_revision_history.revision_date")[-1]
+    return revision_date
+
+def insert_into_main_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                           context: EntryContext | None = None) -> MainData:
     id = struct.info["_entry.id"]
     struct_title = struct.info["_struct.title"]
     block = doc.sole_block()
@@ -95,9 +106,7 @@ def insert_into_main_table(struct: gemmi.Structure, doc: cif.Document, sequence:
     if source_org is None:
         source_org = ''
     source_org = source_org.strip("'")
-    revision_date = block.find_value("_pdbx_audit_revision_history.revision_date")
-    if revision_date is None:
-        revision_date = block.find_loop("_pdbx_audit_revision_history.revision_date")[-1]
+    revision_date = get_revision_date(block)
     complex_type = get_complex_type(struct)
     chains = [chain.name for chain in struct[0]]
     cell = struct.cell
@@ -108,7 +117,8 @@ def insert_into_main_table(struct: gemmi.Structure, doc: cif.Document, sequence:
     return [(id, complex_type.name, struct_title, source_org, revision_date, ' '.join(chains),
              spacegroup, z_value, cell.a, cell.b, cell.c, cell.alpha, cell.beta, cell.gamma)]
 
-def insert_into_experimental_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> ExperimentalData:
+def insert_into_experimental_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                                   context: EntryContext | None = None) -> ExperimentalData:
     id = struct.info["_entry.id"]
     block = doc.sole_block()
     matthews_coefficient = block.find_value("_exptl_crystal.density_Matthews")
@@ -126,7 +136,8 @@ def insert_into_experimental_table(struct: gemmi.Structure, doc: cif.Document, s
             data[i] = ''
     return [tuple(data)]
         
-def insert_into_entity_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> EntityData:
+def insert_into_entity_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                             context: EntryContext | None = None) -> EntityData:
     data = []
     id = struct.info["_entry.id"]
     block = doc.sole_block()
@@ -141,7 +152,8 @@ def insert_into_entity_table(struct: gemmi.Structure, doc: cif.Document, sequenc
                      ' '.join(entity.subchains)))
     return data
         
-def insert_into_subchain_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> SubchainData:
+def insert_into_subchain_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                               context: EntryContext | None = None) -> SubchainData:
     data = []
     id = struct.info["_entry.id"]
     for entity in struct.entities:
@@ -159,105 +171,92 @@ def insert_into_subchain_table(struct: gemmi.Structure, doc: cif.Document, seque
                         unannotated_sequence, annotated_sequence, start_id, end_id, subchain.length()))
     return data
 
-def insert_into_chain_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> ChainData:
+def insert_into_chain_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                            context: EntryContext | None = None) -> ChainData:
     data = []
     id = struct.info["_entry.id"]
+    if context is None:
+        context = EntryContext(struct, doc, sequence)
     for chain in struct[0]:
-        if len(chain.get_polymer()) == 0:
+        polymer = context.polymer(chain)
+        if len(polymer) == 0:
             start_id = end_id = unconfirmed = None
         else:
             start_id = sequence.get_chain_start_id(chain.name)
             end_id = sequence.get_chain_end_id(chain.name)
             unconfirmed = sequence.contains_unconfirmed_residues(chain.name, start_id, end_id)
         subchains = ' '.join([subchain.subchain_id() for subchain in chain.subchains()])
-        annotated_sequence = chain.get_polymer().make_one_letter_sequence()
+        annotated_sequence = context.one_letter_sequence(chain)
         unannotated_sequence = sequence.get_chain_sequence(chain.name)
-        author_start_id = chain.get_polymer()[0].seqid.num if len(chain.get_polymer()) > 0 else None
-        author_end_id = chain.get_polymer()[-1].seqid.num if len(chain.get_polymer()) > 0 else None
+        author_start_id = polymer[0].seqid.num if len(polymer) > 0 else None
+        author_end_id = polymer[-1].seqid.num if len(polymer) > 0 else None
         data.append((id, chain.name, subchains, unconfirmed,
                 unannotated_sequence, annotated_sequence, start_id, end_id,
-                chain.get_polymer().length(), author_start_id, author_end_id))
+                polymer.length(), author_start_id, author_end_id))
     return data
         
-def insert_into_helix_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> HelixData:
+def insert_into_helix_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                            context: EntryContext | None = None) -> HelixData:
     data = []
     id = struct.info["_entry.id"]
-    for index, helix in enumerate(struct.helices):
-        helix_sequence = sequence.get_helix_sequence(helix, struct)
-        chain = struct[0].find_cra(helix.start).chain
-        end_chain = struct[0].find_cra(helix.end).chain
-        start_auth_label = str(helix.start.res_id.seqid.num) + helix.start.res_id.seqid.icode
-        end_auth_label = str(helix.end.res_id.seqid.num) + helix.end.res_id.seqid.icode
-        start_id = chain[start_auth_label][0].label_seq
-        end_id = end_chain[end_auth_label][0].label_seq
-        if chain != end_chain:
-            chain_names = chain.name + ' ' + end_chain.name
-            data.append((id, index + 1, chain_names, helix_sequence, start_id, end_id, helix.length))
+    if context is None:
+        context = EntryContext(struct, doc, sequence)
+    for index, (helix, segment) in enumerate(zip(struct.helices, context.helices)):
+        helix_sequence = context.segment_sequence(segment)[0]
+        if not segment.in_one_chain():
+            chain_names = segment.chain + ' ' + segment.end_chain
+            data.append((id, index + 1, chain_names, helix_sequence, segment.start_id, segment.end_id, helix.length))
         else:
-            data.append((id, index + 1, chain.name, helix_sequence, start_id, end_id, helix.length))
+            data.append((id, index + 1, segment.chain, helix_sequence, segment.start_id, segment.end_id, helix.length))
     return data
         
-def insert_into_sheet_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> SheetData:
+def insert_into_sheet_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                            context: EntryContext | None = None) -> SheetData:
     data = []
     id = struct.info["_entry.id"]
     for sheet in struct.sheets:
         data.append((id, sheet.name, len(sheet.strands), sense_sequence(sheet)))
     return data
 
-def insert_into_strand_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> StrandData:
+def insert_into_strand_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                             context: EntryContext | None = None) -> StrandData:
     data = []
     id = struct.info["_entry.id"]
-    for sheet in struct.sheets:
-        for strand in sheet.strands:
-            strand_sequence, length = sequence.get_strand_sequence(strand, struct)
-            chain = struct[0].find_cra(strand.start).chain
-            end_chain = struct[0].find_cra(strand.end).chain
-            start_auth_label = str(strand.start.res_id.seqid.num) + strand.start.res_id.seqid.icode
-            end_auth_label = str(strand.end.res_id.seqid.num) + strand.end.res_id.seqid.icode
-            start_id = chain[start_auth_label][0].label_seq
-            end_id = end_chain[end_auth_label][0].label_seq
-            data.append((id, sheet.name, strand.name, chain.name,
-                         strand_sequence, start_id, end_id, length))
+    if context is None:
+        context = EntryContext(struct, doc, sequence)
+    for sheet, segments in zip(struct.sheets, context.strands):
+        for strand, segment in zip(sheet.strands, segments):
+            strand_sequence, length = context.segment_sequence(segment)
+            data.append((id, sheet.name, strand.name, segment.chain,
+                         strand_sequence, segment.start_id, segment.end_id, length))
     return data
 
-def insert_into_coil_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> CoilData:
+def insert_into_coil_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                           context: EntryContext | None = None) -> CoilData:
     data = []
     secondary_structures = []
     id = struct.info["_entry.id"]
 
+    if context is None:
+        context = EntryContext(struct, doc, sequence)
+
     # We first gather all the helix and sheet secondary structures to 'remove' from the polymer sequences.
-    for index, helix in enumerate(struct.helices):
-        chain = struct[0].find_cra(helix.start).chain
-        end_chain = struct[0].find_cra(helix.end).chain
-        start_auth_label = str(helix.start.res_id.seqid.num) + helix.start.res_id.seqid.icode
-        end_auth_label = str(helix.end.res_id.seqid.num) + helix.end.res_id.seqid.icode
-        start_id = chain[start_auth_label][0].label_seq
-        end_id = end_chain[end_auth_label][0].label_seq
-        left = min(start_id, end_id)
-        right = max(start_id, end_id)
-        if chain != end_chain:
+    for index, segment in enumerate(context.helices):
+        if not segment.in_one_chain():
             print('Helix ' + str(index) + ' in protein ' + id\
                                + ' is ill-defined. Unable to extract random coils.')
             return data
-        else:
-            secondary_structures.append((chain.name, left, right))
+        secondary_structures.append((segment.chain, min(segment.start_id, segment.end_id),
+                                     max(segment.start_id, segment.end_id)))
     
-    for sheet in struct.sheets:
-        for strand in sheet.strands:
-            chain = struct[0].find_cra(strand.start).chain
-            end_chain = struct[0].find_cra(strand.end).chain
-            start_auth_label = str(strand.start.res_id.seqid.num) + strand.start.res_id.seqid.icode
-            end_auth_label = str(strand.end.res_id.seqid.num) + strand.end.res_id.seqid.icode
-            start_id = chain[start_auth_label][0].label_seq
-            end_id = end_chain[end_auth_label][0].label_seq
-            left = min(start_id, end_id)
-            right = max(start_id, end_id)
-            if chain != end_chain:
+    for sheet, segments in zip(struct.sheets, context.strands):
+        for strand, segment in zip(sheet.strands, segments):
+            if not segment.in_one_chain():
                 print('Strand ' + strand.name + ' in sheet ' + sheet.name + ' in protein ' + id\
                                 + ' is ill-defined. Unable to extract random coils.')
                 return data
-            else:
-                secondary_structures.append((chain.name, left, right))
+            secondary_structures.append((segment.chain, min(segment.start_id, segment.end_id),
+                                         max(segment.start_id, segment.end_id)))
     
     # We want to scan through the secondary structures in order of chain, then by the starting sequence id.
     secondary_structures.sort(key=lambda x : (len(x[0]), x[0], x[1], x[2]))
@@ -270,8 +269,8 @@ def insert_into_coil_table(struct: gemmi.Structure, doc: cif.Document, sequence:
             span = []
             chain_string = ""
         else:
-            span = list(chain_object.get_polymer().first_conformer())
-            chain_string = chain_object.get_polymer().make_one_letter_sequence()
+            span = context.first_conformer(chain_object)
+            chain_string = context.one_letter_sequence(chain_object)
 
         # Keep scanning through chain, iterating through helices and sheets/strands in the chain
         # until we run out of helices and sheets/strands that are in the chain.
@@ -296,7 +295,8 @@ def insert_into_coil_table(struct: gemmi.Structure, doc: cif.Document, sequence:
             # we get that coil_start = coil_end + 1, so we use this condition to ignore those cases.
             if coil_start <= coil_end:
                 coil_sequence = sequence.get_chain_subsequence(chain, coil_start, coil_end)[0]
-                annotated_sequence = sequence.get_chain_annotated_subsequence(span, chain_string, coil_start, coil_end)
+                annotated_sequence = sequence.get_chain_annotated_subsequence(span, chain_string, coil_start, coil_end,
+                                                                             chain)
                 length = len(coil_sequence)
                 unconfirmed = sequence.contains_unconfirmed_residues(chain, coil_start, coil_end)
                 data.append((id, coil_id, chain, unconfirmed, coil_sequence, annotated_sequence,
@@ -0,0 +1,285 @@
+"""
+This script contains the functions that drive ingestion of a directory of mmCIF files into the database.
+Files can either be processed serially, or parsed and extracted by a pool of worker processes.
+Either way, the calling process is the only one that writes to the database, as SQLite only allows
+one writer at a time. Rows are buffered per table across files and written with executemany.
+Every file that is ingested gets recorded in the manifest (see manifest.py), so that later runs
+only need to process the files that changed.
+"""
+
+import sqlite3
+import os
+from multiprocessing import Pool
+from functools import partial
+from typing import Iterable, Iterator
+from tqdm import tqdm
+import commands
+import manifest
+import changes
+import ingest_profile
+import polymer_sequence
+import scan
+from manifest import FileRecord
+from structure_cache import StructureCache
+from ingest_profile import IngestProfile, default_profile
+
+def find_files(rootdir: str) -> Iterator[str]:
+    """
+    Yields the path of every mmCIF file under the given root directory.
+    """
+    for subdir, dirs, files in os.walk(rootdir):
+        for file in files:
+            path = os.path.join(subdir, file)
+            if changes.is_cif_file(path):
+                yield path
+
+def select_files(paths: Iterable[str], records: dict[str, FileRecord],
+                 include_unchanged: bool = False) -> Iterator[tuple[str, bool]]:
+    """
+    Yields every file that changed since it was last ingested (or every file, if include_unchanged is set),
+    along with whether its data needs to be extracted again regardless of its revision date
+    (because it was ingested by an older version of the extractors).
+    Files that no longer exist (e.g. deleted after the change list was written) are skipped with a warning,
+    and are only purged once a later run finds them deleted.
+    """
+    for path in paths:
+        status = manifest.file_status(path, records)
+        if status == "missing":
+            print("Skipping " + path + ", as it no longer exists")
+        elif status != "unchanged" or include_unchanged:
+            yield path, status == "stale"
+
+# Revision dates of the entries in the database, the tables to extract from up to date files,
+# the structure cache to read entries from, and the manifest records of the files to extract,
+# set in each worker process by init_worker
+worker_revision_dates = None
+worker_tables = None
+worker_cache = None
+worker_records = None
+
+def init_worker(revision_dates: dict[str, str] | None, letter_codes: dict[str, str] | None = None,
+                tables: list[str] | None = None, cache_path: str | None = None,
+                records: dict[str, FileRecord] | None = None):
+    """
+    Sets the revision dates of the entries in the database, the tables to extract from up to date files
+    (see commands.extract_file), the one-letter codes of the monomers if they are not the default ones
+    (see polymer_sequence.use_letter_codes), opens the structure cache for reading if one is used,
+    and sets the manifest records that unchanged files take their content hash from (see manifest.make_record).
+    """
+    global worker_revision_dates, worker_tables, worker_cache, worker_records
+    worker_revision_dates = revision_dates
+    worker_tables = tables
+    worker_cache = None if cache_path is None else StructureCache(cache_path)
+    worker_records = records
+    if letter_codes is not None:
+        polymer_sequence.use_letter_codes(letter_codes)
+
+def extract_file(task: tuple[str, bool]) -> tuple[commands.ExtractedFile, FileRecord] | None:
+    path, force = task
+    # The record is made first, as its content hash is what the entry is cached under
+    record = manifest.make_record(path, scan.entry_id_from_path(path), worker_records)
+    if record is None:
+        # Deleted since it was selected
+        print("Skipping " + path + ", as it no longer exists")
+        return None
+    extracted = commands.extract_file(path, None if force else worker_revision_dates, worker_tables, worker_cache,
+                                      record.content_hash)
+    if extracted is None:
+        return None
+    return extracted, record._replace(entry_id=extracted.entry_id)
+
+def write_results(con: sqlite3.Connection, tasks: list[tuple[str, bool]],
+                  results: Iterable[tuple[commands.ExtractedFile, FileRecord] | None], verbose: bool = False,
+                  profile: IngestProfile = default_profile, cache: StructureCache | None = None):
+    """
+    Writes the extracted rows of every file in batches, recording each file in the manifest once its
+    rows are written. The batch is flushed and committed whenever the profile's commit size is reached.
+    If cache is given, the snapshots of the files that had to be parsed are added to it.
+    """
+    cur = con.cursor()
+    batch = commands.RowBatch()
+    tracker = ingest_profile.CommitTracker(con, profile)
+    for (path, force), result in tqdm(zip(tasks, results), total=len(tasks)):
+        if result is None:
+            continue
+        extracted, record = result
+        commands.write_file(cur, path, extracted, verbose=verbose, force=force, batch=batch,
+                            on_written=partial(manifest.record_file, cur, path, record))
+        if cache is not None and extracted.snapshot is not None:
+            cache.add(scan.entry_id_from_path(path), record.content_hash, extracted.revision_date, extracted.snapshot)
+        tracker.add(0 if extracted.rows is None else record.size)
+        if tracker.is_due():
+            batch.flush(cur)
+            tracker.commit()
+    if tracker.entries:
+        batch.flush(cur)
+        tracker.commit()
+
+def ingest_serial(con: sqlite3.Connection, tasks: Iterable[tuple[str, bool]], verbose: bool = False,
+                  revision_dates: dict[str, str] | None = None, profile: IngestProfile = default_profile,
+                  tables: list[str] | None = None, cache: StructureCache | None = None,
+                  records: dict[str, FileRecord] | None = None):
+    """
+    Parses every file in the calling process, then writes its rows (see write_results).
+    If revision_dates is given, up to date files are skipped without being parsed,
+    or only have the given tables extracted again. If cache is given, cached entries are read
+    from it instead of being parsed, and the other entries are added to it.
+    If records (the manifest) is given, files that did not change are not hashed again.
+    """
+    tasks = list(tasks)
+    init_worker(revision_dates, tables=tables, cache_path=None if cache is None else cache.path, records=records)
+    write_results(con, tasks, map(extract_file, tasks), verbose=verbose, profile=profile, cache=cache)
+
+def ingest_parallel(con: sqlite3.Connection, tasks: Iterable[tuple[str, bool]], workers: int,
+                    verbose: bool = False, revision_dates: dict[str, str] | None = None, chunksize: int = 8,
+                    profile: IngestProfile = default_profile, tables: list[str] | None = None,
+                    cache: StructureCache | None = None, records: dict[str, FileRecord] | None = None):
+    """
+    Parses files and runs the table extractors in a pool of worker processes,
+    while the calling process writes the extracted rows (see write_results).
+    If revision_dates is given, the workers skip up to date files without parsing them,
+    or only extract the given tables from them again. If cache is given, the workers read cached
+    entries from it, and the calling process adds the other entries to it.
+    If records (the manifest) is given, the workers do not hash files that did not change again.
+    """
+    tasks = list(tasks)
+    if records is not None:
+        # Only the records of the files to extract are handed to the workers
+        records = {path: records[path] for path, force in tasks if path in records}
+    # Worker processes are not guaranteed to inherit the one-letter codes set in this process
+    letter_codes = polymer_sequence.letter_codes
+    if letter_codes is polymer_sequence.three_to_one:
+        letter_codes = None
+    cache_path = None if cache is None else cache.path
+    with Pool(workers, initializer=init_worker,
+              initargs=(revision_dates, letter_codes, tables, cache_path, records)) as pool:
+        write_results(con, tasks, pool.imap(extract_file, tasks, chunksize), verbose=verbose, profile=profile,
+                      cache=cache)
+
+def ingest_files(con: sqlite3.Connection, paths: list[str], deleted: list[str],
+                 workers: int = 1, verbose: bool = False, profile: IngestProfile = default_profile,
+                 tables: list[str] | None = None, cache_path: str | None = None, allow_mass_purge: bool = False):
+    """
+    Purges the data of the deleted files, then ingests every given file that changed
+    since it was last ingested. Unless allow_mass_purge is set, nothing is purged if more files
+    were deleted than manifest.purge_limit allows. In bulk load mode, secondary indexes are rebuilt at the end,
+    and the statistics of the query planner are gathered again.
+    If tables is given, every given file gets processed: the rows of the given tables
+    (see database.select_tables) are replaced for entries that are up to date, and every other
+    entry is ingested as usual. If cache_path is given, entries are read from the structure cache
+    there when they are cached, and added to it otherwise (see structure_cache.py).
+    """
+    ingest_profile.apply_profile(con, profile)
+    cur = con.cursor()
+    revision_dates = commands.load_revision_dates(cur)
+    records = manifest.load_manifest(cur)
+
+    deleted = [path for path in deleted if path in records]
+    if len(deleted) > manifest.purge_limit(records) and not allow_mass_purge:
+        print("Not purging " + str(len(deleted)) + " deleted files, as that is more than "\
+              + str(manifest.purge_limit(records)) + " of the " + str(len(records)) + " ingested files. "\
+              + "Check that the mirror is complete, or allow it with --allow-mass-purge.")
+        deleted = []
+    if deleted:
+        if verbose:
+            print("Purging " + str(len(deleted)) + " deleted files")
+        for entry_id in manifest.purge_files(cur, deleted, records):
+            revision_dates.pop(entry_id, None)
+        con.commit()
+
+    indexes = ingest_profile.drop_indexes(cur) if profile.bulk_load else []
+    cache = None if cache_path is None else StructureCache(cache_path)
+    try:
+        tasks = select_files(paths, records, include_unchanged=tables is not None)
+        if workers > 1:
+            ingest_parallel(con, tasks, workers, verbose=verbose, revision_dates=revision_dates, profile=profile,
+                            tables=tables, cache=cache, records=records)
+        else:
+            ingest_serial(con, tasks, verbose=verbose, revision_dates=revision_dates, profile=profile,
+                          tables=tables, cache=cache, records=records)
+    finally:
+        if cache is not None:
+            cache.save()
+        if indexes:
+            if verbose:
+                print("Rebuilding " + str(len(indexes)) + " indexes")
+            ingest_profile.rebuild_indexes(cur, indexes)
+            con.commit()
+        if profile.bulk_load:
+            # Most rows are new, so the statistics that the query planner picks indexes by are gathered again
+            cur.execute("ANALYZE")
+            con.commit()
+
+def ingest_stale(con: sqlite3.Connection, paths: list[str], workers: int = 1, verbose: bool = False,
+                 profile: IngestProfile = default_profile, cache_path: str | None = None):
+    """
+    Extracts again only the tables whose rows were extracted by an older version of their extractor
+    (see commands.load_stale_tables), from the given files. Only those tables are extracted, and only their
+    versions are recorded again, not those of the tables they reference. Files of entries that have no stale tables,
+    new files and deleted files are left untouched, and so are files that changed since they were ingested,
+    as their entries need every table updated, which is left to an ordinary run.
+    Entries with the same stale tables are processed together.
+    """
+    cur = con.cursor()
+    stale_tables = commands.load_stale_tables(cur)
+    records = manifest.load_manifest(cur)
+    groups = {}
+    changed = 0
+    for path in paths:
+        tables = stale_tables.get(scan.entry_id_from_path(path))
+        if not tables:
+            continue
+        if manifest.file_status(path, records) != "unchanged":
+            changed += 1
+            continue
+        groups.setdefault(tuple(tables), []).append(path)
+    if changed:
+        print("Leaving " + str(changed) + " files that changed since they were ingested to an ordinary run")
+    for tables, group in groups.items():
+        if verbose:
+            print("Extracting " + ', '.join(tables) + " again from " + str(len(group)) + " files")
+        ingest_files(con, group, [], workers=workers, verbose=verbose, profile=profile, tables=list(tables),
+                     cache_path=cache_path)
+
+def check_rootdir(rootdir: str):
+    """
+    Raises FileNotFoundError if the mirror is missing (e.g. not mounted), as every file in it would look deleted.
+    """
+    if not os.path.isdir(rootdir):
+        raise FileNotFoundError("No directory at " + rootdir)
+
+def ingest_directory(con: sqlite3.Connection, rootdir: str, workers: int = 1, verbose: bool = False,
+                     profile: IngestProfile = default_profile, tables: list[str] | None = None,
+                     stale_only: bool = False, cache_path: str | None = None, allow_mass_purge: bool = False):
+    """
+    Brings the database up to date with every mmCIF file under rootdir. Files that have not
+    changed since they were last ingested are skipped, and the data of deleted files is purged
+    (see ingest_files for when it is not). Nothing is purged if no file is found under rootdir.
+    If stale_only is set, only the stale tables of the files are extracted again (see ingest_stale).
+    """
+    check_rootdir(rootdir)
+    paths = list(find_files(rootdir))
+    if stale_only:
+        ingest_stale(con, paths, workers=workers, verbose=verbose, profile=profile, cache_path=cache_path)
+        return
+    records = manifest.load_manifest(con.cursor())
+    if paths:
+        deleted = manifest.find_deleted(records, paths)
+    else:
+        if records:
+            print("No files found under " + rootdir + ", so nothing is purged")
+        deleted = []
+    ingest_files(con, paths, deleted, workers=workers, verbose=verbose, profile=profile, tables=tables,
+                 cache_path=cache_path, allow_mass_purge=allow_mass_purge)
+
+def ingest_changes(con: sqlite3.Connection, rootdir: str, list_path: str, workers: int = 1, verbose: bool = False,
+                   profile: IngestProfile = default_profile, tables: list[str] | None = None,
+                   cache_path: str | None = None, allow_mass_purge: bool = False):
+    """
+    Brings the database up to date with the files of the mirror at rootdir listed in a change list
+    (see changes.py), without walking the rest of the directory tree.
+    """
+    check_rootdir(rootdir)
+    paths, deleted = changes.read_change_list(list_path, rootdir)
+    ingest_files(con, paths, deleted, workers=workers, verbose=verbose, profile=profile, tables=tables,
+                 cache_path=cache_path, allow_mass_purge=allow_mass_purge)
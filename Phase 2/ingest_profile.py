@@ -0,0 +1,77 @@
+"""
+This script contains the settings that control how ingestion writes to the database: how much work
+goes into each transaction, and the SQLite pragmas that trade durability for write speed.
+Important things to note:
+- Transactions are committed once enough entries, or enough bytes of mmCIF files, have been written
+  since the last commit, rather than once per directory of the mirror.
+- WAL journaling with synchronous=NORMAL cannot corrupt the database on a crash, but may lose the
+  last few commits on a power failure. The bulk load profile goes further and turns syncing off,
+  so it should only be used for full rebuilds that can be started over.
+- In bulk load mode, secondary indexes are dropped before ingestion and rebuilt afterwards, which is
+  much faster than keeping them up to date row by row. Statistics for the query planner are then gathered
+  again with ANALYZE. Other runs leave that to PRAGMA optimize, which main.py runs before closing the database.
+- Foreign keys are not enforced (PRAGMA foreign_keys is left off, as by default): they document how the tables
+  relate, but some refer to columns that are not unique on their own, or to views (see Table.create_view),
+  which SQLite cannot enforce. So there is nothing for a profile to defer.
+"""
+
+import sqlite3
+from typing import NamedTuple
+
+class IngestProfile(NamedTuple):
+    commit_entries: int = 1000 # Commit after this many entries are written...
+    commit_bytes: int = 1 << 30 # ...or after this many bytes of (compressed) files are written
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -65536 # Negative values are in KiB, so 64 MiB
+    temp_store: str = "MEMORY"
+    bulk_load: bool = False
+
+default_profile = IngestProfile()
+bulk_load_profile = IngestProfile(commit_entries=10000, commit_bytes=8 << 30, synchronous="OFF",
+                                  cache_size=-1048576, bulk_load=True)
+
+def apply_profile(con: sqlite3.Connection, profile: IngestProfile):
+    con.commit() # journal_mode cannot be changed inside a transaction
+    cur = con.cursor()
+    cur.execute(f"PRAGMA journal_mode = {profile.journal_mode}")
+    cur.execute(f"PRAGMA synchronous = {profile.synchronous}")
+    cur.execute(f"PRAGMA cache_size = {profile.cache_size}")
+    cur.execute(f"PRAGMA temp_store = {profile.temp_store}")
+
+class CommitTracker:
+    """
+    Commits the current transaction once enough entries or bytes have been written since the last commit.
+    """
+    def __init__(self, con: sqlite3.Connection, profile: IngestProfile):
+        self.con = con
+        self.profile = profile
+        self.entries = 0
+        self.bytes = 0
+
+    def add(self, size: int):
+        self.entries += 1
+        self.bytes += size
+
+    def is_due(self) -> bool:
+        return self.entries >= self.profile.commit_entries or self.bytes >= self.profile.commit_bytes
+
+    def commit(self):
+        self.con.commit()
+        self.entries = 0
+        self.bytes = 0
+
+def drop_indexes(cur: sqlite3.Cursor) -> list[str]:
+    """
+    Drops every secondary index in the database. Returns the statements that recreate them.
+    Indexes that SQLite creates for primary keys cannot be dropped, and are left alone.
+    """
+    res = cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+    indexes = res.fetchall()
+    for name, sql in indexes:
+        cur.execute(f"DROP INDEX {name}")
+    return [sql for name, sql in indexes]
+
+def rebuild_indexes(cur: sqlite3.Cursor, statements: list[str]):
+    for statement in statements:
+        cur.execute(statement)
@@ -1,22 +1,109 @@
 import sqlite3
-import os
-import re
+import argparse
 import commands
-from tqdm import tqdm
+import ingest
+import manifest
+import components
+import polymer_sequence
+import database
+import sequence_store
+from ingest_profile import default_profile, bulk_load_profile
 sql_database = "./Phase 2/records/pdb_database_records.db" # Location of output SQL database
 rootdir = "./Phase 2/database" # Root directory of all the pdb files
 verbose = False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extracts data from all mmCIF files in rootdir into an SQL database.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to parse files. The main process always does the writing.")
+    parser.add_argument("--changes", metavar="FILE",
+                        help="rsync --itemize-changes log, or list of changed paths, relative to rootdir. "
+                             "Only the listed files are processed. If not given, the whole of rootdir is walked.")
+    parser.add_argument("--bulk-load", action="store_true",
+                        help="write as fast as possible, for full rebuilds: syncing to disk is turned off, "
+                             "and secondary indexes are dropped during ingestion and rebuilt afterwards.")
+    parser.add_argument("--commit-entries", type=int,
+                        help="number of entries written per transaction.")
+    parser.add_argument("--commit-bytes", type=int,
+                        help="bytes of mmCIF files written per transaction.")
+    parser.add_argument("--components", metavar="FILE",
+                        help="Chemical Component Dictionary (components.cif or components.cif.gz), used to translate "
+                             "modified monomers to the one-letter codes of their parents instead of X. "
+                             "The translation table is cached next to it in FILE.letters.")
+    parser.add_argument("--tables", type=lambda tables: tables.split(","),
+                        help="comma-separated list of tables (e.g. coils,helices) to extract again from every file "
+                             "whose entry is up to date. Only the rows of those tables are replaced. "
+                             "Other files are ingested as usual.")
+    parser.add_argument("--metadata-only", action="store_true",
+                        help="like --tables, but for the metadata tables (main, experimental and entities), "
+                             "which are extracted without parsing the atom sites of the files.")
+    parser.add_argument("--stale-only", action="store_true",
+                        help="only extract the tables whose extractor version is newer than the one their rows "
+                             "were extracted with, from every file whose entry has such tables. "
+                             "Nothing else is added, updated or purged, and files that changed since they were "
+                             "ingested are left to an ordinary run.")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="pack file of parsed entries (see structure_cache.py). Entries that are cached for the "
+                             "current contents of their file are read from it instead of their mmCIF file, which makes "
+                             "extracting tables again much faster. Every other entry that is parsed gets added to it.")
+    parser.add_argument("--allow-mass-purge", action="store_true",
+                        help="purge the data of deleted files even if more files were deleted than a run normally "
+                             f"purges ({manifest.max_purge_fraction * 100:.0f}%% of the ingested files, or "
+                             f"{manifest.min_purge_files} files), e.g. after a large cleanup of the mirror.")
+    parser.add_argument("--compress-sequences", action="store_true",
+                        help="store long chain and subchain sequences compressed. Recorded in the database, "
+                             "so later runs keep compressing, and cannot be turned off again. Reading compressed "
+                             "sequences takes a function that plain SQLite clients do not have "
+                             "(see sequence_store.register_functions).")
+    parser.add_argument("--purge-sequences", action="store_true",
+                        help="after ingestion, delete the sequences that no row refers to any more "
+                             "(e.g. after entries were updated or purged).")
+    parser.add_argument("--analyze", action="store_true",
+                        help="after ingestion, gather statistics on every table and index (ANALYZE), which the query "
+                             "planner uses to pick indexes. Done anyway after --bulk-load.")
+    args = parser.parse_args()
+    if args.stale_only and (args.tables is not None or args.metadata_only or args.changes is not None):
+        parser.error("--stale-only cannot be used with --tables, --metadata-only or --changes")
+    if args.metadata_only:
+        if args.tables is not None:
+            parser.error("--metadata-only and --tables cannot be used together")
+        args.tables = [table_scheme.name for table_scheme in database.metadata_tables]
+    if args.tables is not None:
+        try:
+            database.select_tables(args.tables)
+        except ValueError as error:
+            parser.error(str(error))
+
+    profile = bulk_load_profile if args.bulk_load else default_profile
+    if args.commit_entries is not None:
+        profile = profile._replace(commit_entries=args.commit_entries)
+    if args.commit_bytes is not None:
+        profile = profile._replace(commit_bytes=args.commit_bytes)
+
+    if args.components is not None:
+        polymer_sequence.use_letter_codes(components.load_letter_codes(args.components))
+
     con = sqlite3.connect(sql_database)
     cur = con.cursor()
-    commands.init_database(cur)
+    commands.init_database(cur, compress_sequences=True if args.compress_sequences else None)
+    commands.record_completed_entries(cur)
+    con.commit()
 
-    for subdir, dirs, files in tqdm(os.walk(rootdir)):
-        for file in files:
-            path = os.path.join(subdir, file)
-            if re.search('./*.cif.*', path):
-                commands.check_file(cur, path, verbose=verbose)
+    if args.changes is not None:
+        ingest.ingest_changes(con, rootdir, args.changes, workers=args.workers, verbose=verbose, profile=profile,
+                              tables=args.tables, cache_path=args.cache, allow_mass_purge=args.allow_mass_purge)
+    else:
+        ingest.ingest_directory(con, rootdir, workers=args.workers, verbose=verbose, profile=profile,
+                                tables=args.tables, stale_only=args.stale_only, cache_path=args.cache,
+                                allow_mass_purge=args.allow_mass_purge)
+
+    if args.purge_sequences:
+        sequence_store.purge_unused_sequences(cur, database.table_schemas)
+        con.commit()
+    if args.analyze:
+        cur.execute("ANALYZE")
         con.commit()
 
+    # Gathers statistics again for the tables whose statistics SQLite finds out of date
+    cur.execute("PRAGMA optimize")
     con.close()
@@ -0,0 +1,121 @@
+"""
+This script contains the functions for keeping the manifest of ingested files (the files table).
+Each ingested file is recorded with its size, modification time, content hash and the version of
+the extractors that processed it, so that later runs can skip files that have not changed without
+opening them, and can find files that were deleted from the mirror.
+"""
+
+import sqlite3
+import os
+import hashlib
+from typing import NamedTuple, Iterable
+from database import table_schemas, file_table, completion_table, table_version_table, extractor_version
+
+# Largest share of the manifest that a run purges, unless it is explicitly allowed to purge more (see purge_limit)
+max_purge_fraction = 0.05
+min_purge_files = 10
+
+class FileRecord(NamedTuple):
+    entry_id: str
+    size: int
+    mtime: float
+    content_hash: str
+    extractor_version: int
+
+def hash_file(file_path: str) -> str:
+    """
+    Returns the SHA-256 hash of the (compressed) contents of a file.
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def make_record(file_path: str, entry_id: str, manifest: dict[str, FileRecord] | None = None) -> FileRecord | None:
+    """
+    Returns the record of a file as it is now, or None if the file no longer exists.
+    If the manifest is given and records the file with the same size and modification time,
+    its content hash is taken from there instead of hashing the file again.
+    """
+    try:
+        stat = os.stat(file_path)
+        record = None if manifest is None else manifest.get(file_path)
+        if record is not None and record.size == stat.st_size and record.mtime == stat.st_mtime:
+            content_hash = record.content_hash
+        else:
+            content_hash = hash_file(file_path)
+    except FileNotFoundError:
+        return None
+    return FileRecord(entry_id, stat.st_size, stat.st_mtime, content_hash, extractor_version)
+
+def load_manifest(cur: sqlite3.Cursor) -> dict[str, FileRecord]:
+    """
+    Loads the record of every ingested file, keyed by path.
+    """
+    res = cur.execute(file_table.retrieve())
+    return {row[0]: FileRecord(*row[1:]) for row in res.fetchall()}
+
+def file_status(file_path: str, manifest: dict[str, FileRecord]) -> str:
+    """
+    Compares a file against its record in the manifest.
+    Returns "missing" if the file no longer exists (e.g. it was deleted after the change list was written),
+    "new" if the file has not been ingested before, "stale" if it was ingested by an older
+    version of the extractors, "changed" if its contents changed, and "unchanged" otherwise.
+    The file is only hashed if its size is the same but its modification time is not.
+    """
+    try:
+        stat = os.stat(file_path)
+        if file_path not in manifest:
+            return "new"
+        record = manifest[file_path]
+        if record.extractor_version != extractor_version:
+            return "stale"
+        if stat.st_size != record.size:
+            return "changed"
+        if stat.st_mtime == record.mtime or hash_file(file_path) == record.content_hash:
+            return "unchanged"
+        return "changed"
+    except FileNotFoundError:
+        return "missing"
+
+def record_file(cur: sqlite3.Cursor, file_path: str, record: FileRecord):
+    cur.execute(file_table.upsert_statement, (file_path, *record))
+
+def find_deleted(manifest: dict[str, FileRecord], file_paths: Iterable[str]) -> list[str]:
+    """
+    Returns the paths in the manifest that are not among the given paths.
+    """
+    file_paths = set(file_paths)
+    return [file_path for file_path in manifest if file_path not in file_paths]
+
+def purge_limit(manifest: dict[str, FileRecord]) -> int:
+    """
+    Returns how many files a run may purge without being explicitly allowed to purge more (see ingest.ingest_files):
+    a share of the manifest, but never fewer than a handful, so that small databases can still lose a few files.
+    Guards against purging most of the database because the mirror was unmounted, or only partly synced.
+    """
+    return max(min_purge_files, int(max_purge_fraction * len(manifest)))
+
+def purge_files(cur: sqlite3.Cursor, file_paths: list[str], manifest: dict[str, FileRecord]) -> set[str]:
+    """
+    Deletes the rows of the entries of the given files from every table, along with their records.
+    Entries that another file in the manifest still refers to (e.g. a copy of the entry at another path)
+    keep their rows, but are no longer recorded as completed, and the records of their remaining files
+    are deleted, so that those files get ingested again and the rows come from a file that still exists.
+    Returns the entry IDs that were purged or need to be ingested again.
+    """
+    deleted_paths = set(file_paths)
+    entry_ids = {manifest[file_path].entry_id for file_path in file_paths}
+    remaining_paths = [file_path for file_path, record in manifest.items()
+                       if file_path not in deleted_paths and record.entry_id in entry_ids]
+    kept = {manifest[file_path].entry_id for file_path in remaining_paths}
+    purged = entry_ids - kept
+    for table_scheme in [completion_table, table_version_table] + table_schemas:
+        cur.executemany(table_scheme.delete_entry_statement, [(entry_id,) for entry_id in purged])
+    if kept:
+        cur.executemany(completion_table.delete_entry_statement, [(entry_id,) for entry_id in kept])
+    cur.executemany(file_table.delete_statement, [(file_path,) for file_path in file_paths + remaining_paths])
+    for file_path in file_paths + remaining_paths:
+        del manifest[file_path]
+    return entry_ids
@@ -1,6 +1,10 @@
 import gemmi
+import hashlib
 from gemmi import cif
 from typing import NamedTuple
+from array import array
+from itertools import compress, accumulate, repeat
+from bisect import bisect_left, bisect_right
 
 class Monomer(NamedTuple):
     chain: str
@@ -11,86 +15,116 @@ class Monomer(NamedTuple):
     hetero: str
 
 class PolymerSequence:
+    """
+    The full sequence of every polymer chain of an entry, as given by _pdbx_poly_seq_scheme,
+    including residues that are experimentally unconfirmed.
+    Residues are stored column by column, with only the first residue of each set of
+    microheterogeneities kept.
+    """
     def __init__(self, doc: cif.Document):
         # We first extract all the relevant sequence-related info from the .cif file
         block = doc.sole_block()
         list_chain = list(block.find_loop("_pdbx_poly_seq_scheme.pdb_strand_id"))
         list_entity = list(block.find_loop("_pdbx_poly_seq_scheme.entity_id"))
-        list_entity = [int(entity) for entity in list_entity]
         list_id = list(block.find_loop("_pdbx_poly_seq_scheme.seq_id"))
-        list_id = [int(id) for id in list_id]
         list_monomer = list(block.find_loop("_pdbx_poly_seq_scheme.mon_id"))
         list_pdb_monomer = list(block.find_loop("_pdbx_poly_seq_scheme.pdb_mon_id"))
         list_hetero = list(block.find_loop("_pdbx_poly_seq_scheme.hetero"))
-        
-        temp_sequence = list(zip(list_chain, list_entity, list_id, list_monomer, list_pdb_monomer, list_hetero))
-        # Convert list of tuples to list of named tuples for readability
-        self.sequence = [Monomer(*monomer) for monomer in temp_sequence]
-        self.bad_indices = []
+        # Columns may be of different lengths in a malformed file, in which case the extra values are ignored
+        length = min(len(list_chain), len(list_entity), len(list_id), len(list_monomer),
+                     len(list_pdb_monomer), len(list_hetero))
+        seq_ids = array('l', map(int, list_id[:length]))
+
+        # A residue with microheterogeneity (hetero = 'y') is listed once per alternative, all with the
+        # same seq_id. Only the first alternative is kept.
+        self.first_conformer_mask = array('b', bytes(length))
+        heterogeneous_id = None
+        for index in range(length):
+            if seq_ids[index] == heterogeneous_id:
+                continue
+            self.first_conformer_mask[index] = 1
+            heterogeneous_id = seq_ids[index] if list_hetero[index] == 'y' else None
+
+        mask = self.first_conformer_mask
+        chains = list(compress(list_chain, mask))
+        self.set_columns(chains, array('l', map(int, compress(list_entity, mask))), array('l', compress(seq_ids, mask)),
+                         list(compress(list_monomer, mask)), list(compress(list_pdb_monomer, mask)),
+                         list(compress(list_hetero, mask)))
+        self.one_letter_code = sequence_3to1(self.names)
+
+        # Find where every chain starts and ends, and which residues are experimentally unconfirmed
+        self.bad_indices = [index for index, expt_name in enumerate(self.expt_names) if expt_name == '?']
         self.chain_start_indices = {}
         self.chain_end_indices = {}
-
-        last_chain = ''
-        index = 0
-        while index < len(self.sequence):
-            monomer = self.sequence[index]
-
-            if monomer.hetero == 'y':
-                while index + 1 < len(self.sequence) and self.sequence[index].seq_id == self.sequence[index + 1].seq_id:
-                    self.sequence.pop(index + 1)
-                    
-            if monomer.expt_name == '?':
-                self.bad_indices.append(index)
-
-            if last_chain != monomer.chain:
-                if last_chain != '':
-                    self.chain_end_indices[last_chain] = index - 1
-                last_chain = monomer.chain
-                self.chain_start_indices[last_chain] = index
-            index += 1
-            
-        self.chain_end_indices[last_chain] = index - 1
+        for index, chain in enumerate(chains):
+            if chain not in self.chain_start_indices:
+                self.chain_start_indices[chain] = index
+            self.chain_end_indices[chain] = index
+        if len(chains) == 0:
+            self.chain_end_indices[''] = -1
         self.chain_start_indices = dict(sorted(self.chain_start_indices.items(), key=lambda x : (len(x), x)))
         self.chain_end_indices = dict(sorted(self.chain_end_indices.items(), key=lambda x : (len(x), x)))
 
-        monomer_sequence = [monomer.name for monomer in self.sequence]
-        self.one_letter_code = sequence_3to1(monomer_sequence)
-    
-    def binary_search(self, left_index: int, right_index: int, target_label: int) -> int:
+    def set_columns(self, chains: list[str], entities: array, seq_ids: array,
+                    names: list[str], expt_names: list[str], hetero: list[str]):
+        """
+        Stores the columns of the sequence, one entry per residue. Chains are stored as indices into chain_names.
         """
-        Helper method for finding the index of a desired residue in a residue sequence by means of binary search.
-        This binary search is slightly modified to be faster than regular binary search.
-        This modification only works if every value in the list we search through is unique,
-        which is true when we let reduce all heterogeneities to single residues in our residue sequences.
+        self.chain_names = list(dict.fromkeys(chains))
+        chain_codes = {chain: code for code, chain in enumerate(self.chain_names)}
+        self.chain_codes = array('l', [chain_codes[chain] for chain in chains])
+        self.entities = entities
+        self.seq_ids = seq_ids # An ordered labelling of the residues, not the same as their index in the polymer
+        self.names = names
+        self.expt_names = expt_names # Same as names, but labelled ? if experimentally unconfirmed
+        self.hetero = hetero
+
+        # The index of every residue of every chain, keyed by its sequence id
+        self.seq_id_indices = {chain: {} for chain in self.chain_names}
+        for index, (code, seq_id) in enumerate(zip(self.chain_codes, seq_ids)):
+            self.seq_id_indices[self.chain_names[code]].setdefault(seq_id, index)
+        # The index of every residue of the polymer span of a chain, keyed by its sequence id,
+        # and the index of the letter of every residue of the span in the annotated sequence of the chain
+        self.span_indices = {}
+        self.string_indices = {}
 
-        Keyword arguments:
-        left_index -- index of the left bound of the sublist we're searching through
-        right_index -- index of the right bound of the sublist we're searching through
-        target_label -- the 'sequence id' of the residue we want to search for.
+    @property
+    def bad_indices(self) -> list[int]:
         """
-        if right_index < left_index:
-            raise Exception("Couldn't find index")
-        centre_index = (left_index + right_index) // 2
-        centre_label = self.sequence[centre_index].seq_id
-        if centre_label == target_label:
-            return centre_index
-        
-        difference = target_label - centre_label
-        # By assuming we're searching over a list of distinct integers, we get that the target's index
-        # is between centre_index and centre_index + difference
-        next_index = centre_index + difference
-        # Ensure that next_index are between the left_index and right_index
-        next_index = max(left_index, next_index)
-        next_index = min(right_index, next_index)
-        next_label = self.sequence[next_index].seq_id
-
-        if next_label == target_label:
-            return next_index
-        if target_label < centre_label:
-            return self.binary_search(left_index, centre_index - 1, target_label)
-        # centre_label < target_label
-        return self.binary_search(centre_index + 1, right_index, target_label)
+        The (sorted) indices of the experimentally unconfirmed residues.
+        """
+        return self._bad_indices
+
+    @bad_indices.setter
+    def bad_indices(self, bad_indices: list[int]):
+        self._bad_indices = bad_indices
+        # unconfirmed_counts[i] is the number of unconfirmed residues before index i, up to the last unconfirmed residue
+        is_bad = bytearray(bad_indices[-1] + 1 if bad_indices else 0)
+        for index in bad_indices:
+            is_bad[index] = 1
+        self.unconfirmed_counts = array('l', accumulate(is_bad, initial=0))
+
+    @property
+    def sequence(self) -> list[Monomer]:
+        chains = [self.chain_names[code] for code in self.chain_codes]
+        return [Monomer(*monomer) for monomer in zip(chains, self.entities, self.seq_ids,
+                                                     self.names, self.expt_names, self.hetero)]
+
+    @sequence.setter
+    def sequence(self, sequence: list[Monomer]):
+        self.set_columns([monomer.chain for monomer in sequence], array('l', [monomer.entity for monomer in sequence]),
+                         array('l', [monomer.seq_id for monomer in sequence]), [monomer.name for monomer in sequence],
+                         [monomer.expt_name for monomer in sequence], [monomer.hetero for monomer in sequence])
     
+    def index_of(self, chain: str, seq_id: int) -> int:
+        """
+        Returns the index of the residue of a chain with the given sequence id.
+        """
+        try:
+            return self.seq_id_indices[chain][seq_id]
+        except KeyError:
+            raise Exception("Couldn't find index")
+
     def get_chain_sequence(self, chain: str) -> str:
         """
         Returns the full (unannotated) one-letter sequence of a given chain.
@@ -108,10 +142,8 @@ class PolymerSequence:
         """
         if chain not in self.chain_start_indices:
             return ''
-        chain_start = self.chain_start_indices[chain]
-        chain_end = self.chain_end_indices[chain]
-        start_index = self.binary_search(chain_start, chain_end, start_id)
-        end_index = self.binary_search(chain_start, chain_end, end_id)
+        start_index = self.index_of(chain, start_id)
+        end_index = self.index_of(chain, end_id)
 
         if end_index >= start_index:
             return self.one_letter_code[start_index:end_index + 1], end_index - start_index + 1
@@ -119,19 +151,30 @@ class PolymerSequence:
             return self.one_letter_code[start_index::-1], -start_index - 1
         return self.one_letter_code[start_index:end_index-1:-1], end_index - start_index - 1
     
-    def get_chain_annotated_subsequence(self, span: list, chain_string: str, start_id: int, end_id: int) -> str:
+    def get_chain_annotated_subsequence(self, span: list, chain_string: str, start_id: int, end_id: int,
+                                        chain: str | None = None) -> str:
         """
         Returns the annotated one-letter sequence of a sublist of a given chain.
         The full annotated one-letter sequence is derived from the gemmi function
         ResidueSpan.make_one_letter_sequence().
+        If the name of the chain is given, the positions of the residues of the span (and of their letters in
+        the annotated sequence) are only indexed once per chain.
         """
         if len(span) == 0:
             return ""
 
-        start_index = binary_search(span, 0, len(span) - 1, start_id)
-        end_index = binary_search(span, 0, len(span) - 1, end_id)
+        if chain is None:
+            indices = span_indices(span)
+            span_index_to_string_index = string_indices(chain_string)
+        else:
+            if chain not in self.span_indices:
+                self.span_indices[chain] = span_indices(span)
+                self.string_indices[chain] = string_indices(chain_string)
+            indices = self.span_indices[chain]
+            span_index_to_string_index = self.string_indices[chain]
+        start_index = span_index(span, indices, start_id)
+        end_index = span_index(span, indices, end_id)
 
-        span_index_to_string_index = [i for i in range(len(chain_string)) if chain_string[i] != '-']
         string_start_index = span_index_to_string_index[start_index]
         string_end_index = span_index_to_string_index[end_index]
         if end_index >= start_index:
@@ -140,59 +183,70 @@ class PolymerSequence:
             return self.one_letter_code[string_start_index::-1]
         return self.one_letter_code[string_start_index:string_end_index-1:-1]
     
+    def count_unconfirmed_residues(self, chain: str, start_id: int, end_id: int) -> int:
+        """
+        Returns the number of experimentally unconfirmed residues in a sublist of a chain (between start_id and end_id).
+        """
+        start_index = self.index_of(chain, start_id)
+        end_index = self.index_of(chain, end_id)
+        if end_index < start_index:
+            return 0
+        last = len(self.unconfirmed_counts) - 1
+        return self.unconfirmed_counts[min(end_index + 1, last)] - self.unconfirmed_counts[min(start_index, last)]
+
+    def get_unconfirmed_residues(self, chain: str, start_id: int, end_id: int) -> list[int]:
+        """
+        Returns the sequence ids of the experimentally unconfirmed residues in a sublist of a chain
+        (between start_id and end_id).
+        """
+        start_index = self.index_of(chain, start_id)
+        end_index = self.index_of(chain, end_id)
+        bad_indices = self.bad_indices[bisect_left(self.bad_indices, start_index):
+                                       bisect_right(self.bad_indices, end_index)]
+        return [self.seq_ids[index] for index in bad_indices]
+
     def contains_unconfirmed_residues(self, chain: str, start_id: int, end_id: int) -> int:
         """
         Checks if a sublist of a chain (between start_id and end_id) contains an experimentally unconfirmed residue.
         Note that this function returns 0 or 1 instead of a bool, as sqlite does not natively support booleans.
         This may change if we move to a different SQL engine.
         """
-        chain_start = self.chain_start_indices[chain]
-        chain_end = self.chain_end_indices[chain]
-
-        start_index = self.binary_search(chain_start, chain_end, start_id)
-        end_index = self.binary_search(chain_start, chain_end, end_id)
-        
-        for index in self.bad_indices:
-            if start_index <= index <= end_index:
-                return 1
-        return 0
+        return 1 if self.count_unconfirmed_residues(chain, start_id, end_id) > 0 else 0
     
     def get_chain_start_id(self, chain: str) -> int:
         """
         Returns the sequence id of the starting residue of a chain (not its index).
         """
-        return self.sequence[self.chain_start_indices[chain]].seq_id
+        return self.seq_ids[self.chain_start_indices[chain]]
     
     def get_chain_end_id(self, chain: str) -> int:
         """
         Returns the sequence id of the ending residue of a chain (not its index).
         """
-        return self.sequence[self.chain_end_indices[chain]].seq_id
-    
-    def get_helix_sequence(self, helix: gemmi.Helix, struct: gemmi.Structure) -> str:
-        chain = struct[0].find_cra(helix.start).chain
-        end_chain = struct[0].find_cra(helix.end).chain
-        start_auth_label = str(helix.start.res_id.seqid.num) + helix.start.res_id.seqid.icode
-        end_auth_label = str(helix.end.res_id.seqid.num) + helix.end.res_id.seqid.icode
-        start_pos = chain[start_auth_label][0].label_seq
-        end_pos = end_chain[end_auth_label][0].label_seq
-
-        if (chain != end_chain):
-            return "MULTIPLE CHAINS ERROR"
-        return self.get_chain_subsequence(chain.name, start_pos, end_pos)[0]
-    
-    def get_strand_sequence(self, strand: gemmi.Sheet.Strand, struct: gemmi.Structure) -> tuple[str, int]:
-        chain = struct[0].find_cra(strand.start).chain
-        end_chain = struct[0].find_cra(strand.end).chain
-        start_auth_label = str(strand.start.res_id.seqid.num) + strand.start.res_id.seqid.icode
-        end_auth_label = str(strand.end.res_id.seqid.num) + strand.end.res_id.seqid.icode
-        start_pos = chain[start_auth_label][0].label_seq
-        end_pos = end_chain[end_auth_label][0].label_seq
-
-        if (chain != end_chain):
-            return ("MULTIPLE CHAINS ERROR", 0)
-        return self.get_chain_subsequence(chain.name, start_pos, end_pos)
+        return self.seq_ids[self.chain_end_indices[chain]]
     
+def span_indices(span: list[gemmi.Residue]) -> dict[int, int]:
+    """
+    Returns the index of every residue in a residue span, keyed by its sequence id (label_seq).
+    """
+    return {residue.label_seq: index for index, residue in enumerate(span)}
+
+def string_indices(chain_string: str) -> list[int]:
+    """
+    Returns the index of every residue letter in an annotated one-letter sequence, skipping the gaps ('-').
+    """
+    return [index for index, letter in enumerate(chain_string) if letter != '-']
+
+def span_index(span: list[gemmi.Residue], indices: dict[int, int], target_label: int) -> int:
+    """
+    Returns the index of a residue in a residue span given its sequence id.
+    Sequence ids that are not in the span (e.g. those of unobserved residues) are resolved by binary search,
+    which returns the index of a neighbouring residue instead.
+    """
+    if target_label in indices:
+        return indices[target_label]
+    return binary_search(span, 0, len(span) - 1, target_label)
+
 def binary_search(span: list[gemmi.Residue], left_index: int, right_index: int, target_label: int) -> int:
     """
     Helper method for finding the index of a desired residue in a residue span by means of binary search.
@@ -242,10 +296,33 @@ three_to_one = {'ALA': 'A', 'ARG': 'R', 'ASN': 'N',
                 'TYR': 'Y', 'VAL': 'V', 'DA': 'A',
                 'DT': 'T', 'DG': 'G', 'DC': 'C'}
 
+# The one-letter code of every monomer that can be translated, three_to_one unless set by use_letter_codes
+letter_codes = three_to_one
+# Identifies letter_codes, and is recorded with the tables whose sequences they translate (see database.letter_code_tables).
+# Empty for three_to_one, which is what entries ingested before it was recorded were translated with.
+letter_codes_id = ""
+
+def use_letter_codes(codes: dict[str, str]):
+    """
+    Translates monomers with the given one-letter codes (e.g. those read from the CCD, see components.py)
+    on top of three_to_one.
+    """
+    global letter_codes, letter_codes_id
+    letter_codes = three_to_one | codes
+    letter_codes_id = hash_letter_codes(letter_codes)
+
+def hash_letter_codes(codes: dict[str, str]) -> str:
+    """
+    Returns the hash of the given one-letter codes, which is the same for the same codes in any order.
+    """
+    if codes == three_to_one:
+        return ""
+    text = '\n'.join(f"{monomer} {code}" for monomer, code in sorted(codes.items()))
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
 def letter_code_3to1(polymer: str) -> str:
-    if (polymer in three_to_one.keys()):
-        return three_to_one[polymer]
-    return 'X'
+    return letter_codes.get(polymer, 'X')
 
 def sequence_3to1(sequence: list[str]) -> str:
-    return ''.join([letter_code_3to1(polymer) for polymer in sequence])
+    # map calls dict.get directly, so the whole column is translated without a Python call per monomer
+    return ''.join(map(letter_codes.get, sequence, repeat('X')))
@@ -0,0 +1,147 @@
+"""
+This script contains functions for cheaply reading a few categories out of an mmCIF file
+(or everything but the atom sites), without building a gemmi Structure or tokenizing the whole file.
+Important things to note:
+- Categories are located by searching the raw (decompressed) bytes of the file. This relies on
+  every category being followed by a line starting with '#', which is true for every file in
+  the PDB archive.
+- Only the text of the requested categories is handed to gemmi, so that quoting and multi-line
+  values are still handled by a proper CIF parser.
+"""
+
+import os
+import gzip
+from typing import Iterable, Iterator
+from gemmi import cif
+from extract import get_revision_date
+
+def entry_id_from_path(file_path: str) -> str:
+    """
+    Returns the entry ID of a file in the PDB archive from its name, e.g. 'database/a0/1a00.cif.gz' -> '1A00'.
+    """
+    return os.path.basename(file_path).split('.')[0].upper()
+
+def read_bytes(file_path: str) -> bytes:
+    """
+    Returns the contents of a (possibly gzip compressed) file.
+    """
+    if file_path.endswith('.gz'):
+        with gzip.open(file_path, 'rb') as file:
+            return file.read()
+    with open(file_path, 'rb') as file:
+        return file.read()
+
+def category_span(data: bytes, category: str) -> tuple[int, int] | None:
+    """
+    Returns the start and end of the text of the given category (e.g. '_pdbx_audit_revision_history')
+    in the contents of an mmCIF file, including its 'loop_' line if it has one.
+    Returns None if the category is not in the file.
+    """
+    item_index = data.find(b'\n' + category.encode() + b'.')
+    if item_index == -1:
+        return None
+    # The category starts on the line after the preceding '#' line, and ends at the next one.
+    separator_index = data.rfind(b'\n#', 0, item_index)
+    if separator_index == -1:
+        start = item_index + 1
+    else:
+        start = data.find(b'\n', separator_index + 1) + 1
+    end = data.find(b'\n#', item_index)
+    if end == -1:
+        end = len(data)
+    return start, end + 1
+
+def find_category(data: bytes, category: str) -> bytes:
+    """
+    Returns the text of the given category in the contents of an mmCIF file (see category_span).
+    Returns an empty byte string if the category is not in the file.
+    """
+    span = category_span(data, category)
+    if span is None:
+        return b''
+    return data[span[0]:span[1]]
+
+def remove_categories(data: bytes, categories: list[str]) -> bytes:
+    """
+    Returns the contents of an mmCIF file without the given categories.
+    """
+    for category in categories:
+        span = category_span(data, category)
+        if span is not None:
+            data = data[:span[0]] + data[span[1]:]
+    return data
+
+def read_categories(data: bytes, categories: list[str]) -> cif.Block:
+    """
+    Parses only the given categories out of the contents of an mmCIF file.
+    """
+    text = b''.join(find_category(data, category) for category in categories)
+    return cif.read_string('data_scan\n' + text.decode()).sole_block()
+
+# Categories with a row per atom, which make up most of every file
+atom_categories = ["_atom_site", "_atom_site_anisotrop"]
+
+def read_metadata(file_path: str) -> tuple[cif.Document, list[str]]:
+    """
+    Parses every category of an mmCIF file except the atom sites.
+    Also returns the names of the chains of the entry, which are only found in the atom sites (see chain_names).
+    """
+    data = read_bytes(file_path)
+    return cif.read_string(remove_categories(data, atom_categories).decode()), chain_names(data)
+
+def split_atom_sites(text: bytes) -> Iterator[tuple[bytes, bytes]]:
+    """
+    Yields the chain (auth_asym_id) and model of every atom site in the text of the _atom_site category,
+    as they are written in the file. Rows are split on whitespace rather than parsed, as the atom sites
+    make up most of the file. Raises ValueError if they are not a loop with one value per tag on every row.
+    """
+    lines = text.split(b'\n')
+    if lines[0].strip() != b'loop_':
+        raise ValueError("The atom sites are not a loop")
+    tags = [line.strip() for line in lines if line.startswith(b'_atom_site.')]
+    chain_index = tags.index(b'_atom_site.auth_asym_id')
+    model_index = tags.index(b'_atom_site.pdbx_PDB_model_num')
+    for line in lines[len(tags) + 1:]:
+        values = line.split()
+        if not values:
+            continue
+        if len(values) != len(tags):
+            raise ValueError("Atom site with quoted values")
+        yield values[chain_index], values[model_index]
+
+def first_model_chains(atom_sites: Iterable[tuple]) -> list:
+    """
+    Returns the distinct chains of the atom sites of the first model, in the order they first appear.
+    """
+    names = {}
+    first_model = None
+    for chain, model in atom_sites:
+        if first_model is None:
+            first_model = model
+        elif model != first_model:
+            break
+        names.setdefault(chain, None)
+    return list(names)
+
+def chain_names(data: bytes) -> list[str]:
+    """
+    Returns the (author) names of the chains of an entry from the contents of its file, in the same order as
+    the chains of a structure built from the whole file (see commands.structure_from_document): the chains
+    with atom sites in the first model, in the order they first appear. Chains without atoms are left out.
+    The atom sites are only handed to gemmi if they cannot simply be split (see split_atom_sites).
+    """
+    text = find_category(data, "_atom_site")
+    if not text:
+        return []
+    try:
+        return [cif.as_string(name.decode()) for name in first_model_chains(split_atom_sites(text))]
+    except ValueError:
+        table = read_categories(data, ["_atom_site"]).find("_atom_site.", ["auth_asym_id", "pdbx_PDB_model_num"])
+        return first_model_chains((row.str(0), row.str(1)) for row in table)
+
+def read_revision_date(file_path: str) -> str:
+    """
+    Returns the date of the latest revision of the entry in a file.
+    """
+    block = read_categories(read_bytes(file_path), ["_pdbx_audit_revision_history"])
+    return get_revision_date(block)
@@ -0,0 +1,174 @@
+"""
+This script contains the content-addressed store of sequences, which keeps every distinct sequence once
+in the sequences table, rather than once per row of every table that has a sequence column.
+Important things to note:
+- Tables with sequences (see Attributes.sequences, and the sequences table in database.py) store their rows in TABLE_data, with the hash of each
+  sequence (SEQUENCE_hash) in place of the sequence, and a view named after the table joins the sequences back in.
+  Queries against the table name keep seeing the same columns as before.
+- Sequences are keyed by the first 8 bytes of their BLAKE2b hash, as a signed 64-bit integer, so that the
+  key fits in an INTEGER column. Missing sequences (None) are stored as a NULL hash.
+- Sequences are only ever added. Those that are no longer used by any row (e.g. after entries are updated)
+  stay behind until purge_unused_sequences is run (see --purge-sequences).
+- Databases created before the store existed are migrated by migrate_tables when they are opened.
+- Compression is optional, and off unless the database was created with it (see configure_compression).
+  The choice is recorded in the settings table, so every later run follows it. Without compression,
+  the views are plain SQL, and any SQLite client can read them.
+- Columns declared as compressed (see Attributes.compressed) hold either the sequence itself (TEXT) or, if it
+  came out smaller, the sequence compressed with a preset dictionary (BLOB): the ID of the dictionary, followed
+  by the raw deflate stream. Reading them takes the decompress_sequence SQL function, which every connection
+  needs to register (see register_functions). init_database does so for the connection it is given.
+- Dictionaries are never changed or removed, as the rows compressed with them would become unreadable.
+  To use a better dictionary, add it under a new ID and point dictionary_id at it.
+"""
+
+import sqlite3
+import zlib
+from functools import lru_cache
+from hashlib import blake2b
+from table import Table
+from database import sequence_table, setting_table
+
+# Preset dictionaries for compressed sequences, keyed by their ID. Deflate can refer back into the dictionary
+# as if it came before the sequence, so it holds stretches that many PDB sequences share: expression tags,
+# protease sites and linkers, and proteins that get deposited (or fused to the protein of interest) again and again.
+sequence_dictionaries = {
+    1: b"GGGGSGGGGSGGGGS" # Flexible linker
+       b"EQKLISEEDL" b"YPYDVPDYA" b"DYKDDDDK" b"WSHPQFEK" b"GLNDIFEAQKIEWHE" # Myc, HA, FLAG, Strep and Avi tags
+       b"LEVLFQGP" b"ENLYFQG" b"ENLYFQS" b"LVPRGS" b"DDDDK" # PreScission, TEV, thrombin and enterokinase sites
+       b"MASMTGGQQMGRGS" b"MGSDKIHHHHHH" b"MKHHHHHHPMSDYDIPTTENLYFQGAM" b"MAHHHHHHVDDDDK" # Common tags
+       b"MGSSHHHHHHSSGLVPRGSHMASMTGGQQMGRGS" b"MGSSHHHHHHSSGLVPRGSH" b"MHHHHHHSSGVDLGTENLYFQS"
+       b"MQIFVKTLTGKTITLEVEPSDTIENVKAKIQDKEGIPPDQQRLIFAGKQLEDGRTLSDYNIQKESTLHLVLRLRGG" # Ubiquitin
+       b"KVFGRCELAAAMKRHGLDNYRGYSLGNWVCAAKFESNFNTQATNRNTDGSTDYGILQINSRWWCNDGRTPGSRNLCNIPCSALLSSDITASVNCAKKIVS"
+       b"DGNGMNAWVAWRNRCKGTDVQAWIRGCRL" # Hen egg-white lysozyme
+       b"MNIFEMLRIDEGLRLKIYKDTEGYYTIGIGHLLTKSPSLNAAKSELDKAIGRNTNGVITKDEAEKLFNQDVDAAVRGILRNAKLKPVYDSLDAVRRAAINMV"
+       b"FQMGETGVAGFTNSLRMLQQKRWDEAAVNLAKSRWYNQTPNRAKRVITTFRTGTWDAYKNL" # T4 lysozyme
+       b"MSKGEELFTGVVPILVELDGDVNGHKFSVSGEGEGDATYGKLTLKFICTTGKLPVPWPTLVTTFSYGVQCFSRYPDHMKQHDFFKSAMPEGYVQERTIF"
+       b"FKDDGNYKTRAEVKFEGDTLVNRIELKGIDFKEDGNILGHKLEYNYNSHNVYIMADKQKNGIKVNFKIRHNIEDGSVQLADHYQQNTPIGDGPVLLPDNHY"
+       b"LSTQSALSKDPNEKRDHMVLLEFVTAAGITHGMDELYK" # Green fluorescent protein
+       b"HHHHHH" b"LEHHHHHH" b"GSHM" b"GAMA" b"SNA" # His tags, and what is left of tags after cleavage
+}
+dictionary_id = 1 # Dictionary that new sequences are compressed with
+
+def sequence_hash(sequence: str | None) -> int | None:
+    if sequence is None:
+        return None
+    return int.from_bytes(blake2b(sequence.encode(), digest_size=8).digest(), "little", signed=True)
+
+def compress_sequence(sequence: str | None) -> str | bytes | None:
+    """
+    Returns the sequence compressed with the current dictionary, or the sequence itself if that is not smaller.
+    """
+    if sequence is None:
+        return None
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=sequence_dictionaries[dictionary_id])
+    compressed = bytes([dictionary_id]) + compressor.compress(sequence.encode()) + compressor.flush()
+    return compressed if len(compressed) < len(sequence) else sequence
+
+# Setting up inflate dominates the time it takes to decompress a sequence, and scans read the same sequences
+# again and again (every chain of a homo-oligomer, and both sequence columns of most chains)
+@lru_cache(maxsize=4096)
+def decompress_sequence(value: str | bytes | None) -> str | None:
+    """
+    Reverses compress_sequence. Values that were not compressed are returned as they are.
+    """
+    if not isinstance(value, bytes):
+        return value
+    decompressor = zlib.decompressobj(-15, zdict=sequence_dictionaries[value[0]])
+    return (decompressor.decompress(value[1:]) + decompressor.flush()).decode()
+
+def register_functions(con: sqlite3.Connection):
+    """
+    Registers the SQL functions that the sequence store relies on, which SQLite only keeps for the connection.
+    """
+    con.create_function("sequence_hash", 1, sequence_hash, deterministic=True)
+    con.create_function("compress_sequence", 1, compress_sequence, deterministic=True)
+    con.create_function("decompress_sequence", 1, decompress_sequence, deterministic=True)
+
+def configure_compression(cur: sqlite3.Cursor, compress: bool | None = None) -> bool:
+    """
+    Sets whether the sequences of the database are compressed, as recorded in its settings. Databases without
+    a recorded choice (new ones, and ones from before compression was optional) compress if they already hold
+    compressed sequences. Compression is turned on if compress is set, and cannot be turned off once it is on,
+    as the sequences compressed so far would stay compressed.
+    Returns whether sequences are compressed.
+    """
+    res = cur.execute(setting_table.select_statement, ("compress_sequences",)).fetchone()
+    if res is not None:
+        compressed = res[1] == "1"
+    else:
+        res = cur.execute(f"SELECT 1 FROM {sequence_table.name} WHERE typeof(sequence) = 'blob' LIMIT 1")
+        compressed = res.fetchone() is not None
+    if compress and not compressed:
+        compressed = True
+    elif compress is False and compressed:
+        raise ValueError("The sequences of the database are compressed, which cannot be turned off")
+    cur.execute(setting_table.upsert_statement, ("compress_sequences", "1" if compressed else "0"))
+    sequence_table.attributes.compressed = ["sequence"] if compressed else []
+    return compressed
+
+def hash_sequences(table_scheme: Table, rows: list[tuple], sequences: dict[int, str]) -> list[tuple]:
+    """
+    Returns the rows of the table as they are stored, with the hash of every sequence in place of the sequence.
+    The sequences are added to the given dictionary, keyed by their hash.
+    """
+    positions = {index for index, name in enumerate(table_scheme.attributes.attribute_names)
+                 if name in table_scheme.attributes.sequences}
+    hashes = {}
+    stored_rows = []
+    for row in rows:
+        for index in positions:
+            sequence = row[index]
+            if sequence not in hashes:
+                hashes[sequence] = sequence_hash(sequence)
+                if sequence is not None:
+                    sequences[hashes[sequence]] = sequence
+        stored_rows.append(tuple(hashes[value] if index in positions else value for index, value in enumerate(row)))
+    return stored_rows
+
+def store_sequences(cur: sqlite3.Cursor, sequences: dict[int, str]):
+    if not sequences:
+        return
+    if "sequence" in sequence_table.attributes.compressed:
+        cur.executemany(f"INSERT OR IGNORE INTO {sequence_table.name} VALUES(?, ?)",
+                        [(key, compress_sequence(sequence)) for key, sequence in sequences.items()])
+    else:
+        cur.executemany(f"INSERT OR IGNORE INTO {sequence_table.name} VALUES(?, ?)", sequences.items())
+
+def sequence_columns(tables: list[Table]) -> list[tuple[str, str]]:
+    """
+    Returns the stored table and hash column of every sequence of the given tables.
+    """
+    return [(table_scheme.stored_name, name + "_hash") for table_scheme in tables
+            for name in table_scheme.attributes.sequences]
+
+def purge_unused_sequences(cur: sqlite3.Cursor, tables: list[Table]) -> int:
+    """
+    Deletes the sequences that no row of the given tables refers to. Returns how many were deleted.
+    """
+    used = ' UNION '.join(f"SELECT {column} FROM {table_name} WHERE {column} IS NOT NULL"
+                          for table_name, column in sequence_columns(tables))
+    cur.execute(f"DELETE FROM {sequence_table.name} WHERE sequence_hash NOT IN ({used})")
+    return cur.rowcount
+
+def migrate_tables(cur: sqlite3.Cursor, tables: list[Table]):
+    """
+    Moves the rows of tables that still store their sequences themselves (from before the sequence store existed)
+    into their stored tables, and their sequences into the sequences table. The old tables are dropped,
+    so that views can take their names. Tables that were already migrated are left alone.
+    """
+    for table_scheme in tables:
+        if table_scheme.stored_name == table_scheme.name:
+            continue
+        res = cur.execute("SELECT type FROM sqlite_master WHERE name = ?", (table_scheme.name,))
+        if res.fetchone() != ("table",):
+            continue
+        register_functions(cur.connection)
+        stored = "compress_sequence({})" if "sequence" in sequence_table.attributes.compressed else "{}"
+        sequences = table_scheme.attributes.sequences
+        for name in sequences:
+            cur.execute(f"INSERT OR IGNORE INTO {sequence_table.name} SELECT sequence_hash({name}), "
+                        f"{stored.format(name)} FROM {table_scheme.name} WHERE {name} IS NOT NULL")
+        columns = [f"sequence_hash({name})" if name in sequences else name
+                   for name in table_scheme.attributes.attribute_names]
+        cur.execute(f"INSERT INTO {table_scheme.stored_name} SELECT {', '.join(columns)} FROM {table_scheme.name}")
+        cur.execute(f"DROP TABLE {table_scheme.name}")
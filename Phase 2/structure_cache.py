@@ -0,0 +1,169 @@
+"""
+This script contains the cache of parsed entries, which lets the table extractors be run again
+(e.g. after the schema changed) without reading and parsing the original mmCIF files.
+Important things to note:
+- Every entry is cached as a compact mmCIF document (see compact_document): the file without the categories
+  that neither gemmi nor the extractors read, and with only the atom sites that gemmi needs to build the same
+  residues and polymers. The extractors produce the same rows from it, but it is a fraction of the size to parse.
+- gemmi structures cannot be pickled, and the extractors rely on gemmi to find polymers and their gaps,
+  so the cache keeps documents to build structures from, rather than the structures themselves.
+- The documents are compressed and appended to a single pack file, with an index next to it (FILE.index) that
+  gives the content hash, offset and size of every entry. The pack file is memory-mapped for reading.
+- A cached entry is only used while its file keeps the same content hash (see manifest.hash_file). The hash is taken
+  from the manifest for files that did not change (see manifest.make_record), so finding a cached entry reads
+  nothing from its file. Entries that get replaced are left behind in the pack file, until the cache is deleted
+  and built again.
+- The index also keeps the revision date of every entry, so that cached entries that are up to date are found
+  without decompressing their file (see commands.is_up_to_date), or even their cached document.
+- Only the process that writes to the database adds entries to the cache. Worker processes only read it.
+- If an extractor starts reading one of the unused categories, remove it from unused_categories
+  and bump cache_version, so that every entry gets cached again.
+"""
+
+import os
+import mmap
+import zlib
+import marshal
+from itertools import compress
+from typing import NamedTuple
+from gemmi import cif
+
+cache_version = 2
+index_suffix = ".index"
+
+# Categories (or prefixes of categories) that neither gemmi nor the extractors read
+unused_categories = ("_atom_site_anisotrop.", "_pdbx_validate_", "_ndb_struct_", "_struct_site", "_pdbx_unobs_or_zero_occ_",
+                     "_pdbx_struct_conn_angle.", "_pdbx_audit_revision_details.", "_pdbx_audit_revision_group.",
+                     "_pdbx_audit_revision_category.", "_pdbx_audit_revision_item.", "_citation", "_audit_author.",
+                     "_pdbx_database_related.", "_refine_ls_restr.", "_pdbx_refine_tls", "_pdbx_struct_special_symmetry.",
+                     "_pdbx_distant_solvent_atoms.", "_pdbx_struct_sheet_hbond.", "_chem_comp.")
+
+# Atoms that gemmi uses to decide whether consecutive residues are connected (see gemmi's are_connected2)
+# or what kind of polymer a residue is part of. Primed names are quoted in mmCIF files.
+backbone_atoms = {"CA", "C", "N", "P", "O3'", '"O3\'"'}
+
+class CachedEntry(NamedTuple):
+    content_hash: str
+    revision_date: str
+    offset: int
+    size: int
+
+def compact_document(doc: cif.Document) -> str:
+    """
+    Returns the compact mmCIF text of a document, which gets modified in place: the unused categories
+    are removed, and only the atom sites of the first model are kept, of which only the first atom of
+    every residue and the backbone atoms of every residue.
+    """
+    block = doc.sole_block()
+    for name in block.get_mmcif_category_names():
+        if name.startswith(unused_categories):
+            block.find_mmcif_category(name).erase()
+
+    loop = block.find_mmcif_category("_atom_site.").loop
+    if loop is None: # No atom sites, or a single one
+        return doc.as_string()
+    width = loop.width()
+    values = loop.values
+    columns = [values[i::width] for i in range(width)]
+    by_tag = {tag[len("_atom_site."):]: column for tag, column in zip(loop.tags, columns)}
+    models = by_tag["pdbx_PDB_model_num"]
+    # Atoms of the same residue are next to each other, so a residue starts wherever the residue changes
+    residues = list(zip(by_tag["label_asym_id"], by_tag["auth_seq_id"], by_tag["pdbx_PDB_ins_code"],
+                        by_tag["label_comp_id"], models))
+    keep = [model == models[0] and (index == 0 or atom in backbone_atoms or residue != residues[index - 1])
+            for index, (model, atom, residue) in enumerate(zip(models, by_tag["label_atom_id"], residues))]
+    loop.set_all_values([list(compress(column, keep)) for column in columns])
+    return doc.as_string()
+
+def make_snapshot(doc: cif.Document) -> bytes:
+    """
+    Returns the compressed compact document of an entry (see compact_document), as stored in the cache.
+    The document gets modified, so this should only be called once the extractors are done with it.
+    """
+    return zlib.compress(compact_document(doc).encode())
+
+def load_index(path: str) -> dict[str, CachedEntry]:
+    """
+    Loads the index of the cache at the given path. Returns an empty index if the cache does not exist,
+    or if it was built by a different version of compact_document.
+    """
+    index_path = path + index_suffix
+    if not os.path.exists(index_path) or not os.path.exists(path):
+        return {}
+    with open(index_path, "rb") as index_file:
+        version, entries = marshal.load(index_file)
+    if version != cache_version:
+        return {}
+    return {entry_id: CachedEntry(*entry) for entry_id, entry in entries.items()}
+
+class StructureCache:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = load_index(path)
+        # Without an index, whatever is in the pack file is left over from an older version of the cache,
+        # or from a run that never saved its index, so it gets overwritten rather than appended to
+        self.indexed = bool(self.entries)
+        self.pack: mmap.mmap | None = None
+        self.pack_file = None # Opened by add, to append to the pack file
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self.entries
+
+    def revision_date(self, entry_id: str, content_hash: str | None) -> str | None:
+        """
+        Returns the revision date of an entry, or None if the entry is not cached for a file with the given contents.
+        """
+        entry = self.entries.get(entry_id)
+        if entry is None or entry.content_hash != content_hash:
+            return None
+        return entry.revision_date
+
+    def read(self, entry_id: str, content_hash: str) -> cif.Document | None:
+        """
+        Returns the compact document of an entry, or None if the entry is not cached for a file with the given contents.
+        """
+        entry = self.entries.get(entry_id)
+        if entry is None or entry.content_hash != content_hash:
+            return None
+        end = entry.offset + entry.size
+        if self.pack is None or len(self.pack) < end:
+            self.map_pack()
+        return cif.read_string(zlib.decompress(self.pack[entry.offset:end]))
+
+    def map_pack(self):
+        if self.pack_file is not None:
+            self.pack_file.flush()
+        if self.pack is not None:
+            self.pack.close()
+        with open(self.path, "rb") as pack_file:
+            self.pack = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def add(self, entry_id: str, content_hash: str, revision_date: str, snapshot: bytes):
+        """
+        Appends the snapshot of an entry (see make_snapshot) to the pack file.
+        The entry is only kept for later runs once the index is saved.
+        """
+        if self.pack_file is None:
+            self.pack_file = open(self.path, "ab" if self.indexed else "wb")
+            self.indexed = True
+        offset = self.pack_file.seek(0, os.SEEK_END)
+        self.pack_file.write(snapshot)
+        self.entries[entry_id] = CachedEntry(content_hash, revision_date, offset, len(snapshot))
+
+    def save(self):
+        """
+        Writes the index of the cache, and closes the pack file.
+        """
+        if self.pack_file is not None:
+            self.pack_file.close()
+            self.pack_file = None
+        if self.pack is not None:
+            self.pack.close()
+            self.pack = None
+        # Write to a temporary file first, so that an interrupted run never leaves a truncated index behind
+        index_path = self.path + index_suffix
+        temp_path = index_path + ".tmp"
+        with open(temp_path, "wb") as index_file:
+            marshal.dump((cache_version, {entry_id: tuple(entry) for entry_id, entry in self.entries.items()}),
+                         index_file)
+        os.replace(temp_path, index_path)
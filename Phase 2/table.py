@@ -3,32 +3,141 @@ from attributes import Attributes
 import gemmi
 from gemmi import cif
 from polymer_sequence import PolymerSequence
+from context import EntryContext
 
 AttributeTypes = TypeVarTuple('AttributeTypes')
 
 class Table(Generic[*AttributeTypes]):
     def __init__(self, name: str, attributes: Attributes[*AttributeTypes],
-                 extractor: Callable[[gemmi.Structure, cif.Document, PolymerSequence], list[tuple[*AttributeTypes]]]):
+                 extractor: Callable[[gemmi.Structure, cif.Document, PolymerSequence, EntryContext | None],
+                                     list[tuple[*AttributeTypes]]] | None = None, version: int = 1):
+        """
+        Tables without an extractor are used for bookkeeping, and are not filled from the mmCIF files.
+        The version of the extractor is recorded for every entry the table is extracted from,
+        so that entries extracted by an older version can be found (see commands.load_stale_tables).
+        """
         self.name = name
         self.attributes = attributes
         self.extractor = extractor
+        self.version = version
+        # Tables with sequences store their rows under another name, and get a view with their own name
+        # that joins their sequences back in (see create_view)
+        self.stored_name = name + "_data" if attributes.sequences else name
+        # The attributes of the rows as they are stored, with the hash of every sequence in place of the sequence
+        self.stored_attributes = attributes.stored_attributes() if attributes.sequences else attributes
+        # Built once with placeholders for the values, since they are the same for every row.
+        # SQLite then finds them in the statement cache of the connection instead of compiling them again.
+        self.insert_statement = self.insert_row(attributes.attribute_names)
+        self.upsert_statement = self.upsert_row()
+        self.update_statement = self.update_row()
+        self.delete_statement = self.delete_row()
+        self.select_statement = self.select_row()
+        if "entry_id" in attributes.attribute_indices:
+            # Every row of an entry, as it is stored
+            self.select_entry_statement = f"SELECT * FROM {self.stored_name} WHERE entry_id = ?"
+            self.delete_entry_statement = f"DELETE FROM {self.stored_name} WHERE entry_id = ?"
+        else:
+            self.select_entry_statement = self.delete_entry_statement = None
+        # Positions of the primary keys in a row, which are the same whether or not sequences are replaced by their hashes
+        self.key_positions = [attributes.attribute_indices[key] for key in attributes.primary_keys]
 
     def attributes_string(self) -> str:
         return f"({', '.join(self.attributes.attribute_names)})"
 
     def create_table(self) -> str:
-        return f"CREATE TABLE IF NOT EXISTS {self.name} {str(self.attributes)}"
-    
+        return f"CREATE TABLE IF NOT EXISTS {self.stored_name} {str(self.stored_attributes)}"
+
+    def create_indexes(self) -> list[str]:
+        """
+        The statements that create the secondary indexes of the table, which are named after the table and their columns.
+        """
+        return [f"CREATE INDEX IF NOT EXISTS {self.name}_{'_'.join(index)} ON {self.stored_name} ({', '.join(index)})"
+                for index in self.attributes.indexes]
+
+    def column_expression(self, name: str, alias: str) -> str:
+        """
+        The expression that reads the given column of the table in a query where it goes by the given alias.
+        Compressed columns are read through decompress_sequence (registered by sequence_store.register_functions).
+        """
+        if name in self.attributes.compressed:
+            return f"decompress_sequence({alias}.{name})"
+        return f"{alias}.{name}"
+
+    def create_view(self, sequence_table: "Table") -> str:
+        """
+        The view of a table with sequences, which has the same columns as the table would have
+        if it stored its sequences itself.
+        """
+        columns = []
+        joins = []
+        for name in self.attributes.attribute_names:
+            if name in self.attributes.sequences:
+                alias = f"s{len(joins)}"
+                columns.append(f"{sequence_table.column_expression('sequence', alias)} AS {name}")
+                joins.append(f"LEFT JOIN {sequence_table.name} {alias} ON {alias}.sequence_hash = t.{name}_hash")
+            else:
+                columns.append(f"t.{name}")
+        return f"CREATE VIEW {self.name} AS SELECT {', '.join(columns)} FROM {self.stored_name} t "\
+               + ' '.join(joins)
+
     def retrieve(self, columns=("*",)) -> str:
         return f"SELECT {', '.join(columns)} FROM {self.name}"
     
-    def extract_data(self, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> list[Attributes]:
-        return self.extractor(struct, doc, sequence)
+    def extract_data(self, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence,
+                     context: EntryContext | None = None) -> list[Attributes]:
+        """
+        If context is not given, the extractor builds its own. Pass the same context to every table
+        of an entry so that the work it caches is shared between them.
+        """
+        if context is None:
+            return self.extractor(struct, doc, sequence)
+        return self.extractor(struct, doc, sequence, context)
     
     def insert_row(self, data: Attributes):
         args = ', '.join(['?' for i in range(len(data))])
-        return f"INSERT INTO {self.name} VALUES({args})"
+        return f"INSERT INTO {self.stored_name} VALUES({args})"
     
-    def update_row(self, data: dict, primary_key_values):
-        return f"UPDATE {self.name} SET {self.attributes.match_columns(data,', ')}\
-            WHERE {self.attributes.match_primary_keys(primary_key_values)}"
+    def upsert_row(self) -> str:
+        """
+        Inserts a stored row, or overwrites the row with the same primary key if there already is one.
+        A row that is the same as the stored one once SQLite has converted its values to the types
+        of their columns (e.g. '1.5' in a FLOAT column) is left alone, so its page is not written.
+        """
+        names = self.stored_attributes.attribute_names
+        if not self.attributes.primary_keys:
+            return self.insert_row(names)
+        args = ', '.join(['?' for i in range(len(names))])
+        columns = [name for name in names if name not in self.attributes.primary_keys]
+        updates = ', '.join(f"{name} = excluded.{name}" for name in columns)
+        changed = f"({', '.join(columns)}) IS NOT ({', '.join('excluded.' + name for name in columns)})"
+        action = f"DO UPDATE SET {updates} WHERE {changed}" if columns else "DO NOTHING"
+        return f"INSERT INTO {self.stored_name} VALUES({args}) ON CONFLICT ({', '.join(self.attributes.primary_keys)}) "\
+               + action
+
+    def update_row(self, columns: list[str] | None = None) -> str:
+        """
+        Sets the given stored columns (by default, every column that is not a primary key) of the stored row
+        with the given primary key. Bind the values of the columns, followed by the values of the primary keys.
+        """
+        if columns is None:
+            columns = [name for name in self.stored_attributes.attribute_names if name not in self.attributes.primary_keys]
+        return f"UPDATE {self.stored_name} SET {self.stored_attributes.match_columns(columns, ', ')} "\
+               f"WHERE {self.stored_attributes.match_primary_keys()}"
+
+    def delete_row(self) -> str:
+        """
+        Deletes the stored row with the given primary key.
+        """
+        return f"DELETE FROM {self.stored_name} WHERE {self.stored_attributes.match_primary_keys()}"
+
+    def select_row(self) -> str:
+        """
+        Reads the row with the given primary key, with the same columns as the table (see create_view).
+        """
+        return f"{self.retrieve()} WHERE {self.attributes.match_primary_keys()}"
+
+    def retrieve_entry(self, columns=("*",)) -> str:
+        """
+        Reads the given columns of the rows of the entry with the given ID.
+        """
+        return f"{self.retrieve(columns)} WHERE entry_id = ?"
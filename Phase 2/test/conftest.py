@@ -274,8 +274,18 @@ def mock_table():
 
     mock_table = MagicMock(spec=Table)
     mock_table.name = "main"
+    mock_table.stored_name = "main"
+    mock_table.upsert_statement = "INSERT INTO main VALUES(?, ?, ?) ON CONFLICT (entry_id) DO UPDATE SET a = excluded.a, b = excluded.b"
+    mock_table.delete_statement = "DELETE FROM main WHERE entry_id = ?"
+    mock_table.select_entry_statement = "SELECT * FROM main WHERE entry_id = ?"
+    mock_table.delete_entry_statement = "DELETE FROM main WHERE entry_id = ?"
+    mock_table.retrieve_entry.side_effect = lambda columns=("*",): f"SELECT {', '.join(columns)} FROM main WHERE entry_id = ?"
+    mock_table.key_positions = [0]
+    mock_table.attributes = MagicMock(sequences=[])
     mock_table.extract_data.return_value = [test_data]
     mock_table.insert_row.return_value = test_statement 
+    mock_table.insert_statement = test_statement
+    mock_table.version = 1
 
     return mock_table
 
@@ -288,8 +298,18 @@ def mock_coil_table():
 
     mock_table = MagicMock(spec=Table)
     mock_table.name = "coils"
+    mock_table.stored_name = "coils"
+    mock_table.upsert_statement = "INSERT INTO coils VALUES(?, ?, ?) ON CONFLICT (entry_id, a) DO UPDATE SET b = excluded.b"
+    mock_table.delete_statement = "DELETE FROM coils WHERE entry_id = ? AND a = ?"
+    mock_table.select_entry_statement = "SELECT * FROM coils WHERE entry_id = ?"
+    mock_table.delete_entry_statement = "DELETE FROM coils WHERE entry_id = ?"
+    mock_table.retrieve_entry.side_effect = lambda columns=("*",): f"SELECT {', '.join(columns)} FROM coils WHERE entry_id = ?"
+    mock_table.key_positions = [0, 1]
+    mock_table.attributes = MagicMock(sequences=[])
     mock_table.extract_data.return_value = [test_data_1, test_data_2]
     mock_table.insert_row.return_value = test_statement 
+    mock_table.insert_statement = test_statement
+    mock_table.version = 1
 
     return mock_table
 
@@ -298,6 +318,8 @@ def mock_coil_table():
 def test_table():
     mock_attributes = MagicMock()
     mock_attributes.attribute_names = ("id", "a")
+    mock_attributes.sequences = []
+    mock_attributes.compressed = []
     mock_attributes.__str__.return_value = "(id VARCHAR, a FLOAT, PRIMARY KEY (id, a), FOREIGN KEY (id) REFERENCES main(id))"
     mock_attributes.match_columns.return_value = "col1 = value1, col2 = value2"
     mock_attributes.match_primary_keys.return_value = "id = 1"
@@ -76,6 +76,45 @@ def test_attributes_initialisation_invalid_foreign_keys():
     with pytest.raises(ValueError, match="Primary keys and foreign keys need to be a subset of attributes"):
         Attributes(test_attributes_pairs, test_primary_keys, test_foreign_keys)
 
+def test_attributes_initialisation_invalid_sequences():
+    with pytest.raises(ValueError, match="Sequences need to be a subset of attributes"):
+        Attributes([("id", "VARCHAR"), ("a", "FLOAT")], ["id"], sequences=["sequence"])
+
+def test_attributes_initialisation_invalid_compressed():
+    with pytest.raises(ValueError, match="Compressed attributes need to be a subset of attributes"):
+        Attributes([("id", "VARCHAR"), ("a", "FLOAT")], ["id"], compressed=["sequence"])
+
+def test_attributes_initialisation_invalid_indexes():
+    """
+    Test that a ValueError is raised for empty indexes, indexes on columns that are not attributes,
+    and indexes on sequences, which are not stored in the table.
+    """
+    for indexes in ([[]], [["id", "b"]], [["sequence"]]):
+        with pytest.raises(ValueError, match="Indexes need to be made of attributes that are not sequences"):
+            Attributes([("id", "VARCHAR"), ("sequence", "VARCHAR")], ["id"], sequences=["sequence"], indexes=indexes)
+
+def test_stored_attributes():
+    """
+    Test that sequences are stored as their hash, in the same position as the sequence.
+    """
+    test_attributes = Attributes([("id", "VARCHAR"), ("sequence", "VARCHAR"), ("a", "FLOAT")], ["id"],
+                                 sequences=["sequence"])
+    result = test_attributes.stored_attributes()
+
+    assert result.attribute_names == ("id", "sequence_hash", "a")
+    assert result.attribute_types == ("VARCHAR", "INTEGER", "FLOAT")
+    assert result.primary_keys == ["id"]
+    assert result.sequences == []
+
+def test_stored_attributes_compressed():
+    """
+    Test that sequences stored as their hash are no longer compressed, unlike the other compressed attributes.
+    """
+    test_attributes = Attributes([("id", "VARCHAR"), ("sequence", "VARCHAR"), ("notes", "VARCHAR")], ["id"],
+                                 sequences=["sequence"], compressed=["sequence", "notes"])
+
+    assert test_attributes.stored_attributes().compressed == ["notes"]
+
 
 def test_attributes_string(test_attributes):
     expected = "(id VARCHAR, a FLOAT, PRIMARY KEY (id, a), FOREIGN KEY (id) REFERENCES\
@@ -130,25 +169,37 @@ def test_dict_to_tuple_values_not_in_attributes(test_attributes):
     with pytest.raises(ValueError):
         test_attributes.dict_to_tuple(test_values)
 
+def test_attribute_indices(test_attributes):
+    assert test_attributes.attribute_indices == {"id": 0, "a": 1}
+
 def test_match_all_columns(test_attributes):
-    test_values = ("'1A00'", "1.0")
-    expected = "id = '1A00' AND a = 1.0"
+    test_values = ("1A00", 1.0)
+    expected = "id = ? AND a = ?"
     result = test_attributes.match_all_columns(test_values)
 
     assert expected == result
 
+def test_match_all_columns_missing_values(test_attributes):
+    """
+    Test that columns without a value are not matched.
+    """
+    test_values = ("1A00", None)
+    result = test_attributes.match_all_columns(test_values)
+
+    assert result == "id = ?"
+
 def test_match_all_columns_invalid_values(test_attributes):
     """
     Test that a ValueError is raised when the number of values 
     given does not match the number of attributes.
     """
-    test_values = ("'1A00'", )
+    test_values = ("1A00", )
     with pytest.raises(ValueError, match="Number of values given does not match number of columns"):
         test_attributes.match_all_columns(test_values)
 
 def test_match_columns(test_attributes):
-    test_column_value_pairs = {"id": "'1A00'", "a": "1.0"}
-    expected = "id = '1A00' AND a = 1.0"
+    test_column_value_pairs = {"a": 1.0, "id": "1A00"}
+    expected = "a = ? AND id = ?"
     result = test_attributes.match_columns(test_column_value_pairs)
 
     assert expected == result
@@ -158,23 +209,12 @@ def test_match_columns_invalid_argument(test_attributes):
     Test that a ValueError is raised when the given dictionary 
     contains columns not part of the attributes.
     """
-    test_column_value_pairs = {"id": "'1A00'", "invalid_column": "1.0"}
+    test_column_value_pairs = {"id": "1A00", "invalid_column": 1.0}
     with pytest.raises(ValueError, match="Argument contains columns not part of the table"):
         test_attributes.match_columns(test_column_value_pairs)
 
 def test_match_primary_keys(test_attributes):
-    test_primary_key_values = ["'1A00'", '1.0']
-    expected = "id = '1A00' AND a = 1.0"
-    result = test_attributes.match_primary_keys(test_primary_key_values)
+    expected = "id = ?, a = ?"
+    result = test_attributes.match_primary_keys(", ")
 
     assert expected == result
-
-def test_match_primary_keys_invalid_values(test_attributes):
-    """
-    Test that a ValueError is raised when the number of values 
-    given does not match the number of primary keys.
-    """
-    test_primary_key_values = ["'1A00'"]
-    with pytest.raises(ValueError, match="Number of values given does not match number of keys"):
-        test_attributes.match_primary_keys(test_primary_key_values)
-        
\ No newline at end of file
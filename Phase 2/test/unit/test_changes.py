@@ -0,0 +1,66 @@
+"""
+This script contains unit tests for testing methods in changes.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import os
+
+import changes
+
+ITEMIZED_CHANGES = """receiving incremental file list
+cd+++++++++ a0/
+>f+++++++++ a0/1a00.cif.gz
+>f.st...... a1/1a01.cif.gz
+>f..t.... a2/1a02.cif.gz
+.d..t...... b0/
+*deleting   b0/1b00.cif.gz
+*deleting   b0/
+>f+++++++++ a0/README.txt
+
+sent 1,234 bytes  received 5,678 bytes  2,304.00 bytes/sec
+total size is 123,456  speedup is 17.86
+"""
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("database/a0/1a00.cif.gz", True),
+    ("database/a0/1a00.cif", True),
+    ("database/a0/README.txt", False),
+])
+def test_is_cif_file(path, expected):
+    assert changes.is_cif_file(path) == expected
+
+
+def test_read_change_list_itemized(tmp_path):
+    """
+    Test that new and modified files are read as changed, and that lines about directories,
+    files that are not mmCIF files and rsync's summary are ignored.
+    """
+    list_path = tmp_path / "changes.log"
+    list_path.write_text(ITEMIZED_CHANGES)
+
+    changed, deleted = changes.read_change_list(str(list_path), "database")
+
+    assert changed == [os.path.join("database", "a0/1a00.cif.gz"),
+                       os.path.join("database", "a1/1a01.cif.gz"),
+                       os.path.join("database", "a2/1a02.cif.gz")]
+    assert deleted == [os.path.join("database", "b0/1b00.cif.gz")]
+
+
+def test_read_change_list_plain(tmp_path):
+    """
+    Test that paths in a plain list are read as changed if they exist, and as deleted otherwise.
+    """
+    (tmp_path / "a0").mkdir()
+    (tmp_path / "a0" / "1a00.cif.gz").write_bytes(b"")
+    list_path = tmp_path / "changes.txt"
+    list_path.write_text("a0/1a00.cif.gz\n\nb0/1b00.cif.gz\n")
+
+    changed, deleted = changes.read_change_list(str(list_path), str(tmp_path))
+
+    assert changed == [str(tmp_path / "a0" / "1a00.cif.gz")]
+    assert deleted == [str(tmp_path / "b0" / "1b00.cif.gz")]
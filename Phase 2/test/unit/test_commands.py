@@ -9,6 +9,7 @@ Output verbosity can be adjusted by using the relevant flags in the command (e.g
 import pytest
 from unittest.mock import patch, call, MagicMock
 import gemmi
+import sqlite3
 
 import table
 import commands 
@@ -16,22 +17,73 @@ import commands
 TEST_FILE_PATH = "test_path/file.cif"
 TEST_DATA = ('1A00', 'data1', 'data2')
 TEST_STATEMENT = "INSERT INTO main VALUES(?, ?, ?)"
+METADATA_FILE = """data_1A00
+_entry.id 1A00
+#
+loop_
+_entity.id
+_entity.type
+1 polymer
+2 water
+#
+loop_
+_struct_asym.id
+_struct_asym.entity_id
+A 1
+B 1
+C 2
+#
+loop_
+_pdbx_poly_seq_scheme.asym_id
+_pdbx_poly_seq_scheme.entity_id
+_pdbx_poly_seq_scheme.seq_id
+_pdbx_poly_seq_scheme.mon_id
+_pdbx_poly_seq_scheme.pdb_strand_id
+A 1 1 GLY B
+B 1 1 GLY A
+#
+loop_
+_pdbx_nonpoly_scheme.asym_id
+_pdbx_nonpoly_scheme.entity_id
+_pdbx_nonpoly_scheme.mon_id
+_pdbx_nonpoly_scheme.pdb_strand_id
+C 2 HOH B
+#
+"""
+
+
+def materialise_rows(mock_cursor: MagicMock) -> MagicMock:
+    """
+    Returns a mock with the same (top-level) calls as mock_cursor, but with the rows given to executemany
+    copied into new lists, so that they can be compared after the batches they came from have changed.
+    """
+    cursor = MagicMock()
+    for name, args, kwargs in mock_cursor.mock_calls:
+        if "(" in name or "." in name:
+            continue
+        if name == "executemany":
+            args = (args[0], list(args[1]))
+        getattr(cursor, name)(*args, **kwargs)
+    return cursor
 
 def test_init_database(mock_cursor):
     mock_table_1 = MagicMock(spec=table.Table)
+    mock_table_1.name = mock_table_1.stored_name = "test_table"
     mock_statement_1 = "CREATE TABLE IF NOT EXISTS \
         test_table (id VARCHAR, PRIMARY KEY (id))"
     mock_table_1.create_table.return_value = mock_statement_1
 
     mock_table_2 = MagicMock(spec=table.Table)
     
+    mock_table_2.name = mock_table_2.stored_name = "test_table"
     mock_statement_2 = "CREATE TABLE IF NOT EXISTS \
         test_table (id VARCHAR, PRIMARY KEY (id), \
             FOREIGN KEY (id) REFERENCES main (id))" 
     mock_table_2.create_table.return_value = mock_statement_2
 
     mock_table_schemas = [mock_table_1, mock_table_2]
-    with patch('commands.table_schemas', mock_table_schemas):
+    with patch('commands.table_schemas', mock_table_schemas), patch('commands.bookkeeping_schemas', []), \
+         patch('sequence_store.configure_compression'), patch('commands.migrate_table_versions'):
         commands.init_database(mock_cursor)
 
         mock_cursor.execute.assert_any_call(mock_statement_1)
@@ -45,7 +97,8 @@ def test_init_database_empty_table_schemas(mock_cursor):
     Test that the execute method is not called when table_schemas
     is an empty list.
     """
-    with patch('commands.table_schemas', []):
+    with patch('commands.table_schemas', []), patch('commands.bookkeeping_schemas', []), \
+         patch('sequence_store.configure_compression'), patch('commands.migrate_table_versions'):
         commands.init_database(mock_cursor)
 
         mock_cursor.execute.assert_not_called()
@@ -71,7 +124,7 @@ def test_check_file_entry_not_in_main_table(mock_polymer_seq, mock_cif_read, moc
     """
     Test that data is inserted into the table when the entry is not found in the main table. 
     """
-    with patch.object(gemmi,'read_structure', return_value=mock_structure):
+    with patch.object(gemmi,'make_structure_from_block', return_value=mock_structure):
         mock_doc = MagicMock()
         mock_cif_read.return_value = mock_doc
         mock_sequence = MagicMock()
@@ -88,7 +141,7 @@ def test_check_file_entry_not_in_main_table(mock_polymer_seq, mock_cif_read, moc
         assert "Adding " + TEST_FILE_PATH in captured
         
         # check that cursor methods were called 
-        expected_calls = [call.execute("SELECT entry_id FROM main WHERE entry_id = '1A00'"), 
+        expected_calls = [call.execute("SELECT entry_id FROM main WHERE entry_id = ?", ('1A00',)), 
                             call.execute().fetchone()]
                             #call.execute(TEST_STATEMENT, TEST_DATA)]
         mock_cursor.assert_has_calls(expected_calls)  
@@ -98,11 +151,12 @@ def test_check_file_entry_not_in_main_table(mock_polymer_seq, mock_cif_read, moc
         
 
 #@pytest.mark.xfail(reason="unable to access struct variable")
-@patch("gemmi.read_structure")
-def test_check_file_gemmi_read_failure(mock_gemmi_read, mock_cursor, capsys):
+@patch("gemmi.cif.read")
+@patch("gemmi.make_structure_from_block")
+def test_check_file_gemmi_read_failure(mock_gemmi_read, mock_cif_read, mock_cursor, capsys):
     """
     Test that the exception is caught when an error occurs when
-    reading the gemmi Structure.
+    building the gemmi Structure.
     """
     mock_gemmi_read.side_effect = Exception("Error reading structure")
     commands.check_file(mock_cursor, TEST_FILE_PATH)
@@ -114,22 +168,52 @@ def test_check_file_gemmi_read_failure(mock_gemmi_read, mock_cursor, capsys):
 
 
 @patch("gemmi.cif.read")
-@patch("commands.PolymerSequence")
-def test_check_file_cif_read_failure(mock_polymer_seq, mock_cif_read, mock_structure, mock_cursor, capsys):
+@patch("gemmi.make_structure_from_block")
+def test_check_file_cif_read_failure(mock_gemmi_read, mock_cif_read, mock_cursor, capsys):
     """
     Test that the exception is caught when an error occurs when
-    reading the cif Document.
+    reading the cif Document, before any structure is built.
     """
-    with patch.object(gemmi,'read_structure', return_value=mock_structure):
-        mock_cif_read.side_effect = Exception("Error reading document")
-        mock_polymer_seq.return_value = MagicMock()
+    mock_cif_read.side_effect = Exception("Error reading document")
+    commands.check_file(mock_cursor, TEST_FILE_PATH)
+    captured = capsys.readouterr()
+
+    # check file name and error are printed
+    assert "Checking " + TEST_FILE_PATH in captured.out
+    assert "Error reading document" in captured.out
+    mock_gemmi_read.assert_not_called()
+
+
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+def test_check_file_sequence_failure(mock_polymer_seq, mock_cif_read, mock_structure, mock_cursor, capsys):
+    """
+    Test that the exception is caught and the structure name is printed when an error
+    occurs after the gemmi Structure was built.
+    """
+    with patch.object(gemmi,'make_structure_from_block', return_value=mock_structure):
+        mock_polymer_seq.side_effect = Exception("Error reading sequence")
         commands.check_file(mock_cursor, TEST_FILE_PATH)
         captured = capsys.readouterr()
-        
+
         # check file name, structure name and error are printed
         assert "Checking " + TEST_FILE_PATH in captured.out
-        assert "mock_name" in captured.out 
-        assert "Error reading document" in captured.out 
+        assert "mock_name" in captured.out
+        assert "Error reading sequence" in captured.out
+
+
+@patch("gemmi.make_structure_from_block")
+def test_structure_from_document(mock_make_structure):
+    """
+    Test that the structure is built from the sole block of the already parsed document,
+    with chain parts merged like gemmi.read_structure does.
+    """
+    mock_doc = MagicMock()
+    result = commands.structure_from_document(mock_doc)
+
+    mock_make_structure.assert_called_once_with(mock_doc.sole_block.return_value)
+    mock_make_structure.return_value.merge_chain_parts.assert_called_once()
+    assert result == mock_make_structure.return_value
 
 
 @patch("commands.update_file")
@@ -140,7 +224,7 @@ def test_check_file_entry_exists_needs_revision(mock_polymer_seq, mock_cif_read,
     Test that data is not inserted into the table when the entry 
     already exists in the main table and is revised when it is not up to date.
     """
-    with patch.object(gemmi,'read_structure', return_value=mock_structure):
+    with patch.object(gemmi,'make_structure_from_block', return_value=mock_structure):
         mock_doc, mock_block = MagicMock(), MagicMock()
         mock_doc.sole_block.return_value = mock_block
         mock_block.find_value.return_value = "2000-12-31"  # mock revision_date
@@ -157,9 +241,9 @@ def test_check_file_entry_exists_needs_revision(mock_polymer_seq, mock_cif_read,
         with patch('commands.table_schemas', mock_table_schemas):
             commands.check_file(mock_cursor, TEST_FILE_PATH)
             expected_calls = [
-                call.execute("SELECT entry_id FROM main WHERE entry_id = '1A00'"), 
+                call.execute("SELECT entry_id FROM main WHERE entry_id = ?", ('1A00',)), 
                 call.execute().fetchone(),
-                call.execute("SELECT revision_date FROM main WHERE entry_id = '1A00'"),
+                call.execute("SELECT revision_date FROM main WHERE entry_id = ?", ('1A00',)),
                 call.execute().fetchone()
             ]
             mock_cursor.assert_has_calls(expected_calls)
@@ -179,7 +263,7 @@ def test_check_file_entry_exists_not_corrupted(mock_polymer_seq, mock_cif_read,
     Test that data is not updated when the entry already exists in the main table, 
     is up to date and not corrupted. 
     """
-    with patch.object(gemmi,'read_structure', return_value=mock_structure):
+    with patch.object(gemmi,'make_structure_from_block', return_value=mock_structure):
         mock_doc, mock_block = MagicMock(), MagicMock()
         mock_doc.sole_block.return_value = mock_block
         mock_block.find_value.return_value = "2000-12-31"  # mock revision_date
@@ -188,7 +272,7 @@ def test_check_file_entry_exists_not_corrupted(mock_polymer_seq, mock_cif_read,
         mock_polymer_seq.return_value = mock_sequence
 
         # row in the main table with such entry ID exists, is up to date
-        # and a row in the coils table with such entry ID exists 
+        # and the entry was recorded as completed
         mock_cursor.execute.return_value.fetchone.side_effect = [
             ('1A00', ),
             ("2000-12-31", ),
@@ -198,11 +282,11 @@ def test_check_file_entry_exists_not_corrupted(mock_polymer_seq, mock_cif_read,
         with patch('commands.table_schemas', mock_table_schemas):
             commands.check_file(mock_cursor, TEST_FILE_PATH)
             expected_calls = [
-                call.execute("SELECT entry_id FROM main WHERE entry_id = '1A00'"), 
+                call.execute("SELECT entry_id FROM main WHERE entry_id = ?", ('1A00',)), 
                 call.execute().fetchone(),
-                call.execute("SELECT revision_date FROM main WHERE entry_id = '1A00'"),
+                call.execute("SELECT revision_date FROM main WHERE entry_id = ?", ('1A00',)),
                 call.execute().fetchone(), 
-                call.execute("SELECT entry_id FROM coils WHERE entry_id = '1A00'"),
+                call.execute("SELECT entry_id FROM completed WHERE entry_id = ?", ('1A00',)),
                 call.execute().fetchone()
             ]
             mock_cursor.assert_has_calls(expected_calls)
@@ -220,7 +304,7 @@ def test_check_file_entry_exists_is_corrupted(mock_polymer_seq, mock_cif_read, m
     Test that data is updated when the entry already exists in the main table, 
     is up to date and corrupted. 
     """
-    with patch.object(gemmi,'read_structure', return_value=mock_structure):
+    with patch.object(gemmi,'make_structure_from_block', return_value=mock_structure):
         mock_doc, mock_block = MagicMock(), MagicMock()
         mock_doc.sole_block.return_value = mock_block
         mock_block.find_value.return_value = "2000-12-31"  # mock revision_date
@@ -229,7 +313,7 @@ def test_check_file_entry_exists_is_corrupted(mock_polymer_seq, mock_cif_read, m
         mock_polymer_seq.return_value = mock_sequence
 
         # row in the main table with such entry ID exists, is up to date
-        # but no row in the coils table with such entry ID exists 
+        # but the entry was never recorded as completed
         mock_cursor.execute.return_value.fetchone.side_effect = [
             ('1A00', ),
             ("2000-12-31", ),
@@ -239,11 +323,11 @@ def test_check_file_entry_exists_is_corrupted(mock_polymer_seq, mock_cif_read, m
         with patch('commands.table_schemas', mock_table_schemas):
             commands.check_file(mock_cursor, TEST_FILE_PATH)
             expected_calls = [
-                call.execute("SELECT entry_id FROM main WHERE entry_id = '1A00'"), 
+                call.execute("SELECT entry_id FROM main WHERE entry_id = ?", ('1A00',)), 
                 call.execute().fetchone(),
-                call.execute("SELECT revision_date FROM main WHERE entry_id = '1A00'"),
+                call.execute("SELECT revision_date FROM main WHERE entry_id = ?", ('1A00',)),
                 call.execute().fetchone(), 
-                call.execute("SELECT entry_id FROM coils WHERE entry_id = '1A00'"),
+                call.execute("SELECT entry_id FROM completed WHERE entry_id = ?", ('1A00',)),
                 call.execute().fetchone()
             ]
             mock_cursor.assert_has_calls(expected_calls)
@@ -260,12 +344,11 @@ def test_insert_file(mock_table_schemas, mock_cursor):
     with patch('commands.table_schemas', mock_table_schemas):
         commands.insert_file(mock_cursor, MagicMock(), MagicMock(), MagicMock())
         expected_calls = [
-            call.execute("INSERT INTO main VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("INSERT INTO coils VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("INSERT INTO coils VALUES(?, ?, ?)", ('1A00', 'data3', 'data4'))
+            call.executemany("INSERT INTO main VALUES(?, ?, ?)", [('1A00', 'data1', 'data2')]),
+            call.executemany("INSERT INTO coils VALUES(?, ?, ?)", [('1A00', 'data1', 'data2'), ('1A00', 'data3', 'data4')])
         ]
         
-        mock_cursor.assert_has_calls(expected_calls)
+        materialise_rows(mock_cursor).assert_has_calls(expected_calls)
 
 
 def test_insert_file_no_data_to_extract(mock_table_schemas, mock_cursor):
@@ -278,24 +361,25 @@ def test_insert_file_no_data_to_extract(mock_table_schemas, mock_cursor):
 
         commands.insert_file(mock_cursor, MagicMock(), MagicMock(), MagicMock())
         expected_calls = [
-            call.execute("INSERT INTO main VALUES(?, ?, ?)", ('1A00', 'data1', 'data2'))
+            call.executemany("INSERT INTO main VALUES(?, ?, ?)", [('1A00', 'data1', 'data2')])
         ]
         
-        mock_cursor.assert_has_calls(expected_calls)
+        materialise_rows(mock_cursor).assert_has_calls(expected_calls)
+        # the other calls record the versions of the tables, and the entry as completed
+        assert mock_cursor.executemany.call_count == 3
 
 
 def test_update_file(mock_table_schemas, mock_cursor, mock_structure):
     with patch('commands.table_schemas', mock_table_schemas):
         commands.update_file(mock_cursor, mock_structure, MagicMock(), MagicMock())
         expected_calls = [
-            call.execute("DELETE FROM main WHERE entry_id = '1A00'"),
-            call.execute("INSERT INTO main VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("DELETE FROM coils WHERE entry_id = '1A00'"),
-            call.execute("INSERT INTO coils VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("INSERT INTO coils VALUES(?, ?, ?)", ('1A00', 'data3', 'data4'))
+            call.execute("SELECT * FROM main WHERE entry_id = ?", ('1A00',)),
+            call.executemany(mock_table_schemas[0].upsert_statement, [('1A00', 'data1', 'data2')]),
+            call.execute("SELECT * FROM coils WHERE entry_id = ?", ('1A00',)),
+            call.executemany(mock_table_schemas[1].upsert_statement, [('1A00', 'data1', 'data2'), ('1A00', 'data3', 'data4')])
         ]
         
-        mock_cursor.assert_has_calls(expected_calls)
+        materialise_rows(mock_cursor).assert_has_calls(expected_calls)
 
 
 def test_update_file_no_data_to_extract(mock_table_schemas, mock_cursor, mock_structure):
@@ -308,11 +392,565 @@ def test_update_file_no_data_to_extract(mock_table_schemas, mock_cursor, mock_st
 
         commands.update_file(mock_cursor, mock_structure, MagicMock(), MagicMock())
         expected_calls = [
-            call.execute("DELETE FROM main WHERE entry_id = '1A00'"),
-            call.execute("INSERT INTO main VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("DELETE FROM coils WHERE entry_id = '1A00'")
+            call.execute("SELECT * FROM main WHERE entry_id = ?", ('1A00',)),
+            call.executemany(mock_table_schemas[0].upsert_statement, [('1A00', 'data1', 'data2')]),
+            call.execute("SELECT * FROM coils WHERE entry_id = ?", ('1A00',)),
+            call.executemany(commands.table_version_table.upsert_statement, [('1A00', "main", 1, None), ('1A00', "coils", 1, None)])
         ]
         
-        mock_cursor.assert_has_calls(expected_calls)
+        materialise_rows(mock_cursor).assert_has_calls(expected_calls)
     
 
+
+def test_update_rows_writes_only_changes():
+    """
+    Test that updating an entry deletes the rows that vanished, upserts the rows that changed or are new,
+    and does not write the rows that stayed the same.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    stored = [("1A00", "A", "A", 0, "MKV", "MKV", 1, 3, 3, 1, 3),
+              ("1A00", "B", "B", 0, "MKV", "MKV", 1, 3, 3, 1, 3),
+              ("1A00", "C", "C", 0, "GG", "GG", 1, 2, 2, 1, 2)]
+    extracted = [stored[0],
+                 ("1A00", "B", "B", 1, "MKVL", "MKVL", 1, 4, 4, 1, 4),
+                 ("1A00", "D", "D", 0, "GG", "GG", 1, 2, 2, 1, 2)]
+    commands.write_rows(cur, [commands.ExtractedFile("1A00", "2000-12-01", {"chains": stored}, ["chains"])])
+    statements = []
+    con.set_trace_callback(statements.append)
+
+    commands.update_rows(cur, commands.ExtractedFile("1A00", "2000-12-31", {"chains": extracted}, ["chains"]))
+
+    written = [statement for statement in statements if "chains_data" in statement and not statement.startswith("SELECT")]
+    assert len(written) == 3
+    assert [statement.split()[0] for statement in written] == ["DELETE", "INSERT", "INSERT"]
+    assert cur.execute("SELECT * FROM chains ORDER BY chain_id").fetchall() == extracted
+    assert cur.execute("SELECT version FROM table_versions WHERE entry_id = '1A00'").fetchall() == [(1,)]
+
+
+def test_write_file_update_failure_keeps_entry(mock_table_schemas):
+    """
+    Test that an entry that cannot be updated is left as it was.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute("CREATE TABLE main (entry_id, a, b, PRIMARY KEY (entry_id))")
+    cur.execute("CREATE TABLE coils (entry_id, a, b, PRIMARY KEY (entry_id, a))")
+    cur.execute("CREATE TABLE completed (entry_id, revision_date)")
+    cur.execute("CREATE TABLE table_versions (entry_id, table_name, version, letter_codes, PRIMARY KEY (entry_id, table_name))")
+    cur.execute("INSERT INTO main VALUES('1A00', 1, 2)")
+    cur.execute("INSERT INTO coils VALUES('1A00', 3, 4)")
+    cur.execute("INSERT INTO completed VALUES('1A00', '2000-12-01')")
+    # duplicate primary key in the coils table, after the main table was already written
+    rows = {"main": [("1A00", 5, 6)], "coils": [("1A00", 7, 8), ("1A00", 7, 9)]}
+
+    with patch('commands.table_schemas', mock_table_schemas), \
+         patch('commands.entry_status', return_value="outdated"):
+        result = commands.write_file(cur, TEST_FILE_PATH, commands.ExtractedFile("1A00", "2000-12-31", rows), verbose=False)
+
+    assert not result
+    assert cur.execute("SELECT * FROM main").fetchall() == [("1A00", 1, 2)]
+    assert cur.execute("SELECT * FROM coils").fetchall() == [("1A00", 3, 4)]
+    assert cur.execute("SELECT * FROM completed").fetchall() == [("1A00", "2000-12-01")]
+
+
+def test_write_file_update_outside_transaction(mock_table_schemas):
+    """
+    Test that updating an entry while no transaction is open leaves committing to the caller.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute("CREATE TABLE main (entry_id, a, b, PRIMARY KEY (entry_id))")
+    cur.execute("CREATE TABLE coils (entry_id, a, b, PRIMARY KEY (entry_id, a))")
+    cur.execute("CREATE TABLE completed (entry_id, revision_date, PRIMARY KEY (entry_id))")
+    cur.execute("CREATE TABLE table_versions (entry_id, table_name, version, letter_codes, PRIMARY KEY (entry_id, table_name))")
+    cur.execute("INSERT INTO main VALUES('1A00', 1, 2)")
+    con.commit()
+    rows = {"main": [("1A00", 5, 6)], "coils": [("1A00", 7, 8)]}
+
+    with patch('commands.table_schemas', mock_table_schemas), \
+         patch('commands.entry_status', return_value="outdated"):
+        result = commands.write_file(cur, TEST_FILE_PATH, commands.ExtractedFile("1A00", "2000-12-31", rows), verbose=False)
+
+    assert result
+    assert con.in_transaction
+    assert cur.execute("SELECT * FROM main").fetchall() == [("1A00", 5, 6)]
+    con.rollback()
+    assert cur.execute("SELECT * FROM main").fetchall() == [("1A00", 1, 2)]
+
+
+
+
+@patch("commands.extract_rows")
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+def test_extract_file(mock_polymer_seq, mock_cif_read, mock_extract_rows, mock_structure):
+    with patch.object(gemmi, 'make_structure_from_block', return_value=mock_structure):
+        mock_doc, mock_block = MagicMock(), MagicMock()
+        mock_doc.sole_block.return_value = mock_block
+        mock_block.find_value.return_value = "2000-12-31"  # mock revision_date
+        mock_cif_read.return_value = mock_doc
+        mock_extract_rows.return_value = {"main": [TEST_DATA]}
+
+        result = commands.extract_file(TEST_FILE_PATH)
+
+        assert result == commands.ExtractedFile('1A00', "2000-12-31", {"main": [TEST_DATA]})
+        mock_extract_rows.assert_called_once_with(mock_structure, mock_doc, mock_polymer_seq.return_value, None)
+
+
+@patch("gemmi.cif.read")
+def test_extract_file_read_failure(mock_cif_read, capsys):
+    """
+    Test that None is returned and the error is printed when the file cannot be read.
+    """
+    mock_cif_read.side_effect = Exception("Error reading structure")
+    result = commands.extract_file(TEST_FILE_PATH)
+    captured = capsys.readouterr()
+
+    assert result is None
+    assert TEST_FILE_PATH in captured.out
+    assert "Error reading structure" in captured.out
+
+
+def test_write_file_entry_not_in_main_table(mock_table_schemas, mock_cursor, capsys):
+    rows = {"main": [TEST_DATA], "coils": []}
+    mock_cursor.execute.return_value.fetchone.return_value = None
+
+    with patch('commands.table_schemas', mock_table_schemas):
+        result = commands.write_file(mock_cursor, TEST_FILE_PATH, commands.ExtractedFile('1A00', "2000-12-31", rows))
+        captured = capsys.readouterr()
+
+        assert result
+        assert "Adding " + TEST_FILE_PATH in captured.out
+        expected_calls = [call.executemany(TEST_STATEMENT, [TEST_DATA]),
+                          call.executemany("INSERT OR REPLACE INTO table_versions VALUES(?, ?, ?, ?)", [('1A00', "main", 1, None), ('1A00', "coils", 1, None)]),
+                          call.executemany("INSERT INTO completed VALUES(?, ?)", [('1A00', "2000-12-31")])]
+        assert materialise_rows(mock_cursor).executemany.call_args_list == expected_calls
+
+
+def test_write_file_entry_exists_needs_revision(mock_table_schemas, mock_cursor, capsys):
+    rows = {"main": [TEST_DATA], "coils": []}
+    mock_cursor.execute.return_value.fetchone.side_effect = [
+        ('1A00', ),
+        ("2000-12-01", )
+    ]
+
+    with patch('commands.table_schemas', mock_table_schemas):
+        commands.write_file(mock_cursor, TEST_FILE_PATH, commands.ExtractedFile('1A00', "2000-12-31", rows))
+        expected_calls = [
+            call.execute("SAVEPOINT update_entry"),
+            call.execute("SELECT * FROM main WHERE entry_id = ?", ('1A00',)),
+            call.executemany(mock_table_schemas[0].upsert_statement, [TEST_DATA]),
+            call.execute("SELECT * FROM coils WHERE entry_id = ?", ('1A00',)),
+            call.executemany(commands.table_version_table.upsert_statement, [('1A00', "main", 1, None), ('1A00', "coils", 1, None)]),
+            call.executemany(commands.completion_table.upsert_statement, [('1A00', "2000-12-31")]),
+            call.execute("RELEASE update_entry")
+        ]
+        materialise_rows(mock_cursor).assert_has_calls(expected_calls)
+        assert "Updating " + TEST_FILE_PATH in capsys.readouterr().out
+
+
+def test_load_revision_dates(mock_cursor):
+    mock_cursor.execute.return_value.fetchall.return_value = [('1A00', "2000-12-31")]
+    result = commands.load_revision_dates(mock_cursor)
+
+    assert result == {'1A00': "2000-12-31"}
+    mock_cursor.execute.assert_called_once_with("SELECT entry_id, revision_date FROM completed")
+
+
+def test_init_database_indexes():
+    """
+    Test that the declared secondary indexes are created, on the tables that the rows are stored in.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+
+    indexes = cur.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()
+    assert set(indexes) == {("main_complex_type", "main"), ("main_source_organism", "main"), ("chains_chain_id", "chains_data")}
+    plan = cur.execute("EXPLAIN QUERY PLAN SELECT * FROM chains WHERE chain_id = 'A'").fetchall()
+    assert "USING INDEX chains_chain_id" in plan[0][3]
+
+
+def test_record_completed_entries():
+    """
+    Test that entries of a database filled before entries were recorded as completed get recorded,
+    unless they have no rows in the last table.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    cur.execute("INSERT INTO main (entry_id, complex_type, revision_date) VALUES ('1A00', 'protein', '2000-12-31')")
+    cur.execute("INSERT INTO main (entry_id, complex_type, revision_date) VALUES ('1B00', 'protein', '2000-12-31')")
+    cur.execute("INSERT INTO coils (entry_id, coil_id, chain_id) VALUES ('1A00', 1, 'A')")
+
+    commands.record_completed_entries(cur)
+    assert commands.load_revision_dates(cur) == {'1A00': "2000-12-31"}
+
+    # Only done once, so that interrupted insertions are not recorded later on
+    cur.execute("INSERT INTO coils (entry_id, coil_id, chain_id) VALUES ('1B00', 1, 'A')")
+    commands.record_completed_entries(cur)
+    assert commands.load_revision_dates(cur) == {'1A00': "2000-12-31"}
+
+
+@pytest.mark.parametrize("stored_date, file_date, expected", [
+    ("2000-12-31", "2000-12-31", True),
+    ("2000-12-31", "2000-12-01", True),
+    ("2000-12-01", "2000-12-31", False)
+])
+@patch("scan.read_revision_date")
+def test_is_up_to_date(mock_read_revision_date, stored_date, file_date, expected):
+    mock_read_revision_date.return_value = file_date
+    assert commands.is_up_to_date("test_path/1a00.cif.gz", {"1A00": stored_date}) == expected
+
+
+@patch("scan.read_revision_date")
+def test_is_up_to_date_entry_not_stored(mock_read_revision_date):
+    """
+    Test that a file whose entry is not stored is not up to date, without reading the file.
+    """
+    assert not commands.is_up_to_date("test_path/1a00.cif.gz", {})
+    mock_read_revision_date.assert_not_called()
+
+
+@patch("commands.is_up_to_date", return_value=True)
+@patch("gemmi.cif.read")
+def test_check_file_skips_up_to_date_file(mock_cif_read, mock_is_up_to_date, mock_cursor):
+    """
+    Test that an up to date file is neither parsed nor looked up in the database.
+    """
+    revision_dates = {'FILE': "2000-12-31"}
+    result = commands.check_file(mock_cursor, TEST_FILE_PATH, revision_dates=revision_dates)
+
+    assert result == 'FILE'  # entry ID is taken from the file name
+    mock_is_up_to_date.assert_called_once_with(TEST_FILE_PATH, revision_dates)
+    mock_cif_read.assert_not_called()
+    mock_cursor.execute.assert_not_called()
+
+
+@patch("commands.is_up_to_date", return_value=True)
+@patch("gemmi.cif.read")
+def test_extract_file_skips_up_to_date_file(mock_cif_read, mock_is_up_to_date):
+    result = commands.extract_file(TEST_FILE_PATH, {'FILE': "2000-12-31"})
+
+    assert result == commands.ExtractedFile('FILE', "2000-12-31", None)
+    mock_cif_read.assert_not_called()
+
+
+@patch("commands.extract_rows")
+@patch("commands.is_up_to_date", return_value=True)
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+def test_extract_file_up_to_date_tables(mock_polymer_seq, mock_cif_read, mock_is_up_to_date, mock_extract_rows, mock_structure):
+    """
+    Test that only the selected tables are extracted from up to date files, not the tables they reference.
+    """
+    with patch.object(gemmi, 'make_structure_from_block', return_value=mock_structure):
+        mock_doc = MagicMock()
+        mock_doc.sole_block.return_value.find_value.return_value = "2000-12-31"
+        mock_cif_read.return_value = mock_doc
+        mock_extract_rows.return_value = {"coils": [TEST_DATA]}
+
+        result = commands.extract_file(TEST_FILE_PATH, {'1A00': "2000-12-31"}, ["coils"])
+
+        assert result.tables == ["coils"]
+        selected = mock_extract_rows.call_args.args[3]
+        assert [table_scheme.name for table_scheme in selected] == ["coils"]
+
+
+
+@patch("commands.extract_rows")
+@patch("commands.is_up_to_date", return_value=True)
+@patch("scan.read_metadata")
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+def test_extract_file_up_to_date_metadata_tables(mock_polymer_seq, mock_cif_read, mock_read_metadata, mock_is_up_to_date,
+                                                 mock_extract_rows):
+    """
+    Test that the atom sites are not parsed when only metadata tables are extracted again.
+    """
+    with patch("commands.metadata_structure_from_document") as mock_metadata_structure:
+        mock_doc = MagicMock()
+        mock_doc.sole_block.return_value.find_value.return_value = "2000-12-31"
+        mock_read_metadata.return_value = (mock_doc, ["A"])
+        mock_extract_rows.return_value = {"entities": [TEST_DATA]}
+
+        result = commands.extract_file(TEST_FILE_PATH, {'1A00': "2000-12-31"}, ["entities"])
+
+        assert result.tables == ["entities"]
+        mock_cif_read.assert_not_called()
+        mock_read_metadata.assert_called_once_with(TEST_FILE_PATH)
+        mock_metadata_structure.assert_called_once_with(mock_doc, ["A"])
+        assert mock_extract_rows.call_args.args[0] == mock_metadata_structure.return_value
+
+
+
+@patch("commands.extract_rows")
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+def test_extract_file_cached(mock_polymer_seq, mock_cif_read, mock_extract_rows, mock_structure):
+    """
+    Test that entries in the structure cache are not parsed again, and are not added to it again.
+    """
+    with patch.object(gemmi, 'make_structure_from_block', return_value=mock_structure):
+        mock_cache = MagicMock()
+        mock_cache.revision_date.return_value = "2000-12-31"
+        mock_cache.read.return_value.sole_block.return_value.find_value.return_value = "2000-12-31"
+        mock_extract_rows.return_value = {"main": [TEST_DATA]}
+
+        result = commands.extract_file(TEST_FILE_PATH, cache=mock_cache, content_hash="hash")
+
+        mock_cache.revision_date.assert_called_once_with("FILE", "hash")
+        mock_cache.read.assert_called_once_with("FILE", "hash")
+        mock_cif_read.assert_not_called()
+        assert mock_extract_rows.call_args.args[1] == mock_cache.read.return_value
+        assert result.snapshot is None
+
+
+@patch("scan.read_revision_date")
+@patch("gemmi.cif.read")
+def test_extract_file_cached_up_to_date(mock_cif_read, mock_read_revision_date):
+    """
+    Test that cached entries that are up to date are found from the revision date in the cache,
+    without reading their file or their cached document.
+    """
+    mock_cache = MagicMock()
+    mock_cache.revision_date.return_value = "2000-12-31"
+
+    result = commands.extract_file(TEST_FILE_PATH, {"FILE": "2000-12-31"}, cache=mock_cache, content_hash="hash")
+
+    assert result == commands.ExtractedFile("FILE", "2000-12-31", None)
+    mock_read_revision_date.assert_not_called()
+    mock_cif_read.assert_not_called()
+    mock_cache.read.assert_not_called()
+
+
+@patch("structure_cache.make_snapshot", return_value=b"snapshot")
+@patch("commands.extract_rows")
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+def test_extract_file_not_cached(mock_polymer_seq, mock_cif_read, mock_extract_rows, mock_make_snapshot, mock_structure):
+    """
+    Test that entries missing from the structure cache are parsed, and their snapshot is returned.
+    """
+    with patch.object(gemmi, 'make_structure_from_block', return_value=mock_structure):
+        mock_cache = MagicMock()
+        mock_cache.revision_date.return_value = None
+        mock_cif_read.return_value.sole_block.return_value.find_value.return_value = "2000-12-31"
+        mock_extract_rows.return_value = {"main": [TEST_DATA]}
+
+        result = commands.extract_file(TEST_FILE_PATH, cache=mock_cache, content_hash="hash")
+
+        mock_cache.read.assert_not_called()
+        mock_cif_read.assert_called_once_with(TEST_FILE_PATH)
+        mock_make_snapshot.assert_called_once_with(mock_cif_read.return_value)
+        assert result.snapshot == b"snapshot"
+
+
+def test_metadata_structure_from_document():
+    """
+    Test that the structure gets an empty chain for every given chain, in the given order.
+    """
+    doc = gemmi.cif.read_string(METADATA_FILE)
+    struct = commands.metadata_structure_from_document(doc, ["B", "A"])
+
+    assert len(struct) == 1
+    assert [chain.name for chain in struct[0]] == ["B", "A"]
+    assert all(len(chain) == 0 for chain in struct[0])
+    assert [entity.name for entity in struct.entities] == ["1", "2"]
+
+
+def test_load_stale_tables(mock_table, mock_coil_table):
+    """
+    Test that only tables recorded with an older version than their extractor are stale,
+    and that entries without recorded versions count as the initial version.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute("CREATE TABLE completed (entry_id, revision_date)")
+    cur.execute("CREATE TABLE table_versions (entry_id, table_name, version, letter_codes, PRIMARY KEY (entry_id, table_name))")
+    cur.executemany("INSERT INTO completed VALUES(?, ?)", [("1A00", ""), ("1B00", ""), ("1C00", "")])
+    cur.executemany("INSERT INTO table_versions (entry_id, table_name, version) VALUES(?, ?, ?)",
+                    [("1A00", "main", 1), ("1A00", "coils", 2), ("1B00", "main", 1), ("1B00", "coils", 1)])
+    mock_coil_table.version = 2
+
+    with patch('commands.table_schemas', [mock_table, mock_coil_table]), patch('commands.letter_code_tables', []):
+        assert commands.load_stale_tables(cur) == {"1B00": ["coils"], "1C00": ["coils"]}
+        mock_coil_table.version = 1
+        assert commands.load_stale_tables(cur) == {}
+
+
+def test_load_stale_tables_letter_codes(mock_table, mock_coil_table):
+    """
+    Test that tables translated with other one-letter codes than the current ones are stale,
+    and that entries without recorded codes count as translated with the default ones.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute("CREATE TABLE completed (entry_id, revision_date)")
+    cur.execute("CREATE TABLE table_versions (entry_id, table_name, version, letter_codes, PRIMARY KEY (entry_id, table_name))")
+    cur.executemany("INSERT INTO completed VALUES(?, ?)", [("1A00", ""), ("1B00", ""), ("1C00", "")])
+    cur.executemany("INSERT INTO table_versions VALUES(?, ?, ?, ?)",
+                    [("1A00", "main", 1, None), ("1A00", "coils", 1, "ccd"), ("1B00", "coils", 1, "")])
+
+    with patch('commands.table_schemas', [mock_table, mock_coil_table]), \
+         patch('commands.letter_code_tables', [mock_coil_table]):
+        with patch('polymer_sequence.letter_codes_id', ""):
+            assert commands.load_stale_tables(cur) == {"1A00": ["coils"]}
+        with patch('polymer_sequence.letter_codes_id', "ccd"):
+            assert commands.load_stale_tables(cur) == {"1B00": ["coils"], "1C00": ["coils"]}
+
+
+def test_write_rows_records_letter_codes():
+    """
+    Test that the one-letter codes are recorded with the tables that are translated with them, and only with those,
+    and that databases created before they were recorded get the column.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute("CREATE TABLE table_versions (entry_id VARCHAR(5) NOT NULL, table_name VARCHAR NOT NULL, version INT, "
+                "PRIMARY KEY (entry_id, table_name))")
+    cur.execute("INSERT INTO table_versions VALUES('1B00', 'coils', 1)")
+    commands.init_database(cur)
+    rows = {"main": [], "coils": []}
+
+    with patch('polymer_sequence.letter_codes_id', "ccd"):
+        commands.write_rows(cur, [commands.ExtractedFile("1A00", "2000-12-31", rows, tables=["main", "coils"])])
+
+    assert cur.execute("SELECT * FROM table_versions ORDER BY entry_id, table_name").fetchall() == \
+        [("1A00", "coils", 1, "ccd"), ("1A00", "main", 1, None), ("1B00", "coils", 1, None)]
+
+
+def test_write_file_selected_tables(mock_table_schemas, mock_cursor):
+    """
+    Test that only the rows of the extracted tables are replaced, and that the entry stays recorded as completed.
+    """
+    rows = {"coils": [TEST_DATA]}
+    on_written = MagicMock()
+
+    with patch('commands.table_schemas', mock_table_schemas), \
+         patch('commands.entry_status', return_value="current"):
+        result = commands.write_file(mock_cursor, TEST_FILE_PATH, commands.ExtractedFile('1A00', "2000-12-31", rows, ["coils"]),
+                                     on_written=on_written)
+
+    assert result
+    assert mock_cursor.execute.call_args_list == [call("SAVEPOINT update_entry"),
+                                                  call("SELECT * FROM coils WHERE entry_id = ?", ('1A00',)),
+                                                  call("RELEASE update_entry")]
+    assert materialise_rows(mock_cursor).executemany.call_args_list == [call(mock_table_schemas[1].upsert_statement, [TEST_DATA]),
+                                                                        call(commands.table_version_table.upsert_statement, [('1A00', "coils", 1, None)])]
+    on_written.assert_called_once()
+
+
+@pytest.mark.parametrize("status", ["new", "outdated", "corrupted"])
+def test_write_file_selected_tables_not_current(mock_table_schemas, mock_cursor, status, capsys):
+    """
+    Test that entries that are not stored and up to date are not written from only some of their tables.
+    """
+    rows = {"coils": [TEST_DATA]}
+    on_written = MagicMock()
+
+    with patch('commands.table_schemas', mock_table_schemas), \
+         patch('commands.entry_status', return_value=status):
+        result = commands.write_file(mock_cursor, TEST_FILE_PATH, commands.ExtractedFile('1A00', "2000-12-31", rows, ["coils"]),
+                                     on_written=on_written)
+
+    assert not result
+    assert "1A00 needs every table to be extracted" in capsys.readouterr().out
+    mock_cursor.execute.assert_not_called()
+    mock_cursor.executemany.assert_not_called()
+    on_written.assert_not_called()
+
+
+@patch("commands.update_file")
+@patch("commands.is_up_to_date", return_value=True)
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+def test_check_file_force(mock_polymer_seq, mock_cif_read, mock_is_up_to_date, mock_update_file, mock_structure, mock_table_schemas, mock_cursor, capsys):
+    """
+    Test that forcing a check updates an entry that is up to date.
+    """
+    with patch.object(gemmi,'make_structure_from_block', return_value=mock_structure):
+        mock_doc, mock_block = MagicMock(), MagicMock()
+        mock_doc.sole_block.return_value = mock_block
+        mock_block.find_value.return_value = "2000-12-31"  # mock revision_date
+        mock_cif_read.return_value = mock_doc
+
+        # the entry is up to date and not corrupted
+        mock_cursor.execute.return_value.fetchone.side_effect = [
+            ('1A00', ),
+            ("2000-12-31", ),
+            ('1A00', )
+        ]
+
+        with patch('commands.table_schemas', mock_table_schemas):
+            result = commands.check_file(mock_cursor, TEST_FILE_PATH, revision_dates={'FILE': "2000-12-31"}, force=True)
+
+        assert result == '1A00'
+        assert "Updating " + TEST_FILE_PATH in capsys.readouterr().out
+        mock_is_up_to_date.assert_not_called()
+        mock_update_file.assert_called_once_with(mock_cursor, mock_structure, mock_doc, mock_polymer_seq.return_value)
+
+
+def test_write_file_up_to_date(mock_cursor):
+    """
+    Test that nothing is written for a file that was found to be up to date before it was parsed.
+    """
+    result = commands.write_file(mock_cursor, TEST_FILE_PATH, commands.ExtractedFile('1A00', "2000-12-31", None))
+
+    assert result
+    mock_cursor.execute.assert_not_called()
+
+
+def test_row_batch_flushes_at_max_rows(mock_table_schemas, mock_cursor):
+    rows = {"main": [TEST_DATA], "coils": [TEST_DATA]}
+    on_written = MagicMock()
+    batch = commands.RowBatch(max_rows=4)
+
+    with patch('commands.table_schemas', mock_table_schemas):
+        batch.add(mock_cursor, commands.ExtractedFile("1A00", "2000-12-31", rows), on_written)
+        assert "1A00" in batch
+        mock_cursor.executemany.assert_not_called()
+
+        batch.add(mock_cursor, commands.ExtractedFile("1B00", "2000-12-31", rows), on_written)
+        assert "1A00" not in batch
+        # one per table, one to record the versions of the tables, and one to record the entries as completed
+        assert mock_cursor.executemany.call_count == 4
+        assert on_written.call_count == 2
+
+
+@pytest.mark.parametrize("in_transaction", [True, False])
+def test_row_batch_drops_only_failing_entries(mock_table_schemas, in_transaction):
+    """
+    Test that when a batch cannot be written, the other entries in it still get written,
+    whether or not a transaction was open, and that they are not committed.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute("CREATE TABLE main (entry_id, a, b, PRIMARY KEY (entry_id))")
+    cur.execute("CREATE TABLE coils (entry_id, a, b)")
+    cur.execute("CREATE TABLE completed (entry_id, revision_date)")
+    cur.execute("CREATE TABLE table_versions (entry_id, table_name, version, letter_codes, PRIMARY KEY (entry_id, table_name))")
+    if in_transaction:
+        cur.execute("INSERT INTO completed VALUES('1C00', '2000-12-31')")
+    written = []
+    batch = commands.RowBatch()
+
+    with patch('commands.table_schemas', mock_table_schemas):
+        batch.add(cur, commands.ExtractedFile("1A00", "2000-12-31", {"main": [("1A00", 1, 2)],
+                                                                     "coils": [("1A00", 3, 4)]}),
+                  lambda: written.append("1A00"))
+        # duplicate primary key
+        batch.add(cur, commands.ExtractedFile("1B00", "2000-12-31", {"main": [("1B00", 1, 2), ("1B00", 3, 4)],
+                                                                     "coils": [("1B00", 5, 6)]}),
+                  lambda: written.append("1B00"))
+        batch.flush(cur)
+
+    assert written == ["1A00"]
+    assert cur.execute("SELECT entry_id FROM main").fetchall() == [("1A00",)]
+    assert cur.execute("SELECT entry_id FROM coils").fetchall() == [("1A00",)]
+    assert cur.execute("SELECT entry_id FROM completed WHERE entry_id != '1C00'").fetchall() == [("1A00",)]
+    assert con.in_transaction
+    con.rollback()
+    assert cur.execute("SELECT entry_id FROM main").fetchall() == []
@@ -0,0 +1,128 @@
+"""
+This script contains unit tests for testing methods in components.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import os
+from unittest.mock import patch
+
+import components
+import polymer_sequence
+import ingest
+
+COMPONENTS = """data_ALA
+_chem_comp.id ALA
+_chem_comp.type "L-PEPTIDE LINKING"
+_chem_comp.one_letter_code A
+_chem_comp.mon_nstd_parent_comp_id ?
+#
+data_MSE
+_chem_comp.id MSE
+_chem_comp.type "L-PEPTIDE LINKING"
+_chem_comp.one_letter_code M
+_chem_comp.mon_nstd_parent_comp_id MET
+#
+data_MET
+_chem_comp.id MET
+_chem_comp.type "L-PEPTIDE LINKING"
+_chem_comp.one_letter_code M
+_chem_comp.mon_nstd_parent_comp_id ?
+#
+data_XAL
+_chem_comp.id XAL
+_chem_comp.type "L-PEPTIDE LINKING"
+_chem_comp.one_letter_code ?
+_chem_comp.mon_nstd_parent_comp_id ALA
+#
+data_DUA
+_chem_comp.id DUA
+_chem_comp.type "L-PEPTIDE LINKING"
+_chem_comp.one_letter_code ?
+_chem_comp.mon_nstd_parent_comp_id "ALA,MET"
+#
+data_HOH
+_chem_comp.id HOH
+_chem_comp.type NON-POLYMER
+_chem_comp.one_letter_code ?
+_chem_comp.mon_nstd_parent_comp_id ?
+"""
+
+
+@pytest.fixture
+def ccd_path(tmp_path):
+    path = tmp_path / "components.cif"
+    path.write_text(COMPONENTS)
+    return str(path)
+
+
+def test_read_component_dictionary(ccd_path):
+    """
+    Test that components take their own one-letter code, or otherwise the code of their single parent.
+    """
+    result = components.read_component_dictionary(ccd_path)
+    assert result == {"ALA": "A", "MSE": "M", "MET": "M", "XAL": "A"}
+
+
+def test_load_letter_codes_writes_cache(ccd_path):
+    result = components.load_letter_codes(ccd_path)
+
+    assert result["XAL"] == "A"
+    assert os.path.exists(ccd_path + components.cache_suffix)
+    assert not os.path.exists(ccd_path + components.cache_suffix + ".tmp")
+
+
+def test_load_letter_codes_reads_cache(ccd_path):
+    """
+    Test that the CCD is only parsed again when it is newer than the cache.
+    """
+    components.load_letter_codes(ccd_path)
+    with patch("components.read_component_dictionary") as mock_read:
+        result = components.load_letter_codes(ccd_path)
+    mock_read.assert_not_called()
+    assert result["MSE"] == "M"
+
+    # The CCD is updated after the cache was written
+    cache_mtime = os.path.getmtime(ccd_path + components.cache_suffix)
+    os.utime(ccd_path, (cache_mtime + 10, cache_mtime + 10))
+    with patch("components.read_component_dictionary", return_value={"ALA": "A"}) as mock_read:
+        result = components.load_letter_codes(ccd_path)
+    mock_read.assert_called_once_with(ccd_path)
+    assert result == {"ALA": "A"}
+
+
+def test_use_letter_codes(ccd_path):
+    """
+    Test that monomers are translated with the codes from the CCD on top of the default ones.
+    """
+    try:
+        polymer_sequence.use_letter_codes(components.load_letter_codes(ccd_path))
+        assert polymer_sequence.sequence_3to1(["MSE", "GLY", "XAL", "HOH"]) == "MGAX"
+        assert polymer_sequence.letter_code_3to1("MSE") == "M"
+        assert polymer_sequence.letter_codes_id == polymer_sequence.hash_letter_codes(polymer_sequence.letter_codes) != ""
+    finally:
+        polymer_sequence.letter_codes = polymer_sequence.three_to_one
+        polymer_sequence.letter_codes_id = ""
+    assert polymer_sequence.sequence_3to1(["MSE", "GLY"]) == "XG"
+
+
+def test_init_worker_letter_codes():
+    try:
+        ingest.init_worker(None, {"MSE": "M"})
+        assert polymer_sequence.sequence_3to1(["MSE", "ALA"]) == "MA"
+    finally:
+        polymer_sequence.letter_codes = polymer_sequence.three_to_one
+        polymer_sequence.letter_codes_id = ""
+
+
+def test_hash_letter_codes():
+    """
+    Test that the default codes have an empty hash, and that other codes are hashed regardless of their order.
+    """
+    assert polymer_sequence.hash_letter_codes(dict(polymer_sequence.three_to_one)) == ""
+    codes = polymer_sequence.three_to_one | {"MSE": "M", "SEP": "S"}
+    assert polymer_sequence.hash_letter_codes(codes) == polymer_sequence.hash_letter_codes(dict(reversed(codes.items())))
+    assert polymer_sequence.hash_letter_codes(codes) != polymer_sequence.hash_letter_codes(codes | {"SEP": "X"})
@@ -0,0 +1,131 @@
+"""
+This script contains unit tests for testing methods in context.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+from unittest.mock import MagicMock
+import gemmi
+
+from context import EntryContext, Segment
+
+
+@pytest.mark.parametrize("segment, direction", [
+    (Segment('A', 'A', 1, 11), 1),
+    (Segment('A', 'A', 5, 5), 1),
+    (Segment('A', 'A', 11, 1), -1)
+])
+def test_segment_direction(segment, direction):
+    assert segment.direction == direction
+
+
+def mock_chain_with_residues(name: str, residues: list[tuple[int, str, int]]):
+    """
+    Returns a mock chain whose polymer has residues with the given (author number, insertion code, label_seq).
+    """
+    mock_residues = []
+    for num, icode, label_seq in residues:
+        residue = MagicMock(spec=gemmi.Residue)
+        residue.seqid.num, residue.seqid.icode, residue.label_seq = num, icode, label_seq
+        mock_residues.append(residue)
+    chain = MagicMock(spec=gemmi.Chain)
+    chain.name = name
+    chain.get_polymer.return_value.first_conformer.return_value = mock_residues
+    return chain
+
+
+def test_residue_positions(mock_structure, mock_doc):
+    """
+    Test that residues with insertion codes are told apart, and that they are indexed by their primary sequence ID.
+    """
+    chains = [mock_chain_with_residues('A', [(1, ' ', 1), (2, ' ', 2), (2, 'A', 3), (3, ' ', 4)]),
+              mock_chain_with_residues('B', [(10, ' ', 1)])]
+    mock_structure[0].__iter__.side_effect = lambda: iter(chains)
+    context = EntryContext(mock_structure, mock_doc, MagicMock())
+
+    assert context.residue_positions == {
+        'A': {(1, ' '): 1, (2, ' '): 2, (2, 'A'): 3, (3, ' '): 4},
+        'B': {(10, ' '): 1}}
+
+
+def test_resolve(mock_structure, mock_doc, mock_helix):
+    chains = [mock_chain_with_residues('A', [(num, '', num) for num in range(1, 12)])]
+    mock_structure[0].__iter__.side_effect = lambda: iter(chains)
+    mock_helix.start.chain_name = mock_helix.end.chain_name = 'A'
+    context = EntryContext(mock_structure, mock_doc, MagicMock())
+
+    result = context.resolve(mock_helix.start, mock_helix.end)
+
+    assert result == Segment('A', 'A', 1, 11)
+    assert result.in_one_chain()
+    # the model is only indexed once
+    context.resolve(mock_helix.start, mock_helix.end)
+    chains[0].get_polymer.assert_called_once()
+
+
+def test_resolve_residue_outside_polymer(mock_structure, mock_doc, mock_helix):
+    """
+    Test that an end on a residue that is not in the first conformer of the polymer (e.g. a ligand)
+    is looked up in its chain.
+    """
+    chains = [mock_chain_with_residues('A', [(num, '', num) for num in range(1, 6)])]
+    mock_structure[0].__iter__.side_effect = lambda: iter(chains)
+    mock_structure[0].find_cra.return_value.chain = chains[0]
+    chains[0].__getitem__.side_effect = lambda label: [MagicMock(label_seq=12)] if label == '11' else []
+    mock_helix.start.chain_name = mock_helix.end.chain_name = 'A'
+    context = EntryContext(mock_structure, mock_doc, MagicMock())
+
+    assert context.resolve(mock_helix.start, mock_helix.end) == Segment('A', 'A', 1, 12)
+    mock_structure[0].find_cra.assert_called_once_with(mock_helix.end)
+
+
+def test_helices_resolved_once(mock_structure, mock_doc, mock_helix):
+    """
+    Test that the helices are only resolved the first time they are asked for.
+    """
+    mock_structure.helices = [mock_helix]
+    context = EntryContext(mock_structure, mock_doc, MagicMock())
+    context.resolve = MagicMock(return_value=Segment('A', 'A', 1, 11))
+
+    assert context.helices == [Segment('A', 'A', 1, 11)]
+    assert context.helices == [Segment('A', 'A', 1, 11)]
+    context.resolve.assert_called_once_with(mock_helix.start, mock_helix.end)
+
+
+def test_strands(mock_structure, mock_doc, mock_sheet, mock_strand):
+    mock_structure.sheets = [mock_sheet, mock_sheet]
+    mock_sheet.strands = [mock_strand]
+    context = EntryContext(mock_structure, mock_doc, MagicMock())
+    context.resolve = MagicMock(return_value=Segment('A', 'A', 1, 11))
+
+    assert context.strands == [[Segment('A', 'A', 1, 11)], [Segment('A', 'A', 1, 11)]]
+
+
+def test_segment_sequence(mock_structure, mock_doc):
+    mock_sequence = MagicMock()
+    mock_sequence.get_chain_subsequence.return_value = ('ARNDCQEGHIX', 11)
+    context = EntryContext(mock_structure, mock_doc, mock_sequence)
+
+    assert context.segment_sequence(Segment('A', 'A', 1, 11)) == ('ARNDCQEGHIX', 11)
+    mock_sequence.get_chain_subsequence.assert_called_once_with('A', 1, 11)
+    assert context.segment_sequence(Segment('A', 'B', 1, 11)) == ("MULTIPLE CHAINS ERROR", 0)
+
+
+def test_chain_cache(mock_structure, mock_doc, mock_chain, mock_polymer):
+    """
+    Test that the polymer of a chain, its first conformer and its one-letter sequence are only computed once.
+    """
+    mock_polymer.first_conformer.return_value = iter(["res1", "res2"])
+    context = EntryContext(mock_structure, mock_doc, MagicMock())
+
+    for i in range(2):
+        assert context.polymer(mock_chain) == mock_polymer
+        assert context.first_conformer(mock_chain) == ["res1", "res2"]
+        assert context.one_letter_sequence(mock_chain) == "ARNDCQEGHIX"
+
+    mock_chain.get_polymer.assert_called_once()
+    mock_polymer.first_conformer.assert_called_once()
+    mock_polymer.make_one_letter_sequence.assert_called_once()
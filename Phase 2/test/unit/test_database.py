@@ -34,23 +34,39 @@ def test_insert_into_table_empty_data(mock_cursor):
         mock_cursor.execute.assert_called_with(expected_query, empty_test_data)
 
 def test_retrieve_from_table(mock_cursor):
-    expected_query = "SELECT * FROM main WHERE entry_id = 1A00"
+    expected_query = "SELECT * FROM main WHERE entry_id = ?"
     mock_cursor.execute.return_value.fetchall.return_value = [TEST_DATA]
 
     result = database.retrieve_from_table(mock_cursor, TEST_TABLE_NAME, TEST_ENTRY_ID)
     
     assert result == [TEST_DATA]
-    mock_cursor.execute.assert_called_once_with(expected_query)
+    mock_cursor.execute.assert_called_once_with(expected_query, (TEST_ENTRY_ID,))
 
 
 def test_retrieve_from_table_entry_not_found(mock_cursor):
-    expected_query = "SELECT * FROM main WHERE entry_id = 1A00"
+    expected_query = "SELECT * FROM main WHERE entry_id = ?"
     # empty list is returned since entry not found in table 
     mock_cursor.execute.return_value.fetchall.return_value = []
 
     result = database.retrieve_from_table(mock_cursor, TEST_TABLE_NAME, TEST_ENTRY_ID)
     
     assert result == []
-    mock_cursor.execute.assert_called_once_with(expected_query)
+    mock_cursor.execute.assert_called_once_with(expected_query, (TEST_ENTRY_ID,))
 
 
+def test_select_tables():
+    """
+    Test that only the given tables are selected, not the tables they reference, in the order of table_schemas.
+    """
+    result = database.select_tables(["strands", "experimental"])
+    assert [table.name for table in result] == ["experimental", "strands"]
+
+
+def test_select_tables_main():
+    result = database.select_tables(["main"])
+    assert result == [database.main_table]
+
+
+def test_select_tables_unknown_table():
+    with pytest.raises(ValueError, match="Unknown tables: residues"):
+        database.select_tables(["coils", "residues"])
@@ -8,7 +8,7 @@ Output verbosity can be adjusted by using the relevant flags in the command (e.g
 """
 
 import pytest
-from unittest.mock import patch, MagicMock, call
+from unittest.mock import patch, MagicMock
 import gemmi
 from gemmi import cif
 
@@ -371,39 +371,43 @@ def test_insert_into_chain_table_empty_polymer(mock_structure, mock_doc, mock_em
     assert result == expected
 
 
+def set_model_chains(structure, chains: dict[str, list[int]]):
+    """
+    Fills the model of a mock structure with chains whose polymers have residues with the given
+    sequence IDs (the same for the author and primary sequence IDs).
+    """
+    mock_chains = []
+    for name, seq_ids in chains.items():
+        residues = []
+        for seq_id in seq_ids:
+            residue = MagicMock(spec=gemmi.Residue)
+            residue.seqid.num, residue.seqid.icode, residue.label_seq = seq_id, '', seq_id
+            residues.append(residue)
+        chain = MagicMock(spec=gemmi.Chain)
+        chain.name = name
+        chain.get_polymer.return_value.first_conformer.return_value = residues
+        mock_chains.append(chain)
+    structure[0].__iter__.side_effect = lambda: iter(mock_chains)
+
+
 def test_insert_into_helix_table_different_start_and_end_chain(mock_structure, mock_doc, mock_helix):    
     """
-    Test that chain names are concatenated when the start and end chain are different. 
+    Test that chain names are concatenated when the start and end chain are different,
+    and that the helix gets no sequence.
     """
     mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
-
-    # mock helix sequence 
-    mock_polymer_sequence.get_helix_sequence.return_value = 'ARNDCQEGHIX'
     mock_structure.helices = [mock_helix]
 
     # different chain and end_chain
-    mock_start_chain = MagicMock(spec=gemmi.Chain)
-    mock_start_chain.name = 'A'
-    mock_end_chain = MagicMock(spec=gemmi.Chain)
-    mock_end_chain.name = 'B'
-    mock_structure[0].find_cra.side_effect = [MagicMock(chain=mock_start_chain), MagicMock(chain=mock_end_chain)]
-    
-    # mock start and end positions
-    mock_start_chain.__getitem__.return_value = [MagicMock(label_seq=1)]
-    mock_end_chain.__getitem__.return_value = [MagicMock(label_seq=11)]
+    mock_helix.start.chain_name = 'A'
+    mock_helix.end.chain_name = 'B'
+    set_model_chains(mock_structure, {'A': [1], 'B': [11]})
     
     result = extract.insert_into_helix_table(mock_structure, mock_doc, mock_polymer_sequence)
     expected = [
-        ('1A00', 1, 'A B', 'ARNDCQEGHIX', 1, 11, 11)
+        ('1A00', 1, 'A B', 'MULTIPLE CHAINS ERROR', 1, 11, 11)
     ]
-    
-    # check if find_cra was called with helix start and end 
-    expected_calls = [call.find_cra(mock_helix.start), call.find_cra(mock_helix.end)]
-    mock_structure[0].assert_has_calls(expected_calls)
- 
-    # check if mock chains were accessed with helix auth labels
-    mock_start_chain.__getitem__.assert_called_once_with('1')
-    mock_end_chain.__getitem__.assert_called_once_with('11')
+    mock_polymer_sequence.get_chain_subsequence.assert_not_called()
 
     assert result == expected
 
@@ -412,31 +416,33 @@ def test_insert_into_helix_table_same_start_and_end_chain(mock_structure, mock_d
     mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
 
     # mock helix sequence 
-    mock_polymer_sequence.get_helix_sequence.return_value = 'ARNDCQEGHIX'
+    mock_polymer_sequence.get_chain_subsequence.return_value = ('ARNDCQEGHIX', 11)
     mock_structure.helices = [mock_helix]
 
     # same chain and end_chain
-    mock_chain = MagicMock(spec=gemmi.Chain)
-    mock_chain.name = 'A'
-    mock_structure[0].find_cra.side_effect = [MagicMock(chain=mock_chain), MagicMock(chain=mock_chain)]
-    
-    # mock start and end positions
-    mock_chain.__getitem__.side_effect = [[MagicMock(label_seq=1)], [MagicMock(label_seq=11)]]
+    mock_helix.start.chain_name = mock_helix.end.chain_name = 'A'
+    set_model_chains(mock_structure, {'A': list(range(1, 12))})
 
     result = extract.insert_into_helix_table(mock_structure, mock_doc, mock_polymer_sequence)
     expected = [
         ('1A00', 1, 'A', 'ARNDCQEGHIX', 1, 11, 11)
     ]
+    mock_polymer_sequence.get_chain_subsequence.assert_called_once_with('A', 1, 11)
     
-    # check if find_cra was called with helix start and end 
-    expected_calls = [call.find_cra(mock_helix.start), call.find_cra(mock_helix.end)]
-    mock_structure[0].assert_has_calls(expected_calls)
+    assert result == expected
 
-    # check if mock chain was accessed with helix auth labels
-    expected_calls = [call.__getitem__('1'), call.__getitem__('11')]
-    mock_chain.assert_has_calls(expected_calls)
 
-    assert result == expected
+def test_insert_into_helix_table_missing_residue(mock_structure, mock_doc, mock_helix):
+    """
+    Test that a helix whose end is not a residue of its chain at all cannot be extracted.
+    """
+    mock_structure.helices = [mock_helix]
+    mock_helix.start.chain_name = mock_helix.end.chain_name = 'A'
+    set_model_chains(mock_structure, {'A': list(range(1, 6))})
+    mock_structure[0].find_cra.return_value.chain.__getitem__.return_value = []
+
+    with pytest.raises(IndexError):
+        extract.insert_into_helix_table(mock_structure, mock_doc, MagicMock())
     
 
 @patch('extract.sense_sequence')
@@ -460,34 +466,38 @@ def test_insert_into_strand_table(mock_structure, mock_doc, mock_sheet, mock_str
     mock_sheet.strands = [mock_strand]
 
     # mock strand sequence and length 
-    mock_polymer_sequence.get_strand_sequence.return_value = ['ARNDCQEGHIX', 11]
+    mock_polymer_sequence.get_chain_subsequence.return_value = ('ARNDCQEGHIX', 11)
     
     # chain and end_chain
-    mock_start_chain = MagicMock(spec=gemmi.Chain)
-    mock_start_chain.name = 'A'
-    mock_end_chain = MagicMock(spec=gemmi.Chain)
-    mock_end_chain.name = 'B'
-    mock_structure[0].find_cra.side_effect = [MagicMock(chain=mock_start_chain), MagicMock(chain=mock_end_chain)]
-    
-    # mock start and end positions
-    mock_start_chain.__getitem__.return_value = [MagicMock(label_seq=1)]
-    mock_end_chain.__getitem__.return_value = [MagicMock(label_seq=11)]
+    mock_strand.start.chain_name = 'A'
+    mock_strand.end.chain_name = 'B'
+    set_model_chains(mock_structure, {'A': [1], 'B': [11]})
 
     result = extract.insert_into_strand_table(mock_structure, mock_doc, mock_polymer_sequence)
+    # the strand ends in a different chain, so it gets no sequence
     expected = [
-        ('1A00', 'A', '1', 'A', 'ARNDCQEGHIX', 1, 11, 11)
+        ('1A00', 'A', '1', 'A', 'MULTIPLE CHAINS ERROR', 1, 11, 0)
     ]
-    
-    # check if find_cra was called with strand start and end 
-    expected_calls = [call.find_cra(mock_strand.start), call.find_cra(mock_strand.end)]
-    mock_structure[0].assert_has_calls(expected_calls)
-
-    # check if mock chains were accessed with strand auth labels
-    mock_start_chain.__getitem__.assert_called_once_with('1')
-    mock_end_chain.__getitem__.assert_called_once_with('11')
 
     assert result == expected
 
+
+def test_insert_into_strand_table_same_start_and_end_chain(mock_structure, mock_doc, mock_sheet, mock_strand):
+    mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
+    mock_polymer_sequence.get_chain_subsequence.return_value = ('XIHGEQCDNRA', -11)
+    mock_structure.sheets = [mock_sheet]
+    mock_sheet.strands = [mock_strand]
+
+    # the strand runs backwards along its chain
+    mock_strand.start.chain_name = mock_strand.end.chain_name = 'A'
+    mock_strand.start.res_id.seqid.num, mock_strand.end.res_id.seqid.num = 11, 1
+    set_model_chains(mock_structure, {'A': list(range(1, 12))})
+
+    result = extract.insert_into_strand_table(mock_structure, mock_doc, mock_polymer_sequence)
+
+    assert result == [('1A00', 'A', '1', 'A', 'XIHGEQCDNRA', 11, 1, -11)]
+    mock_polymer_sequence.get_chain_subsequence.assert_called_once_with('A', 11, 1)
+
 class TestCoilExtractor:
     @pytest.fixture
     @staticmethod
@@ -513,21 +523,11 @@ class TestCoilExtractor:
         sheet.strands = [strand]
         return sheet
     
-    @pytest.fixture
     @staticmethod
-    def mock_chain_a():
-        chain = MagicMock()
-        chain.name = "A"
-        chain.get_polymer.return_value.make_one_letter_sequence.return_value = "ARNDCQEGHIX"
-        chain.get_polymer.return_value.first_conformer.return_value = ["res1", "res2"]
-        return chain
-    
-    @pytest.fixture
-    @staticmethod
-    def mock_chain_b():
-        chain = MagicMock()
-        chain.name = "B"
-        return chain
+    def place(segment, start_chain: str, end_chain: str):
+        """Puts the ends of a mock helix or strand in the given chains."""
+        segment.start.chain_name = start_chain
+        segment.end.chain_name = end_chain
 
     @pytest.fixture
     @staticmethod
@@ -537,6 +537,7 @@ class TestCoilExtractor:
         structure.helices = [mock_helix]
         structure.sheets = [mock_sheet]
         structure[0].find_chain.side_effect = lambda x: mock_chain if x == "A" else None
+        set_model_chains(structure, {"A": list(range(1, 11)), "B": list(range(1, 9))})
         return structure
 
     @pytest.fixture 
@@ -557,21 +558,13 @@ class TestCoilExtractor:
 
         return polymer_sequence
 
-    def test_insert_into_coil_table(self, mock_structure, mock_polymer_sequence, mock_chain_a, mock_chain_b):
+    def test_insert_into_coil_table(self, mock_structure, mock_polymer_sequence):
         """
         Test valid extraction of coils with helices and sheets.
         """
-        # mock start and end ids of helices and strands 
-        mock_chain_a.__getitem__.side_effect = [[MagicMock(label_seq=1)], [MagicMock(label_seq=5)]]
-        mock_chain_b.__getitem__.side_effect = [[MagicMock(label_seq=6)], [MagicMock(label_seq=7)]]  
-
-        # mock start and end chains -- here, the helix and sheet are each in one chain
-        mock_structure[0].find_cra.side_effect = [
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_b), 
-            MagicMock(chain=mock_chain_b)
-        ]
+        # here, the helix and sheet are each in one chain
+        self.place(mock_structure.helices[0], "A", "A")
+        self.place(mock_structure.sheets[0].strands[0], "B", "B")
         
         result = extract.insert_into_coil_table(mock_structure, MagicMock(), mock_polymer_sequence)
         expected = [
@@ -584,22 +577,14 @@ class TestCoilExtractor:
         assert len(result) == 3
         assert result == expected
 
-    def test_insert_into_coil_table_ill_defined_helix(self, mock_structure, mock_polymer_sequence, mock_chain_a, mock_chain_b, capsys):
+    def test_insert_into_coil_table_ill_defined_helix(self, mock_structure, mock_polymer_sequence, capsys):
         """
         Test that no coils are extracted when a helix spans multiple chains
         (i.e. is ill-defined).
         """
-        # mock start and end ids of helices and strands 
-        mock_chain_a.__getitem__.side_effect = [[MagicMock(label_seq=1)]]
-        mock_chain_b.__getitem__.return_value = [MagicMock(label_seq=5), [MagicMock(label_seq=6)], [MagicMock(label_seq=7)]]
-
-        # mock start and end chains -- here, the helix spans across two chains 
-        mock_structure[0].find_cra.side_effect = [
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_b), 
-            MagicMock(chain=mock_chain_b), 
-            MagicMock(chain=mock_chain_b)
-            ]
+        # here, the helix spans across two chains 
+        self.place(mock_structure.helices[0], "A", "B")
+        self.place(mock_structure.sheets[0].strands[0], "B", "B")
         
         result = extract.insert_into_coil_table(mock_structure, MagicMock(), mock_polymer_sequence)
         expected = []
@@ -611,23 +596,14 @@ class TestCoilExtractor:
         assert expected_output in capsys.readouterr().out 
 
     
-    def test_insert_into_coil_table_ill_defined_strand(self, mock_structure, mock_polymer_sequence, mock_chain_a, mock_chain_b, capsys):
+    def test_insert_into_coil_table_ill_defined_strand(self, mock_structure, mock_polymer_sequence, capsys):
         """
         Test that no coils are extracted when a strand spans multiple chains
         (i.e. is ill-defined).
         """
-        # mock start and end ids of helices and strands 
-        mock_chain_a.__getitem__.side_effect = [[MagicMock(label_seq=1)], [MagicMock(label_seq=5)],
-                                              [MagicMock(label_seq=6)]]
-        mock_chain_b.__getitem__.return_value = [MagicMock(label_seq=7)]
-
-        # mock start and end chains -- here, the sheet spans across two chains 
-        mock_structure[0].find_cra.side_effect = [
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_b)
-            ]
+        # here, the sheet spans across two chains 
+        self.place(mock_structure.helices[0], "A", "A")
+        self.place(mock_structure.sheets[0].strands[0], "A", "B")
         
         result = extract.insert_into_coil_table(mock_structure, MagicMock(), mock_polymer_sequence)
         expected = []
@@ -659,7 +635,7 @@ class TestCoilExtractor:
         assert result == expected
 
 
-    def test_insert_into_coil_table_unconfirmed_chain(self, mock_structure, mock_polymer_sequence, mock_chain_a, mock_chain_b):
+    def test_insert_into_coil_table_unconfirmed_chain(self, mock_structure, mock_polymer_sequence):
         """
         Test valid extraction of coils when the whole chain is experimentally unconfirmed 
         (i.e. chain_object is None).
@@ -667,17 +643,9 @@ class TestCoilExtractor:
         # chain_object is None
         mock_structure[0].find_chain.side_effect = lambda x: None 
 
-        # mock start and end ids of helices and strands 
-        mock_chain_a.__getitem__.side_effect = [[MagicMock(label_seq=1)], [MagicMock(label_seq=5)]]
-        mock_chain_b.__getitem__.side_effect = [[MagicMock(label_seq=6)], [MagicMock(label_seq=7)]]  
-
-        # mock start and end chains -- here, the helix and sheet are each in one chain
-        mock_structure[0].find_cra.side_effect = [
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_b), 
-            MagicMock(chain=mock_chain_b)
-        ]
+        # here, the helix and sheet are each in one chain
+        self.place(mock_structure.helices[0], "A", "A")
+        self.place(mock_structure.sheets[0].strands[0], "B", "B")
 
         # annotated subsequence is empty
         mock_polymer_sequence.get_chain_annotated_subsequence.return_value = ""
@@ -696,21 +664,14 @@ class TestCoilExtractor:
         assert result == expected
 
     # coil start > coil_end 
-    def test_insert_into_coil_table_helix_at_chain_end(self, mock_structure, mock_chain_a, mock_chain_b, mock_polymer_sequence):
+    def test_insert_into_coil_table_helix_at_chain_end(self, mock_structure, mock_polymer_sequence):
         """
         Test valid extraction of coils when a helix ends at the last residue of a chain. 
         """
-        # mock start and end ids of helices and strands 
-        mock_chain_a.__getitem__.side_effect = [[MagicMock(label_seq=1)], [MagicMock(label_seq=10)]]
-        mock_chain_b.__getitem__.side_effect = [[MagicMock(label_seq=6)], [MagicMock(label_seq=7)]]                               
-
-        # mock start and end chains -- here, the helix and sheet are each in one chain
-        mock_structure[0].find_cra.side_effect = [
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_b), 
-            MagicMock(chain=mock_chain_b)
-        ]
+        # here, the helix and sheet are each in one chain, and the helix ends at the last residue of chain A
+        mock_structure.helices[0].end.res_id.seqid.num = 10
+        self.place(mock_structure.helices[0], "A", "A")
+        self.place(mock_structure.sheets[0].strands[0], "B", "B")
         
         result = extract.insert_into_coil_table(mock_structure, MagicMock(), mock_polymer_sequence)
         expected = [
@@ -723,21 +684,14 @@ class TestCoilExtractor:
         assert result == expected
     
 
-    def test_insert_into_coil_table_strand_at_chain_end(self, mock_structure, mock_chain_a, mock_chain_b, mock_polymer_sequence):
+    def test_insert_into_coil_table_strand_at_chain_end(self, mock_structure, mock_polymer_sequence):
         """
         Test valid extraction of coils when a strand ends at the last residue of a chain. 
         """
-        # mock start and end ids of helices and strands 
-        mock_chain_a.__getitem__.side_effect = [[MagicMock(label_seq=1)], [MagicMock(label_seq=5)]]
-        mock_chain_b.__getitem__.side_effect = [[MagicMock(label_seq=6)], [MagicMock(label_seq=8)]]                               
-
-        # mock start and end chains -- here, the helix and sheet are each in one chain
-        mock_structure[0].find_cra.side_effect = [
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_b), 
-            MagicMock(chain=mock_chain_b)
-        ]
+        # here, the helix and sheet are each in one chain, and the strand ends at the last residue of chain B
+        mock_structure.sheets[0].strands[0].end.res_id.seqid.num = 8
+        self.place(mock_structure.helices[0], "A", "A")
+        self.place(mock_structure.sheets[0].strands[0], "B", "B")
         
         result = extract.insert_into_coil_table(mock_structure, MagicMock(), mock_polymer_sequence)
         expected = [
@@ -750,7 +704,7 @@ class TestCoilExtractor:
         assert result == expected
 
     
-    def test_insert_into_coil_table_multiple_secondary_structures(self, mock_structure, mock_polymer_sequence, mock_chain_a, mock_chain_b):
+    def test_insert_into_coil_table_multiple_secondary_structures(self, mock_structure, mock_polymer_sequence):
         """
         Test valid extraction of coils with helices and sheets when a single chain 
         contains multiple secondary structures. 
@@ -758,23 +712,15 @@ class TestCoilExtractor:
         # add another helix to the mock gemmi structure 
         helix2 = MagicMock()
         helix2.start.res_id.seqid.num = 7
+        helix2.start.res_id.seqid.icode = ''
         helix2.end.res_id.seqid.num = 7
+        helix2.end.res_id.seqid.icode = ''
         mock_structure.helices.append(helix2)
 
-        # mock start and end ids of helices and strands 
-        mock_chain_a.__getitem__.side_effect = [[MagicMock(label_seq=1)], [MagicMock(label_seq=5)],
-                                                [MagicMock(label_seq=7)], [MagicMock(label_seq=7)]]
-        mock_chain_b.__getitem__.side_effect = [[MagicMock(label_seq=6)], [MagicMock(label_seq=7)]]  
-
-        # mock start and end chains -- here, two helices are in chain A, while the strand is in chain B.
-        mock_structure[0].find_cra.side_effect = [
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_a), 
-            MagicMock(chain=mock_chain_b), 
-            MagicMock(chain=mock_chain_b)
-        ]
+        # here, two helices are in chain A, while the strand is in chain B.
+        self.place(mock_structure.helices[0], "A", "A")
+        self.place(helix2, "A", "A")
+        self.place(mock_structure.sheets[0].strands[0], "B", "B")
         
         result = extract.insert_into_coil_table(mock_structure, MagicMock(), mock_polymer_sequence)
         expected = [
@@ -0,0 +1,492 @@
+"""
+This script contains unit tests for testing methods in ingest.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+from unittest.mock import patch, call, MagicMock
+import os
+import sqlite3
+
+import ingest
+import commands
+import database
+import manifest
+from manifest import FileRecord
+from ingest_profile import IngestProfile, bulk_load_profile
+
+TEST_PATHS = [os.path.join("a0", "1a00.cif.gz"), os.path.join("a0", "2a00.cif.gz"), os.path.join("b0", "1b00.cif.gz")]
+TEST_TASKS = [(path, False) for path in TEST_PATHS]
+
+
+class FakePool:
+    """Runs imap in the calling process, so that patched functions are visible."""
+    def __init__(self, workers, initializer=None, initargs=()):
+        self.workers = workers
+        if initializer is not None:
+            initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def imap(self, func, iterable, chunksize=1):
+        return map(func, iterable)
+
+
+def test_find_files(tmp_path):
+    (tmp_path / "a0").mkdir()
+    (tmp_path / "a0" / "1a00.cif.gz").touch()
+    (tmp_path / "a0" / "1a00.pdb.gz").touch()
+    (tmp_path / "1b00.cif").touch()
+
+    result = sorted(ingest.find_files(str(tmp_path)))
+    expected = sorted([str(tmp_path / "a0" / "1a00.cif.gz"), str(tmp_path / "1b00.cif")])
+
+    assert result == expected
+
+
+def write_file(cur, path, extracted, verbose=True, force=False, batch=None, on_written=None):
+    """Stands in for commands.write_file, writing every file straight away."""
+    on_written()
+    return True
+
+
+@patch("manifest.make_record")
+@patch("manifest.record_file")
+@patch("commands.write_file", side_effect=write_file)
+@patch("commands.extract_file")
+def test_ingest_serial(mock_extract_file, mock_write_file, mock_record_file, mock_make_record):
+    """
+    Test that every file is extracted and written in the calling process, and that only files
+    that were read successfully are recorded.
+    """
+    extracted = [commands.ExtractedFile("1A00", "2000-12-31", {}), commands.ExtractedFile("1B00", "2000-12-31", {})]
+    mock_extract_file.side_effect = [extracted[0], None, extracted[1]]
+    mock_make_record.return_value = FileRecord("1A00", 100, 0.0, "hash", 1)
+    mock_con = MagicMock()
+    ingest.ingest_serial(mock_con, TEST_TASKS)
+
+    assert mock_extract_file.call_args_list == [call(path, None, None, None, "hash") for path in TEST_PATHS]
+    assert mock_make_record.call_args_list == [call(TEST_PATHS[0], "1A00", None), call(TEST_PATHS[1], "2A00", None),
+                                               call(TEST_PATHS[2], "1B00", None)]
+    assert mock_record_file.call_count == 2
+    # everything fits in one transaction
+    assert mock_con.commit.call_count == 1
+
+
+@patch("ingest.Pool", FakePool)
+@patch("manifest.make_record")
+@patch("manifest.record_file")
+@patch("commands.write_file", side_effect=write_file)
+@patch("commands.extract_file")
+def test_ingest_parallel(mock_extract_file, mock_write_file, mock_record_file, mock_make_record):
+    """
+    Test that extracted results are written and recorded in the same order as the given paths,
+    and that files that could not be read are skipped.
+    """
+    extracted = [commands.ExtractedFile("1A00", "2000-12-31", {}), commands.ExtractedFile("1B00", "2000-12-31", {})]
+    results = {TEST_PATHS[0]: extracted[0], TEST_PATHS[1]: None, TEST_PATHS[2]: extracted[1]}
+    mock_extract_file.side_effect = lambda path, revision_dates, tables, cache, content_hash: results[path]
+    records = {"1A00": FileRecord("1A00", 100, 0.0, "hash", 1), "1B00": FileRecord("1B00", 100, 0.0, "hash", 1)}
+    mock_make_record.side_effect = lambda path, entry_id, manifest: FileRecord(entry_id, 100, 0.0, "hash", 1)
+    mock_con = MagicMock()
+    cur = mock_con.cursor.return_value
+
+    ingest.ingest_parallel(mock_con, TEST_TASKS, workers=2)
+
+    assert [write.args for write in mock_write_file.call_args_list] == [(cur, TEST_PATHS[0], extracted[0]),
+                                                                        (cur, TEST_PATHS[2], extracted[1])]
+    expected_calls = [call(cur, TEST_PATHS[0], records["1A00"]), call(cur, TEST_PATHS[2], records["1B00"])]
+    assert mock_record_file.call_args_list == expected_calls
+    assert mock_con.commit.call_count == 1
+
+
+@patch("manifest.record_file")
+@patch("commands.entry_status", return_value="new")
+def test_write_results_batches_rows(mock_entry_status, mock_record_file, mock_table_schemas):
+    """
+    Test that the rows of the files in a directory are written with one executemany per table,
+    and that files are only recorded once their rows are written.
+    """
+    rows = [{"main": [("1A00", "a", "b")], "coils": [("1A00", "c", "d")]},
+            {"main": [("2A00", "a", "b")], "coils": [("2A00", "c", "d"), ("2A00", "e", "f")]}]
+    records = [FileRecord("1A00", 100, 0.0, "hash", 1), FileRecord("2A00", 100, 0.0, "hash", 1)]
+    results = [(commands.ExtractedFile("1A00", "2000-12-31", rows[0]), records[0]),
+               (commands.ExtractedFile("2A00", "2000-12-31", rows[1]), records[1])]
+    mock_con = MagicMock()
+    cur = mock_con.cursor.return_value
+    cur.executemany.side_effect = lambda *args: mock_record_file.assert_not_called()
+
+    with patch("commands.table_schemas", mock_table_schemas):
+        ingest.write_results(mock_con, TEST_TASKS[:2], results)
+
+    assert [call(statement, list(rows)) for (statement, rows), kwargs in cur.executemany.call_args_list] == [
+        call("INSERT INTO main VALUES(?, ?, ?)", [("1A00", "a", "b"), ("2A00", "a", "b")]),
+        call("INSERT INTO coils VALUES(?, ?, ?)", [("1A00", "c", "d"), ("2A00", "c", "d"), ("2A00", "e", "f")]),
+        call("INSERT OR REPLACE INTO table_versions VALUES(?, ?, ?, ?)",
+             [("1A00", "main", 1, None), ("1A00", "coils", 1, None), ("2A00", "main", 1, None), ("2A00", "coils", 1, None)]),
+        call("INSERT INTO completed VALUES(?, ?)", [("1A00", "2000-12-31"), ("2A00", "2000-12-31")])]
+    assert mock_record_file.call_args_list == [call(cur, TEST_PATHS[0], records[0]),
+                                               call(cur, TEST_PATHS[1], records[1])]
+
+
+@patch("manifest.record_file")
+@patch("commands.write_file")
+def test_write_results_adds_snapshots(mock_write_file, mock_record_file):
+    """
+    Test that the snapshots of the files that had to be parsed are added to the structure cache.
+    """
+    records = [FileRecord("1A00", 100, 0.0, "hash", 1), FileRecord("2A00", 100, 0.0, "hash", 1)]
+    results = [(commands.ExtractedFile("1A00", "2000-12-31", {}, snapshot=b"snapshot"), records[0]),
+               (commands.ExtractedFile("2A00", "2000-12-31", {}), records[1])]
+    mock_cache = MagicMock()
+
+    ingest.write_results(MagicMock(), TEST_TASKS[:2], results, cache=mock_cache)
+
+    mock_cache.add.assert_called_once_with("1A00", "hash", "2000-12-31", b"snapshot")
+
+
+@pytest.mark.parametrize("profile, expected_commits", [
+    (IngestProfile(commit_entries=1), 3),
+    (IngestProfile(commit_entries=2), 2),
+    (IngestProfile(commit_bytes=150), 2),
+])
+@patch("commands.write_file", side_effect=write_file)
+def test_write_results_commit_size(mock_write_file, profile, expected_commits):
+    """
+    Test that a commit happens whenever the number of entries or bytes written reaches the profile's commit size.
+    """
+    results = [(commands.ExtractedFile("1A00", "2000-12-31", {}), FileRecord("1A00", 100, 0.0, "hash", 1))] * 3
+    mock_con = MagicMock()
+
+    with patch("manifest.record_file"):
+        ingest.write_results(mock_con, TEST_TASKS, results, profile=profile)
+
+    assert mock_con.commit.call_count == expected_commits
+
+
+@patch("ingest.Pool", FakePool)
+@patch("manifest.make_record", return_value=FileRecord("1A00", 100, 0.0, "hash", 1))
+@patch("commands.write_file")
+@patch("commands.extract_file")
+def test_ingest_parallel_revision_dates(mock_extract_file, mock_write_file, mock_make_record):
+    """
+    Test that the revision dates are handed to the workers once, rather than with every file,
+    and that the workers only get the manifest records of the files they extract.
+    """
+    revision_dates = {"1A00": "2000-12-31"}
+    records = {TEST_PATHS[0]: FileRecord("1A00", 100, 0.0, "hash", 1), "other": FileRecord("1C00", 100, 0.0, "hash", 1)}
+    mock_extract_file.return_value = None
+
+    ingest.ingest_parallel(MagicMock(), TEST_TASKS, workers=2, revision_dates=revision_dates, records=records)
+
+    expected_calls = [call(path, revision_dates, None, None, "hash") for path in TEST_PATHS]
+    assert mock_extract_file.call_args_list == expected_calls
+    assert mock_make_record.call_args.args[2] == {TEST_PATHS[0]: records[TEST_PATHS[0]]}
+    mock_write_file.assert_not_called()
+    ingest.init_worker(None)
+
+
+@patch("manifest.make_record", return_value=FileRecord("1A00", 100, 0.0, "hash", 1))
+@patch("commands.extract_file")
+def test_extract_file_forced(mock_extract_file, mock_make_record):
+    """
+    Test that forced files are extracted without checking their revision date.
+    """
+    ingest.init_worker({"1A00": "2000-12-31"})
+    mock_extract_file.return_value = None
+
+    assert ingest.extract_file((TEST_PATHS[0], True)) is None
+    mock_extract_file.assert_called_once_with(TEST_PATHS[0], None, None, None, "hash")
+    ingest.init_worker(None)
+
+
+@patch("manifest.file_status")
+def test_select_files(mock_file_status):
+    statuses = {TEST_PATHS[0]: "unchanged", TEST_PATHS[1]: "stale", TEST_PATHS[2]: "new", "c0/1c00.cif.gz": "missing"}
+    mock_file_status.side_effect = lambda path, records: statuses[path]
+
+    result = list(ingest.select_files(TEST_PATHS + ["c0/1c00.cif.gz"], {}))
+
+    assert result == [(TEST_PATHS[1], True), (TEST_PATHS[2], False)]
+
+
+@patch("manifest.file_status")
+def test_select_files_include_unchanged(mock_file_status):
+    statuses = {TEST_PATHS[0]: "unchanged", TEST_PATHS[1]: "stale", TEST_PATHS[2]: "new"}
+    mock_file_status.side_effect = lambda path, records: statuses[path]
+
+    result = list(ingest.select_files(TEST_PATHS, {}, include_unchanged=True))
+
+    assert result == [(TEST_PATHS[0], False), (TEST_PATHS[1], True), (TEST_PATHS[2], False)]
+
+
+@patch("manifest.make_record", return_value=None)
+@patch("commands.extract_file")
+def test_extract_file_missing(mock_extract_file, mock_make_record, capsys):
+    """
+    Test that a file that was deleted after it was selected is skipped with a warning.
+    """
+    assert ingest.extract_file((TEST_PATHS[0], False)) is None
+    mock_extract_file.assert_not_called()
+    assert "no longer exists" in capsys.readouterr().out
+
+
+@patch("manifest.make_record", return_value=FileRecord("1A00", 100, 0.0, "hash", 1))
+@patch("commands.extract_file")
+def test_extract_file_tables(mock_extract_file, mock_make_record):
+    """
+    Test that the selected tables are handed to the extraction of every file.
+    """
+    ingest.init_worker({"1A00": "2000-12-31"}, tables=["coils"])
+    mock_extract_file.return_value = None
+
+    assert ingest.extract_file((TEST_PATHS[0], False)) is None
+    mock_extract_file.assert_called_once_with(TEST_PATHS[0], {"1A00": "2000-12-31"}, ["coils"], None, "hash")
+    ingest.init_worker(None)
+
+
+@patch("commands.extract_file")
+def test_extract_file_record(mock_extract_file, tmp_path):
+    """
+    Test that files are recorded under the entry ID of their contents, with the content hash from the manifest
+    if they did not change since they were recorded, which is also what their entry is cached under.
+    """
+    path = tmp_path / "1a00.cif"
+    path.write_bytes(b"data_1A00\n")
+    stat = os.stat(path)
+    records = {str(path): FileRecord("1A00", stat.st_size, stat.st_mtime, "stored hash", 0)}
+    mock_extract_file.return_value = commands.ExtractedFile("1A01", "2000-12-31", {})
+    ingest.init_worker(None, records=records)
+
+    with patch("manifest.hash_file") as mock_hash_file:
+        extracted, record = ingest.extract_file((str(path), False))
+
+    mock_hash_file.assert_not_called()
+    mock_extract_file.assert_called_once_with(str(path), None, None, None, "stored hash")
+    assert record == FileRecord("1A01", stat.st_size, stat.st_mtime, "stored hash", database.extractor_version)
+    ingest.init_worker(None)
+
+
+@patch("ingest.ingest_serial")
+@patch("manifest.purge_files")
+@patch("manifest.load_manifest")
+@patch("commands.load_revision_dates")
+def test_ingest_directory_purges_deleted_files(mock_load_revision_dates, mock_load_manifest, mock_purge_files, mock_ingest_serial, tmp_path):
+    """
+    Test that files in the manifest that are no longer in the directory are purged,
+    and that their entries are no longer considered up to date.
+    """
+    deleted_path = str(tmp_path / "1b00.cif.gz")
+    (tmp_path / "1a00.cif").write_text("")
+    revision_dates = {"1B00": "2000-12-31"}
+    mock_load_revision_dates.return_value = revision_dates
+    mock_load_manifest.return_value = {deleted_path: MagicMock()}
+    mock_purge_files.return_value = {"1B00"}
+    mock_con = MagicMock()
+
+    ingest.ingest_directory(mock_con, str(tmp_path))
+
+    mock_purge_files.assert_called_once_with(mock_con.cursor.return_value, [deleted_path], mock_load_manifest.return_value)
+    assert revision_dates == {}
+    mock_ingest_serial.assert_called_once()
+
+
+@patch("ingest.ingest_serial")
+@patch("manifest.purge_files")
+@patch("manifest.load_manifest")
+@patch("commands.load_revision_dates")
+def test_ingest_directory_nothing_found(mock_load_revision_dates, mock_load_manifest, mock_purge_files, mock_ingest_serial, tmp_path, capsys):
+    """
+    Test that nothing is purged when no file is found under the directory, and that a missing directory is an error.
+    """
+    mock_load_revision_dates.return_value = {}
+    mock_load_manifest.return_value = {str(tmp_path / "1b00.cif.gz"): MagicMock()}
+
+    ingest.ingest_directory(MagicMock(), str(tmp_path))
+
+    mock_purge_files.assert_not_called()
+    assert "nothing is purged" in capsys.readouterr().out
+    with pytest.raises(FileNotFoundError):
+        ingest.ingest_directory(MagicMock(), str(tmp_path / "missing"))
+
+
+@patch("ingest.ingest_serial")
+@patch("manifest.purge_files")
+@patch("manifest.load_manifest")
+@patch("commands.load_revision_dates")
+def test_ingest_files_purge_limit(mock_load_revision_dates, mock_load_manifest, mock_purge_files, mock_ingest_serial, capsys):
+    """
+    Test that more deleted files than the purge limit are only purged when that is explicitly allowed.
+    """
+    records = {"%04d.cif.gz" % i: MagicMock() for i in range(100)}
+    deleted = list(records)[:20]
+    mock_load_revision_dates.return_value = {}
+    mock_load_manifest.return_value = records
+    mock_purge_files.return_value = set()
+
+    ingest.ingest_files(MagicMock(), [], deleted)
+    mock_purge_files.assert_not_called()
+    assert "Not purging 20 deleted files" in capsys.readouterr().out
+
+    ingest.ingest_files(MagicMock(), [], deleted, allow_mass_purge=True)
+    mock_purge_files.assert_called_once()
+
+
+@patch("ingest.ingest_serial")
+@patch("manifest.file_status")
+@patch("manifest.purge_files")
+@patch("manifest.load_manifest")
+@patch("commands.load_revision_dates")
+def test_ingest_changes(mock_load_revision_dates, mock_load_manifest, mock_purge_files, mock_file_status, mock_ingest_serial, tmp_path):
+    """
+    Test that only the files in the change list are ingested, and that only deleted files
+    that are in the manifest are purged.
+    """
+    changed_path = str(tmp_path / "a0" / "1a00.cif.gz")
+    deleted_path = str(tmp_path / "b0" / "1b00.cif.gz")
+    list_path = tmp_path / "changes.log"
+    list_path.write_text(">f+++++++++ a0/1a00.cif.gz\n*deleting   b0/1b00.cif.gz\n*deleting   c0/1c00.cif.gz\n")
+    mock_load_revision_dates.return_value = {}
+    mock_load_manifest.return_value = {deleted_path: MagicMock()}
+    mock_purge_files.return_value = {"1B00"}
+    mock_file_status.return_value = "new"
+    mock_con = MagicMock()
+
+    ingest.ingest_changes(mock_con, str(tmp_path), str(list_path))
+
+    mock_purge_files.assert_called_once_with(mock_con.cursor.return_value, [deleted_path], mock_load_manifest.return_value)
+    tasks = mock_ingest_serial.call_args.args[1]
+    assert list(tasks) == [(changed_path, False)]
+
+
+@patch("manifest.file_status", return_value="unchanged")
+@patch("manifest.load_manifest")
+@patch("ingest.ingest_files")
+@patch("commands.load_stale_tables")
+def test_ingest_stale(mock_load_stale_tables, mock_ingest_files, mock_load_manifest, mock_file_status):
+    """
+    Test that only files of entries with stale tables are processed, grouped by their stale tables,
+    and that no files are purged.
+    """
+    mock_load_stale_tables.return_value = {"1A00": ["coils"], "2A00": ["helices", "coils"], "1B00": ["coils"]}
+    paths = TEST_PATHS + [os.path.join("c0", "1c00.cif.gz")]
+    mock_con = MagicMock()
+
+    ingest.ingest_stale(mock_con, paths)
+
+    mock_load_stale_tables.assert_called_once_with(mock_con.cursor.return_value)
+    assert mock_ingest_files.call_args_list == [
+        call(mock_con, [TEST_PATHS[0], TEST_PATHS[2]], [], workers=1, verbose=False, profile=IngestProfile(), tables=["coils"], cache_path=None),
+        call(mock_con, [TEST_PATHS[1]], [], workers=1, verbose=False, profile=IngestProfile(), tables=["helices", "coils"], cache_path=None)]
+
+
+def test_ingest_stale_extracts_only_stale_tables(tmp_path):
+    """
+    Test that only the stale tables of an entry are extracted again, and only their versions are recorded,
+    not those of the tables they reference.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    path = tmp_path / "1a00.cif.gz"
+    path.write_bytes(b"")
+    rows = {table_scheme.name: [] for table_scheme in database.table_schemas}
+    main_row = {"entry_id": "1A00", "complex_type": "SingleProtein", "revision_date": "2000-12-31"}
+    rows["main"] = [tuple(main_row.get(name) for name in database.main_table.attributes.attribute_names)]
+    commands.write_rows(cur, [commands.ExtractedFile("1A00", "2000-12-31", rows)])
+    manifest.record_file(cur, str(path), manifest.make_record(str(path), "1A00"))
+
+    def extract_rows(struct, doc, sequence, tables):
+        return {table_scheme.name: rows[table_scheme.name] for table_scheme in tables}
+
+    with patch.object(database.coil_table, "version", 2), patch("commands.is_up_to_date", return_value=True), \
+         patch("commands.extract_rows", side_effect=extract_rows) as mock_extract_rows, \
+         patch("gemmi.cif.read"), patch("commands.structure_from_document") as mock_structure, \
+         patch("commands.get_revision_date", return_value="2000-12-31"), patch("commands.PolymerSequence"):
+        mock_structure.return_value.info = {"_entry.id": "1A00"}
+        ingest.ingest_stale(con, [str(path)])
+
+    assert mock_extract_rows.call_args.args[3] == [database.coil_table]
+    assert cur.execute("SELECT table_name, version FROM table_versions WHERE version != 1").fetchall() == [("coils", 2)]
+
+
+def test_ingest_stale_changed_file(tmp_path, capsys):
+    """
+    Test that an entry whose file changed since it was ingested is left alone, instead of having every table updated.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    path = tmp_path / "1a00.cif.gz"
+    path.write_bytes(b"")
+    rows = {table_scheme.name: [] for table_scheme in database.table_schemas}
+    main_row = {"entry_id": "1A00", "complex_type": "SingleProtein", "revision_date": "2000-12-31"}
+    rows["main"] = [tuple(main_row.get(name) for name in database.main_table.attributes.attribute_names)]
+    commands.write_rows(cur, [commands.ExtractedFile("1A00", "2000-12-31", rows)])
+    manifest.record_file(cur, str(path), manifest.make_record(str(path), "1A00"))
+    path.write_bytes(b"data_1A00\n")
+    stored = cur.execute("SELECT * FROM main").fetchall()
+
+    with patch.object(database.coil_table, "version", 2), patch("commands.extract_file") as mock_extract_file:
+        ingest.ingest_stale(con, [str(path)])
+
+    mock_extract_file.assert_not_called()
+    assert cur.execute("SELECT * FROM main").fetchall() == stored
+    assert cur.execute("SELECT COUNT(*) FROM table_versions WHERE version != 1").fetchone() == (0,)
+    assert "Leaving 1 files" in capsys.readouterr().out
+
+
+def test_ingest_changes_missing_file(tmp_path, capsys):
+    """
+    Test that a file that is named in the change list but no longer exists is skipped with a warning,
+    and that the other files are still ingested.
+    """
+    con = sqlite3.connect(":memory:")
+    commands.init_database(con.cursor())
+    (tmp_path / "ab").mkdir()
+    present_path = tmp_path / "ab" / "1abc.cif.gz"
+    present_path.write_bytes(b"")
+    list_path = tmp_path / "changes.log"
+    list_path.write_text(">f.st...... ab/9zzz.cif.gz\n>f+++++++++ ab/1abc.cif.gz\n")
+
+    with patch("commands.extract_file", return_value=None) as mock_extract_file:
+        ingest.ingest_changes(con, str(tmp_path), str(list_path))
+
+    assert mock_extract_file.call_args.args[0] == str(present_path)
+    assert "ab/9zzz.cif.gz, as it no longer exists" in capsys.readouterr().out
+
+
+@patch("ingest.ingest_stale")
+@patch("ingest.ingest_files")
+def test_ingest_directory_stale_only(mock_ingest_files, mock_ingest_stale, tmp_path):
+    path = tmp_path / "1a00.cif.gz"
+    path.write_bytes(b"")
+    mock_con = MagicMock()
+
+    ingest.ingest_directory(mock_con, str(tmp_path), stale_only=True)
+
+    mock_ingest_stale.assert_called_once_with(mock_con, [str(path)], workers=1, verbose=False, profile=IngestProfile(),
+                                              cache_path=None)
+    mock_ingest_files.assert_not_called()
+
+
+def test_ingest_files_bulk_load():
+    """
+    Test that secondary indexes are back after a bulk load, and that statistics were gathered for them.
+    """
+    con = sqlite3.connect(":memory:")
+    commands.init_database(con.cursor())
+    con.execute("INSERT INTO main (entry_id, complex_type) VALUES ('1A00', 'SingleProtein')")
+
+    ingest.ingest_files(con, [], [], profile=bulk_load_profile)
+
+    indexes = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+    assert "main_complex_type" in indexes
+    assert ("main", "main_complex_type") in con.execute("SELECT tbl, idx FROM sqlite_stat1").fetchall()
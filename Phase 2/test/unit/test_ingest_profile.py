@@ -0,0 +1,73 @@
+"""
+This script contains unit tests for testing methods in ingest_profile.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+from unittest.mock import call, MagicMock
+import sqlite3
+
+import ingest_profile
+from ingest_profile import IngestProfile
+
+
+def test_apply_profile():
+    mock_con = MagicMock()
+    ingest_profile.apply_profile(mock_con, IngestProfile())
+
+    mock_con.commit.assert_called_once()
+    assert mock_con.cursor.return_value.execute.call_args_list == [
+        call("PRAGMA journal_mode = WAL"),
+        call("PRAGMA synchronous = NORMAL"),
+        call("PRAGMA cache_size = -65536"),
+        call("PRAGMA temp_store = MEMORY")]
+    mock_con.execute.assert_not_called()
+
+
+def test_apply_profile_sqlite(tmp_path):
+    con = sqlite3.connect(tmp_path / "test.db")
+    ingest_profile.apply_profile(con, ingest_profile.bulk_load_profile)
+
+    assert con.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert con.execute("PRAGMA synchronous").fetchone() == (0,)
+    assert con.execute("PRAGMA cache_size").fetchone() == (-1048576,)
+    assert con.execute("PRAGMA foreign_keys").fetchone() == (0,)
+
+
+def test_commit_tracker():
+    mock_con = MagicMock()
+    tracker = ingest_profile.CommitTracker(mock_con, IngestProfile(commit_entries=3, commit_bytes=1000))
+
+    tracker.add(100)
+    tracker.add(100)
+    assert not tracker.is_due()
+    tracker.add(100)
+    assert tracker.is_due()
+
+    tracker.commit()
+    mock_con.commit.assert_called_once()
+    assert not tracker.is_due()
+    tracker.add(1000)
+    assert tracker.is_due()
+
+
+def test_drop_and_rebuild_indexes():
+    """
+    Test that only secondary indexes are dropped, and that they can be rebuilt afterwards.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute("CREATE TABLE coils (entry_id, coil_id, chain_id, PRIMARY KEY (entry_id, coil_id))")
+    cur.execute("CREATE INDEX coils_chain ON coils (chain_id)")
+
+    statements = ingest_profile.drop_indexes(cur)
+    remaining = cur.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+
+    assert statements == ["CREATE INDEX coils_chain ON coils (chain_id)"]
+    assert remaining == [("sqlite_autoindex_coils_1",)]
+
+    ingest_profile.rebuild_indexes(cur, statements)
+    names = {row[0] for row in cur.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert names == {"sqlite_autoindex_coils_1", "coils_chain"}
@@ -0,0 +1,162 @@
+"""
+This script contains unit tests for testing methods in manifest.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+from unittest.mock import patch, call, MagicMock
+import os
+import sqlite3
+
+import manifest
+import commands
+from manifest import FileRecord
+from database import extractor_version
+
+TEST_CONTENTS = b"data_1A00\n"
+
+
+@pytest.fixture
+def test_file(tmp_path):
+    path = tmp_path / "1a00.cif"
+    path.write_bytes(TEST_CONTENTS)
+    return str(path)
+
+
+@pytest.fixture
+def test_record(test_file):
+    stat = os.stat(test_file)
+    return FileRecord("1A00", stat.st_size, stat.st_mtime, manifest.hash_file(test_file), extractor_version)
+
+
+def test_hash_file(test_file):
+    result = manifest.hash_file(test_file)
+    assert len(result) == 64
+    assert result == manifest.hash_file(test_file)
+
+
+def test_make_record(test_file, test_record):
+    assert manifest.make_record(test_file, "1A00") == test_record
+
+
+def test_make_record_from_manifest(test_file, test_record):
+    """
+    Test that the content hash is taken from the manifest if the file has the same size and modification time,
+    and that the file is hashed otherwise.
+    """
+    records = {test_file: test_record._replace(content_hash="stored hash", extractor_version=0)}
+    with patch("manifest.hash_file") as mock_hash_file:
+        assert manifest.make_record(test_file, "1A00", records) == test_record._replace(content_hash="stored hash")
+        mock_hash_file.assert_not_called()
+
+    records = {test_file: test_record._replace(content_hash="stored hash", mtime=0.0)}
+    assert manifest.make_record(test_file, "1A00", records) == test_record
+
+
+def test_make_record_missing(tmp_path):
+    assert manifest.make_record(str(tmp_path / "1a00.cif"), "1A00") is None
+
+
+def test_file_status_missing(tmp_path, test_record):
+    """
+    Test that a file that no longer exists is missing, whether or not it was ingested before.
+    """
+    path = str(tmp_path / "2a00.cif")
+    assert manifest.file_status(path, {}) == "missing"
+    assert manifest.file_status(path, {path: test_record}) == "missing"
+
+
+def test_file_status_new(test_file):
+    assert manifest.file_status(test_file, {}) == "new"
+
+
+def test_file_status_unchanged(test_file, test_record):
+    assert manifest.file_status(test_file, {test_file: test_record}) == "unchanged"
+
+
+def test_file_status_stale(test_file, test_record):
+    record = test_record._replace(extractor_version=extractor_version - 1)
+    assert manifest.file_status(test_file, {test_file: record}) == "stale"
+
+
+def test_file_status_changed_size(test_file, test_record):
+    record = test_record._replace(size=test_record.size + 1)
+    assert manifest.file_status(test_file, {test_file: record}) == "changed"
+
+
+@patch("manifest.hash_file")
+def test_file_status_touched(mock_hash_file, test_file, test_record):
+    """
+    Test that a file whose modification time changed is hashed, and is unchanged if its hash is the same.
+    """
+    mock_hash_file.return_value = test_record.content_hash
+    record = test_record._replace(mtime=0.0)
+
+    assert manifest.file_status(test_file, {test_file: record}) == "unchanged"
+    mock_hash_file.assert_called_once_with(test_file)
+
+
+def test_file_status_changed_contents(test_file, test_record):
+    record = test_record._replace(mtime=0.0, content_hash="0" * 64)
+    assert manifest.file_status(test_file, {test_file: record}) == "changed"
+
+
+def test_find_deleted():
+    records = {"a/1a00.cif.gz": MagicMock(), "a/2a00.cif.gz": MagicMock()}
+    assert manifest.find_deleted(records, ["a/1a00.cif.gz", "a/3a00.cif.gz"]) == ["a/2a00.cif.gz"]
+
+
+def test_record_and_load_manifest(test_file, test_record):
+    cur = sqlite3.connect(':memory:').cursor()
+    cur.execute(manifest.file_table.create_table())
+
+    manifest.record_file(cur, test_file, test_record)
+    # recording a file again replaces its record
+    manifest.record_file(cur, test_file, test_record)
+
+    assert manifest.load_manifest(cur) == {test_file: test_record}
+
+
+def test_purge_files(mock_cursor):
+    records = {"a/1a00.cif.gz": FileRecord("1A00", 1, 1.0, "", 1), "a/2a00.cif.gz": FileRecord("2A00", 1, 1.0, "", 1)}
+    mock_table = MagicMock()
+    mock_table.name = "chains"
+    mock_table.stored_name = "chains_data"
+    mock_table.delete_entry_statement = "DELETE FROM chains_data WHERE entry_id = ?"
+
+    with patch("manifest.table_schemas", [mock_table]):
+        result = manifest.purge_files(mock_cursor, ["a/1a00.cif.gz"], records)
+
+    assert result == {"1A00"}
+    assert list(records) == ["a/2a00.cif.gz"]
+    expected_calls = [call.executemany("DELETE FROM completed WHERE entry_id = ?", [("1A00",)]),
+                      call.executemany("DELETE FROM table_versions WHERE entry_id = ?", [("1A00",)]),
+                      call.executemany("DELETE FROM chains_data WHERE entry_id = ?", [("1A00",)]),
+                      call.executemany("DELETE FROM files WHERE path = ?", [("a/1a00.cif.gz",)])]
+    mock_cursor.assert_has_calls(expected_calls)
+
+
+def test_purge_files_entry_at_other_path():
+    """
+    Test that an entry that another file still refers to keeps its rows, and that the other file
+    gets ingested again.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    records = {"a/1a00.cif.gz": FileRecord("1A00", 1, 1.0, "", 1), "b/1a00.cif": FileRecord("1A00", 1, 1.0, "", 1)}
+    for path, record in records.items():
+        manifest.record_file(cur, path, record)
+    cur.execute("INSERT INTO completed VALUES('1A00', '2000-12-31')")
+    cur.execute("INSERT INTO table_versions VALUES('1A00', 'coils', 1, NULL)")
+
+    result = manifest.purge_files(cur, ["a/1a00.cif.gz"], records)
+
+    assert result == {"1A00"}
+    assert records == {}
+    assert manifest.load_manifest(cur) == {}
+    assert cur.execute("SELECT COUNT(*) FROM completed").fetchone() == (0,)
+    assert cur.execute("SELECT COUNT(*) FROM table_versions").fetchone() == (1,)
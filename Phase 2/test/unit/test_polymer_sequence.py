@@ -11,7 +11,7 @@ import pytest
 from unittest.mock import patch, MagicMock
 import gemmi 
 
-from polymer_sequence import PolymerSequence, Monomer, letter_code_3to1, sequence_3to1, binary_search
+from polymer_sequence import PolymerSequence, Monomer, letter_code_3to1, sequence_3to1, binary_search, span_indices, span_index, string_indices
 
 
 def test_polymer_sequence_initialisation(mock_doc, fake_sequence_3to1):
@@ -37,50 +37,92 @@ def test_polymer_sequence_initialisation(mock_doc, fake_sequence_3to1):
         assert len(hetero_entries) == 1
 
 
-def test_binary_search_target_found(test_polymer_sequence):
+def test_polymer_sequence_first_conformer_mask(fake_sequence_3to1):
+    """
+    Test that only the first alternative of every residue with microheterogeneity is kept,
+    and that every residue after the alternatives is still kept.
+    """
+    mock_doc = MagicMock()
+    mock_doc.sole_block.return_value.find_loop.side_effect = lambda x: {
+        "_pdbx_poly_seq_scheme.pdb_strand_id": ["A", "A", "A", "A", "A", "A"],
+        "_pdbx_poly_seq_scheme.entity_id": ["1", "1", "1", "1", "1", "1"],
+        "_pdbx_poly_seq_scheme.seq_id": ["1", "2", "2", "2", "3", "4"],
+        "_pdbx_poly_seq_scheme.mon_id": ["ALA", "ASN", "ASP", "ARG", "ALA", "ARG"],
+        "_pdbx_poly_seq_scheme.pdb_mon_id": ["ALA", "ASN", "ASP", "ARG", "?", "ARG"],
+        "_pdbx_poly_seq_scheme.hetero": ["n", "y", "y", "y", "n", "n"]
+    }[x]
+
+    with patch("polymer_sequence.sequence_3to1", wraps=fake_sequence_3to1):
+        polymer_sequence = PolymerSequence(mock_doc)
+
+    assert list(polymer_sequence.first_conformer_mask) == [1, 1, 0, 0, 1, 1]
+    assert list(polymer_sequence.seq_ids) == [1, 2, 3, 4]
+    assert polymer_sequence.one_letter_code == "ANAR"
+    assert polymer_sequence.bad_indices == [2]
+    assert polymer_sequence.chain_end_indices == {"A": 3}
+
+
+def test_polymer_sequence_setter(test_polymer_sequence):
+    """
+    Test that assigning a list of monomers replaces the columns of the sequence.
+    """
+    sequence = [Monomer("C", 2, 5, "ALA", "ALA", "n"), Monomer("D", 3, 7, "ARG", "?", "n")]
+    test_polymer_sequence.sequence = sequence
+
+    assert test_polymer_sequence.sequence == sequence
+    assert list(test_polymer_sequence.seq_ids) == [5, 7]
+    assert test_polymer_sequence.chain_names == ["C", "D"]
+    assert list(test_polymer_sequence.chain_codes) == [0, 1]
+
+
+def test_index_of(test_polymer_sequence):
     # sequence defined in test_polymer_sequence
-    result = test_polymer_sequence.binary_search(0, 4, 5)
+    result = test_polymer_sequence.index_of('A', 5)
     assert result == 4
 
 
-def test_binary_search_target_found_at_start(test_polymer_sequence):
-    result = test_polymer_sequence.binary_search(0, 3, 1)
+def test_index_of_at_start(test_polymer_sequence):
+    result = test_polymer_sequence.index_of('A', 1)
     assert result == 0
 
 
-def test_binary_search_target_found_at_end(test_polymer_sequence):
-    result = test_polymer_sequence.binary_search(1, 10, 11)
+def test_index_of_at_end(test_polymer_sequence):
+    result = test_polymer_sequence.index_of('A', 11)
     assert result == 10
 
 
-def test_binary_search_target_not_found(test_polymer_sequence):
+def test_index_of_not_found(test_polymer_sequence):
     """ 
-    Test that an Exception is raised when the target label cannot be found.
+    Test that an Exception is raised when the sequence id or the chain cannot be found.
     """
-    # target_label not in defined range
+    # sequence id not in chain
     with pytest.raises(Exception, match="Couldn't find index"):
-        test_polymer_sequence.binary_search(1, 4, 1)
-    # target_label not in sequence
+        test_polymer_sequence.index_of('A', 12)
+    # chain not in sequence
     with pytest.raises(Exception, match="Couldn't find index"):
-        test_polymer_sequence.binary_search(0, 4, 10)
-        
+        test_polymer_sequence.index_of('B', 1)
 
-def test_binary_search_invalid_range(test_polymer_sequence):
-    """ 
-    Test that an Exception is raised when right index is less than left index.
+
+def test_index_of_empty_sequence(test_polymer_sequence):
     """
+    Test that an Exception is raised when the sequence is empty.
+    """
+    test_polymer_sequence.sequence = []
+
     with pytest.raises(Exception, match="Couldn't find index"):
-        test_polymer_sequence.binary_search(4, 0, 5)
+        test_polymer_sequence.index_of('A', 5)
 
 
-def test_binary_search_empty_sequence(test_polymer_sequence):
+def test_index_of_multiple_chains(test_polymer_sequence):
     """
-    Test that an IndexError is raised when the sequence is empty.
+    Test that sequence ids are looked up in their own chain.
     """
-    test_polymer_sequence.sequence = []
+    test_polymer_sequence.sequence = [Monomer("A", 1, 1, "ALA", "ALA", "n"), Monomer("A", 1, 2, "ARG", "ARG", "n"),
+                                      Monomer("B", 2, 1, "ASN", "ASN", "n"), Monomer("B", 2, 2, "ASP", "ASP", "n")]
 
-    with pytest.raises(IndexError):
-        test_polymer_sequence.binary_search(0, 4, 5)
+    assert test_polymer_sequence.index_of('A', 2) == 1
+    assert test_polymer_sequence.index_of('B', 1) == 2
+    assert test_polymer_sequence.index_of('B', 2) == 3
 
 
 def test_get_chain_subsequence_chain_not_in_start_indices(test_polymer_sequence):
@@ -96,16 +138,16 @@ def test_get_chain_subsequence_chain_not_in_start_indices(test_polymer_sequence)
     assert result_sequence == expected_sequence
 
 
-@patch('polymer_sequence.PolymerSequence.binary_search')
-def test_get_chain_subsequence_end_larger_than_start(mock_binary_search, test_polymer_sequence):
+@patch('polymer_sequence.PolymerSequence.index_of')
+def test_get_chain_subsequence_end_larger_than_start(mock_index_of, test_polymer_sequence):
     """
     Test the get_chain_subsequence function when the end_index is 
     larger than or equal to the start_index.
     """
     mock_chain_name = 'A'
 
-    # mock return value of binary_search (start and end index)
-    mock_binary_search.side_effect = [0, 10]
+    # mock return value of index_of (start and end index)
+    mock_index_of.side_effect = [0, 10]
     
     # start_id and end_id not required and can be mocked 
     result = test_polymer_sequence.get_chain_subsequence(mock_chain_name, MagicMock(), MagicMock())
@@ -114,15 +156,15 @@ def test_get_chain_subsequence_end_larger_than_start(mock_binary_search, test_po
     assert result == expected
 
 
-@patch('polymer_sequence.PolymerSequence.binary_search')
-def test_get_chain_subsequence_end_equals_zero(mock_binary_search, test_polymer_sequence):
+@patch('polymer_sequence.PolymerSequence.index_of')
+def test_get_chain_subsequence_end_equals_zero(mock_index_of, test_polymer_sequence):
     """
     Test the get_chain_subsequence function when the end_index is zero.
     """
     mock_chain_name = 'A'
 
-    # mock return value of binary_search (start and end index)
-    mock_binary_search.side_effect = [3, 0]
+    # mock return value of index_of (start and end index)
+    mock_index_of.side_effect = [3, 0]
 
     # start_id and end_id not required and can be mocked 
     result = test_polymer_sequence.get_chain_subsequence(mock_chain_name, MagicMock(), MagicMock())
@@ -133,16 +175,16 @@ def test_get_chain_subsequence_end_equals_zero(mock_binary_search, test_polymer_
     assert result == expected
 
 
-@patch('polymer_sequence.PolymerSequence.binary_search')
-def test_get_chain_subsequence_end_less_than_start_and_not_zero(mock_binary_search, test_polymer_sequence):
+@patch('polymer_sequence.PolymerSequence.index_of')
+def test_get_chain_subsequence_end_less_than_start_and_not_zero(mock_index_of, test_polymer_sequence):
     """
     Test the get_chain_subsequence function when the end_index is 
     less than the start_index and not zero.
     """ 
     mock_chain_name = 'A'
 
-    # mock return value of binary_search (start and end index)
-    mock_binary_search.side_effect = [3, 1]
+    # mock return value of index_of (start and end index)
+    mock_index_of.side_effect = [3, 1]
 
     # start_id and end_id not required and can be mocked 
     result = test_polymer_sequence.get_chain_subsequence(mock_chain_name, MagicMock(), MagicMock())
@@ -222,6 +264,28 @@ def test_contains_unconfirmed_residues_no_bad_indices(test_polymer_sequence):
     assert result == 0
 
 
+def test_contains_unconfirmed_residues_reversed_range(test_polymer_sequence):
+    test_polymer_sequence.bad_indices = [5, 10]
+    result = test_polymer_sequence.contains_unconfirmed_residues('A', 11, 1)
+    assert result == 0
+
+
+def test_count_unconfirmed_residues(test_polymer_sequence):
+    test_polymer_sequence.bad_indices = [2, 5, 6]
+    assert test_polymer_sequence.count_unconfirmed_residues('A', 1, 11) == 3
+    assert test_polymer_sequence.count_unconfirmed_residues('A', 4, 7) == 2
+    assert test_polymer_sequence.count_unconfirmed_residues('A', 3, 3) == 1
+    # range after the last unconfirmed residue
+    assert test_polymer_sequence.count_unconfirmed_residues('A', 8, 11) == 0
+
+
+def test_get_unconfirmed_residues(test_polymer_sequence):
+    test_polymer_sequence.bad_indices = [2, 5, 6]
+    assert test_polymer_sequence.get_unconfirmed_residues('A', 1, 11) == [3, 6, 7]
+    assert test_polymer_sequence.get_unconfirmed_residues('A', 4, 6) == [6]
+    assert test_polymer_sequence.get_unconfirmed_residues('A', 8, 11) == []
+
+
 def test_get_chain_start_id(test_polymer_sequence):
     result = test_polymer_sequence.get_chain_start_id('A')
     assert result == 1
@@ -267,81 +331,6 @@ def test_get_chain_end_id_empty_sequence(test_polymer_sequence):
         test_polymer_sequence.get_chain_end_id('A')
 
 
-@patch('polymer_sequence.PolymerSequence.binary_search')
-def test_get_helix_sequence(mock_binary_search, mock_structure, test_polymer_sequence, mock_helix):
-    mock_chain = MagicMock(spec=gemmi.Chain)
-    mock_chain.name = 'A'
-    mock_structure[0].find_cra.return_value.chain = mock_chain
-    
-    mock_chain.__getitem__.side_effect = lambda x: MagicMock(label_seq=int(x))
-
-    expected_sequence = 'ARNDCQEGHIX'
-    
-    # mock return values of binary_search function to chain_start and chain_end
-    mock_binary_search.side_effect = [0, 10]
-
-    helix_sequence = test_polymer_sequence.get_helix_sequence(mock_helix, mock_structure)
-    
-    assert helix_sequence == expected_sequence
-
-
-@patch('polymer_sequence.PolymerSequence.binary_search')
-def test_get_helix_sequence_multiple_chains_error(mock_binary_search, mock_structure, test_polymer_sequence, mock_helix):
-    """
-    Test the get_helix_sequence function when the 
-    start chain is not equal to the end_chain.
-    """
-    mock_start_chain = MagicMock(spec=gemmi.Chain)
-    mock_start_chain.name = 'A'
-    mock_end_chain = MagicMock(spec=gemmi.Chain)
-    mock_end_chain.name = 'B'
-    mock_structure[0].find_cra.side_effect = [MagicMock(chain=mock_start_chain), MagicMock(chain=mock_end_chain)]
-    
-    # mock return values of binary_search function to chain_start and chain_end
-    mock_binary_search.side_effect = [0, 10]
-
-    helix_sequence = test_polymer_sequence.get_helix_sequence(mock_helix, mock_structure)
-    
-    assert helix_sequence == "MULTIPLE CHAINS ERROR"
-
-
-@patch('polymer_sequence.PolymerSequence.binary_search')
-def test_get_strand_sequence(mock_binary_search, mock_structure, test_polymer_sequence, mock_strand):
-    mock_chain = MagicMock(spec=gemmi.Chain)
-    mock_chain.name = 'A'
-    mock_structure[0].find_cra.return_value.chain = mock_chain
-    mock_chain.__getitem__.side_effect = lambda x: MagicMock(label_seq=int(x))
-    
-    # mock return values of binary_search function to chain_start and chain_end
-    mock_binary_search.side_effect = [0, 10]
-
-    result = test_polymer_sequence.get_strand_sequence(mock_strand, mock_structure)
-    expected = ('ARNDCQEGHIX', 11)
-    
-    assert result == expected
-
-
-#@pytest.mark.skip(reason=None)
-@patch('polymer_sequence.PolymerSequence.binary_search')
-def test_get_strand_sequence_multiple_chains_error(mock_binary_search, mock_structure, test_polymer_sequence, mock_strand):
-    """
-    Test the get_strand_sequence function when the 
-    start chain is not equal to the end_chain.
-    """
-    mock_start_chain = MagicMock(spec=gemmi.Chain)
-    mock_start_chain.name = 'A'
-    mock_end_chain = MagicMock(spec=gemmi.Chain)
-    mock_end_chain.name = 'B'
-    mock_structure[0].find_cra.side_effect = [MagicMock(chain=mock_start_chain), MagicMock(chain=mock_end_chain)]
-
-    # mock return values of binary_search function to chain_start and chain_end
-    mock_binary_search.side_effect = [0, 10]
-
-    result = test_polymer_sequence.get_strand_sequence(mock_strand, mock_structure)
-    
-    assert result == ("MULTIPLE CHAINS ERROR", 0)
-
-
 def test_get_chain_sequence(test_polymer_sequence):
     mock_chain_name = 'A'
     result_sequence = test_polymer_sequence.get_chain_sequence(mock_chain_name)
@@ -456,4 +445,48 @@ def test_sequence_3to1_empty_sequence():
     """
     empty_sequence = []
 
-    assert sequence_3to1(empty_sequence) == ''
\ No newline at end of file
+    assert sequence_3to1(empty_sequence) == ''
+
+def test_get_chain_annotated_subsequence_cached_span_indices(test_polymer_sequence, mock_span):
+    """
+    Test that the positions of the residues of a span are indexed once per chain when the chain is given.
+    """
+    test_chain_string = 'ARNDCQEGH-IX'
+    with patch("polymer_sequence.span_indices", wraps=span_indices) as mock_span_indices:
+        first = test_polymer_sequence.get_chain_annotated_subsequence(mock_span, test_chain_string, 1, 3, 'A')
+        second = test_polymer_sequence.get_chain_annotated_subsequence(mock_span, test_chain_string, 4, 10, 'A')
+
+    assert first == "ARN"
+    assert second == "DCQEGH-I"
+    mock_span_indices.assert_called_once_with(mock_span)
+
+
+def test_span_index_missing_label(mock_span):
+    """
+    Test that a sequence id that is not in the span falls back to the binary search.
+    """
+    del mock_span[4] # residue with label_seq 5
+    indices = span_indices(mock_span)
+
+    assert span_index(mock_span, indices, 6) == 4
+    assert span_index(mock_span, indices, 0) == 0
+    assert span_index(mock_span, indices, 12) == 8
+
+
+def test_string_indices():
+    assert string_indices('AR-N--D') == [0, 1, 3, 6]
+    assert string_indices('') == []
+
+
+def test_get_chain_annotated_subsequence_cached_string_indices(test_polymer_sequence, mock_span):
+    """
+    Test that the gaps of the annotated sequence of a chain are only indexed once per chain.
+    """
+    test_chain_string = 'ARNDCQEGH-IX'
+    with patch("polymer_sequence.string_indices", wraps=string_indices) as mock_string_indices:
+        first = test_polymer_sequence.get_chain_annotated_subsequence(mock_span, test_chain_string, 8, 10, 'A')
+        second = test_polymer_sequence.get_chain_annotated_subsequence(mock_span, test_chain_string, 1, 2, 'A')
+
+    assert first == "GH-I"
+    assert second == "AR"
+    mock_string_indices.assert_called_once_with(test_chain_string)
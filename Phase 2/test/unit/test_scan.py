@@ -0,0 +1,152 @@
+"""
+This script contains unit tests for testing methods in scan.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import gzip
+
+import scan
+
+TEST_FILE = b"""data_1A00
+#
+_entry.id   1A00
+#
+loop_
+_pdbx_audit_revision_history.ordinal
+_pdbx_audit_revision_history.data_content_type
+_pdbx_audit_revision_history.major_revision
+_pdbx_audit_revision_history.minor_revision
+_pdbx_audit_revision_history.revision_date
+1 'Structure model' 1 0 1998-01-14
+2 'Structure model' 1 1 2008-03-24
+#
+_struct.title   'MOCK TITLE'
+#
+"""
+
+# Chain B has atoms in a later model than the first only, and chain C has no atoms at all
+ATOM_SITES = b"""loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.label_atom_id
+_atom_site.label_asym_id
+_atom_site.auth_asym_id
+_atom_site.pdbx_PDB_model_num
+ATOM 1 N A D 1
+ATOM 2 CA A D 1
+HETATM 3 O D A 1
+ATOM 4 N A D 2
+ATOM 5 N B B 2
+#
+"""
+
+
+@pytest.mark.parametrize("file_path", ["database/a0/1a00.cif.gz", "1a00.cif", "1A00.cif.gz"])
+def test_entry_id_from_path(file_path):
+    assert scan.entry_id_from_path(file_path) == "1A00"
+
+
+def test_read_bytes_compressed(tmp_path):
+    path = tmp_path / "1a00.cif.gz"
+    with gzip.open(path, 'wb') as file:
+        file.write(TEST_FILE)
+
+    assert scan.read_bytes(str(path)) == TEST_FILE
+
+
+def test_read_bytes_uncompressed(tmp_path):
+    path = tmp_path / "1a00.cif"
+    path.write_bytes(TEST_FILE)
+
+    assert scan.read_bytes(str(path)) == TEST_FILE
+
+
+def test_find_category_loop():
+    result = scan.find_category(TEST_FILE, "_pdbx_audit_revision_history")
+    assert result.startswith(b"loop_\n_pdbx_audit_revision_history.ordinal")
+    assert result.endswith(b"2008-03-24\n")
+
+
+def test_find_category_pair():
+    assert scan.find_category(TEST_FILE, "_struct") == b"_struct.title   'MOCK TITLE'\n"
+
+
+def test_find_category_not_found():
+    """
+    Test that an empty byte string is returned when the category is not in the file,
+    even if another category starts with the same name.
+    """
+    assert scan.find_category(TEST_FILE, "_pdbx_audit_revision") == b''
+    assert scan.find_category(TEST_FILE, "_exptl") == b''
+
+
+def test_read_categories():
+    block = scan.read_categories(TEST_FILE, ["_entry", "_struct"])
+
+    assert block.find_value("_entry.id") == "1A00"
+    assert block.find_value("_struct.title") == "'MOCK TITLE'"
+    assert block.find_value("_pdbx_audit_revision_history.revision_date") is None
+
+
+def test_read_revision_date(tmp_path):
+    path = tmp_path / "1a00.cif.gz"
+    with gzip.open(path, 'wb') as file:
+        file.write(TEST_FILE)
+
+    assert scan.read_revision_date(str(path)) == "2008-03-24"
+
+
+def test_remove_categories():
+    result = scan.remove_categories(TEST_FILE, ["_pdbx_audit_revision_history", "_exptl"])
+
+    assert result == TEST_FILE.replace(scan.find_category(TEST_FILE, "_pdbx_audit_revision_history"), b'')
+    assert scan.read_categories(result, ["_entry", "_struct"]).find_value("_struct.title") == "'MOCK TITLE'"
+
+
+def test_read_metadata(tmp_path):
+    """
+    Test that every category but the atom sites is parsed, and that the chains are found in the atom sites.
+    """
+    path = tmp_path / "1a00.cif"
+    path.write_bytes(TEST_FILE + ATOM_SITES)
+    doc, chain_names = scan.read_metadata(str(path))
+    block = doc.sole_block()
+
+    assert block.find_value("_entry.id") == "1A00"
+    assert block.find_value("_struct.title") == "'MOCK TITLE'"
+    assert not block.find_values("_atom_site.id")
+    assert chain_names == ["D", "A"]
+
+
+def test_chain_names():
+    """
+    Test that the chains are the ones with atom sites in the first model, in the order they first appear,
+    which is how gemmi builds the chains of a structure.
+    """
+    assert scan.chain_names(TEST_FILE + ATOM_SITES) == ["D", "A"]
+
+
+def test_chain_names_quoted_values():
+    """
+    Test that atom sites with quoted values that contain spaces are still read correctly.
+    """
+    data = TEST_FILE + ATOM_SITES.replace(b"HETATM 3 O D", b"HETATM 3 'O 1' 'D'")
+    assert scan.chain_names(data) == ["D", "A"]
+
+
+def test_chain_names_single_atom_site():
+    data = TEST_FILE + b"""_atom_site.group_PDB ATOM
+_atom_site.id 1
+_atom_site.auth_asym_id A
+_atom_site.pdbx_PDB_model_num 1
+#
+"""
+    assert scan.chain_names(data) == ["A"]
+
+
+def test_chain_names_no_atom_sites():
+    assert scan.chain_names(TEST_FILE) == []
@@ -0,0 +1,163 @@
+"""
+This script contains unit tests for testing methods in sequence_store.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import sqlite3
+
+import commands
+import sequence_store
+from database import chain_table, coil_table, table_schemas
+
+LONG_SEQUENCE = "MGSSHHHHHHSSGLVPRGSHMKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQAPILSRVGDGTQDNLSGAEKAVQVKVKALPDAQFEVVHSLAKWKRQ"
+CHAIN_ROWS = [("1A00", "A", "A", 0, "MKV", "MKV", 1, 3, 3, 1, 3),
+              ("1A00", "B", "B", 0, "MKV", "MKV", 1, 3, 3, 1, 3),
+              ("1A00", "C", "C", 0, None, "", None, None, 0, None, None)]
+
+
+@pytest.fixture
+def cur():
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    return cur
+
+
+def write_chains(cur, entry_id, rows):
+    commands.write_rows(cur, [commands.ExtractedFile(entry_id, "2000-12-31", {chain_table.name: rows},
+                                                     [chain_table.name])])
+
+
+def test_sequence_hash():
+    assert sequence_store.sequence_hash("MKV") == sequence_store.sequence_hash("MKV")
+    assert sequence_store.sequence_hash("MKV") != sequence_store.sequence_hash("MKVL")
+    assert -2**63 <= sequence_store.sequence_hash("MKV") < 2**63
+    assert sequence_store.sequence_hash(None) is None
+
+
+def test_compress_sequence():
+    """
+    Test that long sequences are compressed, and that short sequences are kept as they are.
+    """
+    compressed = sequence_store.compress_sequence(LONG_SEQUENCE)
+
+    assert isinstance(compressed, bytes)
+    assert compressed[0] == sequence_store.dictionary_id
+    assert len(compressed) < len(LONG_SEQUENCE) * 0.75
+    assert sequence_store.decompress_sequence(compressed) == LONG_SEQUENCE
+    assert sequence_store.compress_sequence("MKV") == "MKV"
+    assert sequence_store.compress_sequence(None) is None
+
+
+def test_decompress_sequence_uncompressed():
+    assert sequence_store.decompress_sequence("MKV") == "MKV"
+    assert sequence_store.decompress_sequence(None) is None
+
+
+def test_hash_sequences():
+    """
+    Test that only the sequence columns are replaced by their hashes, and that every sequence is kept once.
+    """
+    sequences = {}
+    result = sequence_store.hash_sequences(chain_table, CHAIN_ROWS, sequences)
+
+    names = chain_table.attributes.stored_attributes().attribute_names
+    assert [row[names.index("chain_id")] for row in result] == ["A", "B", "C"]
+    assert [row[names.index("chain_sequence_hash")] for row in result] == [sequence_store.sequence_hash("MKV")] * 2 + [None]
+    assert sequences == {sequence_store.sequence_hash("MKV"): "MKV", sequence_store.sequence_hash(""): ""}
+
+
+def test_write_rows_through_view(cur):
+    """
+    Test that rows read back through the view are the rows that were written, and that sequences are stored once.
+    """
+    write_chains(cur, "1A00", CHAIN_ROWS)
+
+    assert cur.execute("SELECT * FROM chains ORDER BY chain_id").fetchall() == CHAIN_ROWS
+    assert cur.execute("SELECT COUNT(*) FROM sequences").fetchone() == (2,)
+
+
+def test_write_rows_uncompressed(tmp_path):
+    """
+    Test that sequences are not compressed unless compression is turned on, so that any connection can read the views.
+    """
+    path = str(tmp_path / "test.db")
+    con = sqlite3.connect(path)
+    commands.init_database(con.cursor())
+    rows = [("1A00", "A", "A", 0, LONG_SEQUENCE, LONG_SEQUENCE, 1, 100, 100, 1, 100)]
+    write_chains(con.cursor(), "1A00", rows)
+    con.commit()
+    con.close()
+
+    con = sqlite3.connect(path)
+    assert con.execute("SELECT typeof(sequence) FROM sequences").fetchall() == [("text",)]
+    assert con.execute("SELECT * FROM chains").fetchall() == rows
+
+
+def test_write_rows_compressed(cur):
+    """
+    Test that long sequences are stored compressed once compression is turned on,
+    and are read back through the view as they were.
+    """
+    commands.init_database(cur, compress_sequences=True)
+    rows = [("1A00", "A", "A", 0, LONG_SEQUENCE, LONG_SEQUENCE, 1, 100, 100, 1, 100)]
+    write_chains(cur, "1A00", rows)
+
+    assert cur.execute("SELECT typeof(sequence) FROM sequences").fetchall() == [("blob",)]
+    assert cur.execute("SELECT * FROM chains").fetchall() == rows
+
+
+def test_configure_compression(cur):
+    """
+    Test that the choice of compression is recorded, kept by later runs, and cannot be turned off.
+    """
+    assert not sequence_store.configure_compression(cur)
+    assert sequence_store.configure_compression(cur, True)
+    assert sequence_store.configure_compression(cur)
+    assert cur.execute("SELECT value FROM settings WHERE name = 'compress_sequences'").fetchone() == ("1",)
+    with pytest.raises(ValueError, match="cannot be turned off"):
+        sequence_store.configure_compression(cur, False)
+    cur.execute("DELETE FROM settings")
+    # Databases from before the choice was recorded compress if they hold compressed sequences
+    sequence_store.store_sequences(cur, {1: LONG_SEQUENCE})
+    cur.execute("DELETE FROM settings")
+    assert sequence_store.configure_compression(cur)
+    cur.execute("DELETE FROM settings")
+    cur.execute("DELETE FROM sequences")
+    assert not sequence_store.configure_compression(cur)
+
+
+def test_purge_unused_sequences(cur):
+    write_chains(cur, "1A00", CHAIN_ROWS)
+    write_chains(cur, "1B00", [("1B00", "A", "A", 0, "GG", "GG", 1, 2, 2, 1, 2)])
+    commands.delete_rows(cur, "1A00", [chain_table.name])
+
+    assert sequence_store.purge_unused_sequences(cur, table_schemas) == 2
+    assert cur.execute("SELECT sequence FROM sequences").fetchall() == [("GG",)]
+    assert cur.execute("SELECT chain_sequence FROM chains").fetchall() == [("GG",)]
+
+
+def test_migrate_tables():
+    """
+    Test that a table from before the sequence store existed keeps its rows, and gets replaced by a view.
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute(f"CREATE TABLE {chain_table.name} {str(chain_table.attributes)}")
+    cur.executemany(f"INSERT INTO {chain_table.name} VALUES({', '.join(['?'] * 11)})", CHAIN_ROWS)
+
+    commands.init_database(cur)
+
+    assert cur.execute("SELECT type FROM sqlite_master WHERE name = 'chains'").fetchone() == ("view",)
+    assert cur.execute("SELECT * FROM chains ORDER BY chain_id").fetchall() == CHAIN_ROWS
+    assert cur.execute("SELECT chain_sequence_hash FROM chains_data WHERE chain_id = 'A'").fetchone()\
+        == (sequence_store.sequence_hash("MKV"),)
+    assert cur.execute(f"SELECT COUNT(*) FROM {coil_table.name}").fetchone() == (0,)
+
+    # Migrating again leaves the data alone
+    commands.init_database(cur)
+    assert cur.execute("SELECT COUNT(*) FROM chains").fetchone() == (3,)
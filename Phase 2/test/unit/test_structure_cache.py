@@ -0,0 +1,142 @@
+"""
+This script contains unit tests for testing methods in structure_cache.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import zlib
+from gemmi import cif
+
+import structure_cache
+from structure_cache import StructureCache
+
+TEST_FILE = """data_1A00
+_entry.id 1A00
+#
+loop_
+_pdbx_validate_rmsd_bond.id
+_pdbx_validate_rmsd_bond.PDB_model_num
+1 1
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.label_atom_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.auth_seq_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.pdbx_PDB_model_num
+ATOM 1 N GLY A 1 ? 1
+ATOM 2 CA GLY A 1 ? 1
+ATOM 3 C GLY A 1 ? 1
+ATOM 4 O GLY A 1 ? 1
+ATOM 5 P DA A 2 ? 1
+ATOM 6 "O5'" DA A 2 ? 1
+ATOM 7 "O3'" DA A 2 ? 1
+HETATM 8 O HOH B 3 ? 1
+HETATM 9 O HOH B 4 ? 1
+ATOM 10 N GLY A 1 ? 2
+#
+loop_
+_atom_site_anisotrop.id
+_atom_site_anisotrop.U[1][1]
+1 0.1
+#
+"""
+
+
+def test_compact_document():
+    """
+    Test that only the first atom and the backbone atoms of every residue of the first model are kept,
+    and that the unused categories are removed.
+    """
+    doc = structure_cache.compact_document(cif.read_string(TEST_FILE))
+    block = cif.read_string(doc).sole_block()
+
+    assert list(block.find_values("_atom_site.id")) == ["1", "2", "3", "5", "7", "8", "9"]
+    assert block.find_value("_entry.id") == "1A00"
+    assert not block.find_values("_atom_site_anisotrop.id")
+    assert not block.find_values("_pdbx_validate_rmsd_bond.id")
+
+
+def test_compact_document_no_atom_sites():
+    doc = structure_cache.compact_document(cif.read_string("data_1A00\n_entry.id 1A00\n"))
+
+    assert cif.read_string(doc).sole_block().find_value("_entry.id") == "1A00"
+
+
+def test_make_snapshot():
+    snapshot = structure_cache.make_snapshot(cif.read_string(TEST_FILE))
+
+    assert "_atom_site.id" in zlib.decompress(snapshot).decode()
+
+
+def test_cache_add_and_read(tmp_path):
+    path = str(tmp_path / "cache.pack")
+    cache = StructureCache(path)
+    cache.add("1A00", "hash", "2000-12-31", structure_cache.make_snapshot(cif.read_string(TEST_FILE)))
+    cache.add("1B00", "hash", "2000-12-31", zlib.compress(b"data_1B00\n_entry.id 1B00\n"))
+
+    assert "1A00" in cache
+    assert cache.read("1B00", "hash").sole_block().find_value("_entry.id") == "1B00"
+    assert cache.read("1B00", "other hash") is None
+    assert cache.read("1C00", "hash") is None
+
+
+def test_cache_revision_date(tmp_path):
+    """
+    Test that the revision date of an entry is kept in the index, and only given for the same file contents.
+    """
+    path = str(tmp_path / "cache.pack")
+    cache = StructureCache(path)
+    cache.add("1A00", "hash", "2000-12-31", zlib.compress(b"data_1A00\n"))
+    cache.save()
+
+    cache = StructureCache(path)
+    assert cache.revision_date("1A00", "hash") == "2000-12-31"
+    assert cache.revision_date("1A00", "other hash") is None
+    assert cache.revision_date("1A00", None) is None
+    assert cache.revision_date("1B00", "hash") is None
+
+
+def test_cache_save_and_load(tmp_path):
+    """
+    Test that entries are only kept for later runs once the index is saved, and that they can be read back.
+    """
+    path = str(tmp_path / "cache.pack")
+    cache = StructureCache(path)
+    cache.add("1A00", "hash", "2000-12-31", zlib.compress(b"data_1A00\n_entry.id 1A00\n"))
+    assert "1A00" not in StructureCache(path)
+
+    cache.save()
+    cache = StructureCache(path)
+    assert cache.read("1A00", "hash").sole_block().find_value("_entry.id") == "1A00"
+
+    # Entries added to a saved cache are appended to the pack file
+    cache.add("1B00", "hash", "2000-12-31", zlib.compress(b"data_1B00\n_entry.id 1B00\n"))
+    cache.save()
+    cache = StructureCache(path)
+    assert cache.read("1A00", "hash").sole_block().find_value("_entry.id") == "1A00"
+    assert cache.read("1B00", "hash").sole_block().find_value("_entry.id") == "1B00"
+
+
+def test_cache_other_version(tmp_path):
+    """
+    Test that a cache built by another version of compact_document is not read, and gets overwritten.
+    """
+    path = str(tmp_path / "cache.pack")
+    cache = StructureCache(path)
+    cache.add("1A00", "hash", "2000-12-31", zlib.compress(b"data_1A00\n_entry.id 1A00\n"))
+    cache.save()
+
+    structure_cache.cache_version += 1
+    try:
+        cache = StructureCache(path)
+        assert "1A00" not in cache
+        cache.add("1B00", "hash", "2000-12-31", zlib.compress(b"data_1B00\n"))
+        assert cache.entries["1B00"].offset == 0
+    finally:
+        structure_cache.cache_version -= 1
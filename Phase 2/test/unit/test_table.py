@@ -9,6 +9,10 @@ Output verbosity can be adjusted by using the relevant flags in the command (e.g
 import pytest 
 from unittest.mock import MagicMock
 from table import Table
+from attributes import Attributes
+
+SEQUENCE_ATTRIBUTES_PAIRS = [("id", "VARCHAR"), ("sequence", "VARCHAR"), ("a", "FLOAT"), ("annotated", "VARCHAR")]
+SEQUENCE_ATTRIBUTES = Attributes(SEQUENCE_ATTRIBUTES_PAIRS, ["id"], sequences=["sequence", "annotated"])
 
 def test_table_initialisation():
     mock_attributes = MagicMock()
@@ -18,6 +22,22 @@ def test_table_initialisation():
     assert test_table.name == "test_table"
     assert test_table.attributes == mock_attributes
     assert test_table.extractor == mock_extractor
+    assert test_table.version == 1
+
+def test_table_initialisation_version():
+    test_table = Table("test_table", MagicMock(), MagicMock(), version=3)
+
+    assert test_table.version == 3
+
+def test_table_initialisation_no_extractor():
+    """
+    Test that bookkeeping tables can be created without an extractor.
+    """
+    mock_attributes = MagicMock()
+    test_table = Table("files", mock_attributes)
+
+    assert test_table.name == "files"
+    assert test_table.extractor is None
 
 def test_table_initialisation_missing_arguments():
     with pytest.raises(TypeError):
@@ -46,6 +66,53 @@ def test_create_table(test_table):
 
     assert result == expected
 
+def test_create_table_with_sequences():
+    test_table = Table("test_table", SEQUENCE_ATTRIBUTES)
+    expected = "CREATE TABLE IF NOT EXISTS test_table_data "\
+               "(id VARCHAR, sequence_hash INTEGER, a FLOAT, annotated_hash INTEGER, PRIMARY KEY (id))"
+
+    assert test_table.stored_name == "test_table_data"
+    assert test_table.create_table() == expected
+
+def test_create_view():
+    """
+    Test that the view has the columns of the table in the same order, with the sequences joined back in.
+    """
+    test_table = Table("test_table", SEQUENCE_ATTRIBUTES)
+    sequence_table = Table("sequences", Attributes([("sequence_hash", "INTEGER"), ("sequence", "VARCHAR")]))
+    expected = "CREATE VIEW test_table AS SELECT t.id, s0.sequence AS sequence, t.a, s1.sequence AS annotated "\
+               "FROM test_table_data t LEFT JOIN sequences s0 ON s0.sequence_hash = t.sequence_hash "\
+               "LEFT JOIN sequences s1 ON s1.sequence_hash = t.annotated_hash"
+
+    assert test_table.create_view(sequence_table) == expected
+
+def test_create_view_compressed_sequences():
+    test_table = Table("test_table", SEQUENCE_ATTRIBUTES)
+    sequence_table = Table("sequences", Attributes([("sequence_hash", "INTEGER"), ("sequence", "VARCHAR")],
+                                                   compressed=["sequence"]))
+
+    assert "SELECT t.id, decompress_sequence(s0.sequence) AS sequence, t.a, decompress_sequence(s1.sequence) AS annotated "\
+        in test_table.create_view(sequence_table)
+
+def test_create_indexes():
+    test_table = Table("test_table", Attributes(SEQUENCE_ATTRIBUTES_PAIRS, ["id"], sequences=["sequence"],
+                                                indexes=[["a"], ["id", "annotated"]]))
+    expected = ["CREATE INDEX IF NOT EXISTS test_table_a ON test_table_data (a)",
+                "CREATE INDEX IF NOT EXISTS test_table_id_annotated ON test_table_data (id, annotated)"]
+
+    assert test_table.create_indexes() == expected
+
+def test_create_indexes_no_indexes(test_table):
+    test_table.attributes.indexes = []
+
+    assert test_table.create_indexes() == []
+
+def test_column_expression(test_table):
+    test_table.attributes.compressed = ["a"]
+
+    assert test_table.column_expression("id", "t") == "t.id"
+    assert test_table.column_expression("a", "t") == "decompress_sequence(t.a)"
+
 def test_retrieve_default_columns(test_table):
     expected = "SELECT * FROM test_table"
     result = test_table.retrieve()
@@ -76,6 +143,17 @@ def test_extract_data(test_table):
     test_table.extractor.assert_called_with(mock_struct, mock_doc, mock_polymer_sequence)
     assert result == expected
 
+def test_extract_data_context(test_table):
+    mock_struct = MagicMock()
+    mock_doc = MagicMock()
+    mock_polymer_sequence = MagicMock()
+    mock_context = MagicMock()
+
+    result = test_table.extract_data(mock_struct, mock_doc, mock_polymer_sequence, mock_context)
+
+    test_table.extractor.assert_called_with(mock_struct, mock_doc, mock_polymer_sequence, mock_context)
+    assert result == [("test_id", "data1")]
+
 def test_insert_row(test_table):
     test_data = ("test_id", "data1")
     expected = "INSERT INTO test_table VALUES(?, ?)"
@@ -83,49 +161,70 @@ def test_insert_row(test_table):
 
     assert result == expected
 
+def test_insert_row_with_sequences():
+    test_table = Table("test_table", SEQUENCE_ATTRIBUTES)
+
+    assert test_table.insert_statement == "INSERT INTO test_table_data VALUES(?, ?, ?, ?)"
+
 def test_insert_row_invalid_data(test_table):
     invalid_test_data = 1
     with pytest.raises(TypeError):
         test_table.insert_row(invalid_test_data)
 
 def test_update_row(test_table):
-    test_data = {"col1": "value1", "col2": "value2"}
-    test_primary_key_values = ["1"]
-    expected = "UPDATE test_table SET col1 = value1, col2 = value2\
-            WHERE id = 1"
-    result = test_table.update_row(test_data, test_primary_key_values)
+    test_columns = ["col1", "col2"]
+    test_table.attributes.match_columns.return_value = "col1 = ?, col2 = ?"
+    test_table.attributes.match_primary_keys.return_value = "id = ?"
+    expected = "UPDATE test_table SET col1 = ?, col2 = ? WHERE id = ?"
+    result = test_table.update_row(test_columns)
 
     assert result == expected
-    # check that both methods were called once
-    test_table.attributes.match_columns.assert_called_once_with(test_data, ', ')
-    test_table.attributes.match_primary_keys.assert_called_once_with(test_primary_key_values)
+    test_table.attributes.match_columns.assert_called_with(test_columns, ', ')
 
 def test_update_row_invalid_columns(test_table):
     """
-    Test that a ValueError is raised if match_primary_keys method raises a ValueError. 
+    Test that a ValueError is raised if match_columns method raises a ValueError. 
     """
-    test_table.attributes.match_columns.side_effect = ValueError("Number of values given does not match number of columns")
-    test_data = {"col1": "value1", "col2": "value2"}
-    test_primary_key_values = ["1"]
-    
-    with pytest.raises(ValueError, match="Number of values given does not match number of columns"):
-        test_table.update_row(test_data, test_primary_key_values)
-    
-    test_table.attributes.match_columns.assert_called_once_with(test_data, ', ')
-    # check that match_primary_keys was not called 
-    test_table.attributes.match_primary_keys.assert_not_called()
-
-def test_update_row_invalid_primary_keys(test_table):
+    test_table.attributes.match_columns.side_effect = ValueError("Argument contains columns not part of the table")
+
+    with pytest.raises(ValueError, match="Argument contains columns not part of the table"):
+        test_table.update_row(["col1"])
+
+def test_precompiled_statements(test_attributes):
     """
-    Test that a ValueError is raised if match_primary_keys method raises a ValueError. 
+    Test that the statements of a table bind every value, rather than having it spliced in.
     """
-    test_table.attributes.match_primary_keys.side_effect = ValueError("Number of values given does not match number of keys")
-    test_data = {"col1": "value1", "col2": "value2"}
-    test_primary_key_values = ["1"]
+    test_table = Table("test_table", Attributes([("entry_id", "VARCHAR"), ("id", "VARCHAR"), ("a", "FLOAT")],
+                                                ["entry_id", "id"]))
+
+    assert test_table.update_statement == "UPDATE test_table SET a = ? WHERE entry_id = ? AND id = ?"
+    assert test_table.select_statement == "SELECT * FROM test_table WHERE entry_id = ? AND id = ?"
+    assert test_table.select_entry_statement == "SELECT * FROM test_table WHERE entry_id = ?"
+    assert test_table.delete_entry_statement == "DELETE FROM test_table WHERE entry_id = ?"
+    assert test_table.retrieve_entry(("a",)) == "SELECT a FROM test_table WHERE entry_id = ?"
+    # Tables without entries have no statements for them
+    assert Table("test_table", test_attributes).select_entry_statement is None
+
+def test_update_row_with_sequences():
+    test_table = Table("test_table", SEQUENCE_ATTRIBUTES)
+
+    assert test_table.update_statement == "UPDATE test_table_data SET sequence_hash = ?, a = ?, annotated_hash = ? WHERE id = ?"
 
-    with pytest.raises(ValueError, match="Number of values given does not match number of keys"):
-        test_table.update_row(test_data, test_primary_key_values)
+def test_upsert_row():
+    test_table = Table("test_table", SEQUENCE_ATTRIBUTES)
+    expected = "INSERT INTO test_table_data VALUES(?, ?, ?, ?) ON CONFLICT (id) "\
+               "DO UPDATE SET sequence_hash = excluded.sequence_hash, a = excluded.a, annotated_hash = excluded.annotated_hash "\
+               "WHERE (sequence_hash, a, annotated_hash) IS NOT (excluded.sequence_hash, excluded.a, excluded.annotated_hash)"
+
+    assert test_table.upsert_statement == expected
+    assert test_table.delete_statement == "DELETE FROM test_table_data WHERE id = ?"
+    assert test_table.key_positions == [0]
+
+def test_upsert_row_only_primary_keys(test_attributes):
+    """
+    Test that rows made up only of their primary keys are left alone if they are already stored.
+    """
+    test_table = Table("test_table", test_attributes)
 
-    # check that both methods were called once
-    test_table.attributes.match_columns.assert_called_once_with(test_data, ', ')
-    test_table.attributes.match_primary_keys.assert_called_once_with(test_primary_key_values)
+    assert test_table.upsert_statement == "INSERT INTO test_table VALUES(?, ?) ON CONFLICT (id, a) DO NOTHING"
+    assert test_table.delete_statement == "DELETE FROM test_table WHERE id = ? AND a = ?"